@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, BackgroundTasks, Request, HTTPException, Path
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import status, Form
 from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import EmailStr
@@ -18,12 +18,11 @@ from PhotoShare.app.services.auth_service import (
         send_reset_in_background,
         get_email_form_confirmation_token,
         get_email_form_refresh_token,
-        verify_password,
-        get_password_hash,
         oauth2_scheme,
         get_current_user
 )
 from PhotoShare.app.services.logout import add_token_to_revoked
+from PhotoShare.app.services.passwords import password_pool
 
 
 router_auth = APIRouter(prefix="/auth", tags=["authentication / authorization"])
@@ -31,8 +30,8 @@ router_auth = APIRouter(prefix="/auth", tags=["authentication / authorization"])
 
 @router_auth.post("/signup", response_model=UserRespond, status_code=status.HTTP_201_CREATED,
                   summary='Створення користувача')
-def signup(body: UserRegisterModel, background_task: BackgroundTasks,
-           request: Request, session: Session = Depends(get_db)):
+async def signup(body: UserRegisterModel, background_task: BackgroundTasks,
+                 request: Request, session: AsyncSession = Depends(get_db)):
     """
     Функція реєстрації створює нового користувача в базі даних.
     Вона також надсилає користувачеві електронний лист із посиланням для підтвердження свого облікового запису.
@@ -42,11 +41,11 @@ def signup(body: UserRegisterModel, background_task: BackgroundTasks,
     body: UserModel: Валідація тіло запиту
     background_tasks: BackgroundTasks: Додавання завдання до черги фонових завдань
     request: Request: Отримання базову URL-адресу програми
-    session: Session: Отримання сессії бази данних
+    session: AsyncSession: Отримання сессії бази данних
 
     Returns: Об'єкт типу User
     """
-    user = user_repo.create_user(body, session)
+    user = await user_repo.create_user(body, session)
     token = create_email_confirmation_token({"email": user.email})
     background_task.add_task(send_in_background, user.email, str(request.base_url), token)
     return user
@@ -54,15 +53,16 @@ def signup(body: UserRegisterModel, background_task: BackgroundTasks,
 
 @router_auth.post("/login", response_model=TokenResponse, status_code=status.HTTP_200_OK,
                   summary='Логінізація користувача')
-def login(body: UserLoginModel, session: Session = Depends(get_db)):
+async def login(body: UserLoginModel, session: AsyncSession = Depends(get_db)):
     """
     Функція входу використовується для автентифікації користувача.
     Вона приймає адресу електронної пошти та пароль користувача як вхідні дані,
     перевіряє, чи є вони дійсними обліковими даними, і повертає токени (маркери) доступу.
+    Пароль перевіряється в пулі процесів password_pool; якщо хеш застарів, він одразу оновлюється.
 
     Args:
     body: UserModel: Отримання адресу електронної пошти та пароль із тіла запиту
-    session: Session: Отримання сессії бази данних
+    session: AsyncSession: Отримання сессії бази данних
 
     Returns:
     Токен (Маркер) доступу, токен (маркер) оновлення та тип авторизації
@@ -71,16 +71,20 @@ def login(body: UserLoginModel, session: Session = Depends(get_db)):
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail='You are not authorized'
     )
-    user, access_token, refresh_token = user_repo.user_login(body.email, session)                         # noqa
-    if not verify_password(body.password, user.password):
+    user, access_token, refresh_token = await user_repo.user_login(body.email, session)                   # noqa
+    verified, new_hash = await password_pool.verify(body.password, user.password)
+    if not verified:
         raise credential_exception
+    if new_hash:
+        user.password = new_hash
+        await user_repo.update_user(user, session)
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router_auth.get("/refresh_token", response_model=TokenResponse, status_code=status.HTTP_200_OK,
                  summary="Отримати нові access та refresh_token")
-def refresh_token(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
-                  session: Session = Depends(get_db)):
+async def refresh_token(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+                        session: AsyncSession = Depends(get_db)):
     """
     Функція refresh_token використовується для оновлення токену(маркера) доступу.
     Функція приймає маркер оновлення (refresh_token) та повертає токен доступи (access_token) і тип авторизації.
@@ -94,13 +98,13 @@ def refresh_token(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
     """
     token = token.credentials
     email = get_email_form_refresh_token(token)
-    access_token, refresh_token = user_repo.refresh_token(email, token, session)                          # noqa
+    access_token, refresh_token = await user_repo.refresh_token(email, token, session)                    # noqa
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 
 @router_auth.get("/email-confirmation/{token}", status_code=status.HTTP_200_OK,
                  summary='Встановлення користувача як confirmed')
-def email_confirmation(token: str, session: Session = Depends(get_db)):
+async def email_confirmation(token: str, session: AsyncSession = Depends(get_db)):
     """
     Функція email_confirmation використовується для підтвердження електронної адреси користувача.
     Також ми повертаємо об’єкт JSON, що містить «активацію»: «ваша електронна адреса підтверджена»
@@ -112,17 +116,17 @@ def email_confirmation(token: str, session: Session = Depends(get_db)):
     Словник з ключем "активація" та значенням "ваша електронна адреса підтверджена"
     """
     email = get_email_form_confirmation_token(token)
-    user = user_repo.set_user_confirmation(email, session)
+    user = await user_repo.set_user_confirmation(email, session)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email token")
     return {'activation': 'you email is confirmed'}
 
 
 @router_auth.get("/logout", summary="Виконання logout для авторизованного користувача")
-def logout(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
-           user: User = Depends(get_current_user),
-           session: Session = Depends(get_db),
-           cache=Depends(cache_redis.get_redis)):
+async def logout(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+                 user: User = Depends(get_current_user),
+                 session: AsyncSession = Depends(get_db),
+                 cache=Depends(cache_redis.get_redis)):
     """
     Функція logout використовується для відкликання access_token та refresh_token користувача.
 
@@ -131,46 +135,47 @@ def logout(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
     cache: Отримання redis
 
     Returns:
-    Словник з ще валідними відкликанними токенами
+    Словник з відкликаним токеном та часом закінчення його дії
     """
     token = token.credentials
-    token_revoked = add_token_to_revoked(token, cache=cache)
-    user_repo.reset_refresh_token(user=user, session=session)
+    token_revoked = await add_token_to_revoked(token, cache=cache)
+    await user_repo.reset_refresh_token(user=user, session=session)
     return {'token_revoked': token_revoked}
 
 
 @router_auth.patch("/banned/{email}", status_code=status.HTTP_200_OK, dependencies=[Depends(Roles(['admin']))])
-def banned_user(email: str, session: Session = Depends(get_db)):
+async def banned_user(email: str, session: AsyncSession = Depends(get_db)):
     """
     Функція banned_user використовується для встановлення заборони доступу до додатку певного користувача.
 
     Args:
     email: str: Отримання email користувача якому нам треба заборонити заходити в додаток
-    session: Session: Отримання сессії бази данних
+    session: AsyncSession: Отримання сессії бази данних
 
     Returns:
     json вівдповідь заборони користувача
     """
-    user = user_repo.get_user_by_email(email=email, session=session)
+    user = await user_repo.get_user_by_email(email=email, session=session)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f'User not found')
     user.banned = True
-    user = user_repo.update_user(user, session)
+    user = await user_repo.update_user(user, session)
     return {f'user {user.email}': 'BANNED'}
 
 
 @router_auth.get("/reset_password/{email}", status_code=status.HTTP_200_OK, summary="Rset password")
-def reset_password(email: str, request: Request, background_task: BackgroundTasks):
+async def reset_password(email: str, request: Request, background_task: BackgroundTasks):
     background_task.add_task(send_reset_in_background, email, str(request.base_url))
     return {'message': "check your email"}
 
 
 @router_auth.post("/save_new_password", status_code=status.HTTP_200_OK)
-def save_new_password(password: str = Form(), email: EmailStr = Form(), session: Session = Depends(get_db)):
-    user = user_repo.get_user_by_email(email=email, session=session)
+async def save_new_password(password: str = Form(), email: EmailStr = Form(),
+                            session: AsyncSession = Depends(get_db)):
+    user = await user_repo.get_user_by_email(email=email, session=session)
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    user.password = get_password_hash(password)
-    user_repo.update_user(user=user, session=session)
+    user.password = await password_pool.hash(password)
+    await user_repo.update_user(user=user, session=session)
     return {'message': 'your password is updated'}
 
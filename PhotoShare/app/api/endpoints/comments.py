@@ -1,15 +1,16 @@
-from typing import List
-
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from PhotoShare.app.core.database import get_db
+from PhotoShare.app.core.pagination import decode_cursor, make_page
 from PhotoShare.app.services import auth_service
 from PhotoShare.app.services import roles
+from PhotoShare.app.services.response_cache import response_cache, CachedResponse
 
 from PhotoShare.app.models.user import User
 
 from PhotoShare.app.schemas.comment import CommentModel, CommentResponse
+from PhotoShare.app.schemas.pagination import Page
 
 from PhotoShare.app.repositories import comments as repository_comments
 from PhotoShare.app.repositories import photo as repository_photos
@@ -17,42 +18,50 @@ from PhotoShare.app.repositories import photo as repository_photos
 router_comments = APIRouter(prefix='/comments', tags=["comments"])
 
 
-@router_comments.get("/", response_model=List[CommentResponse])
-def read_comments(limit: int = 100, photo_id: int = 0, db: Session = Depends(get_db)):
+@router_comments.get("/", response_model=Page[CommentResponse])
+async def read_comments(limit: int = Query(100, ge=1, le=500), photo_id: int = 0, cursor: str | None = None,
+                        db: AsyncSession = Depends(get_db),
+                        cached: CachedResponse = Depends(response_cache.depends('comments:{photo_id}'))):
     """
-    Retrieves a list of comments on a specific post.
+    Retrieves a page of comments on a specific post.
 
     :param limit: Maximum number of comments to return.
     :type limit: int
     :param photo_id: ID of the photo.
     :type photo_id: int
+    :param cursor: next_cursor of the previous page, empty for the first page.
+    :type cursor: str | None
     :param db: The database session.
-    :type db: Session
-    :return: A list of comments.
-    :rtype: List[Comment]
+    :type db: AsyncSession
+    :param cached: The cached page, if there is one.
+    :type cached: CachedResponse
+    :return: A page of comments and the cursor of the next page.
+    :rtype: Page[CommentResponse]
     """
     if not photo_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Photo id is required')
-    photo = repository_photos.get_photo(photo_id, db)
+    if cached.response is not None:
+        return cached.response
+    photo = await repository_photos.get_photo(photo_id, db)
     if not photo:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
-    comments = repository_comments.get_comments(limit, photo_id, db)
-    return comments
+    comments = await repository_comments.get_comments(limit + 1, photo_id, db, after_id=decode_cursor(cursor))
+    return await cached.store(make_page(comments, limit), Page[CommentResponse])
 
 
 @router_comments.get("/{comment_id}", response_model=CommentResponse)
-def read_comment(comment_id: int, db: Session = Depends(get_db)):
+async def read_comment(comment_id: int, db: AsyncSession = Depends(get_db)):
     """
     Retrieves a comment with a specific ID.
 
     :param comment_id: The ID of the comment.
     :type comment_id: int 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The comment.
     :rtype: Comment
     """
-    comment = repository_comments.get_comment(comment_id, db)
+    comment = await repository_comments.get_comment(comment_id, db)
     if not comment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
     return comment
@@ -60,8 +69,8 @@ def read_comment(comment_id: int, db: Session = Depends(get_db)):
 
 
 @router_comments.post("/", response_model=CommentResponse, status_code=status.HTTP_201_CREATED)
-def create_comment(body: CommentModel, photo_id: int = 0, db: Session = Depends(get_db),
-                   current_user: User = Depends(auth_service.get_current_user)):
+async def create_comment(body: CommentModel, photo_id: int = 0, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
     """
     Creates a new comment.
 
@@ -70,7 +79,7 @@ def create_comment(body: CommentModel, photo_id: int = 0, db: Session = Depends(
     :param photo_id: ID of the photo on which the comment is added.
     :type photo_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: User that adds the comment.
     :type current_user: User
     :return: The newly added comment.
@@ -78,15 +87,15 @@ def create_comment(body: CommentModel, photo_id: int = 0, db: Session = Depends(
     """
     if photo_id == 0:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Photo id is required')
-    photo = repository_photos.get_photo(photo_id=photo_id, db=db)
+    photo = await repository_photos.get_photo(photo_id=photo_id, db=db)
     if photo is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
-    return repository_comments.create_comment(body, current_user, photo_id, db)
+    return await repository_comments.create_comment(body, current_user, photo_id, db)
 
 
 @router_comments.put("/{comment_id}", response_model=CommentResponse)
-def update_comment(body: CommentModel, comment_id: int, db: Session = Depends(get_db),
-                   current_user: User = Depends(auth_service.get_current_user)):
+async def update_comment(body: CommentModel, comment_id: int, db: AsyncSession = Depends(get_db),
+                         current_user: User = Depends(auth_service.get_current_user)):
 
     """
     Updates the comment with specified ID.
@@ -94,38 +103,38 @@ def update_comment(body: CommentModel, comment_id: int, db: Session = Depends(ge
     :param body: The data used to create a new comment.
     :type body: CommentModel
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: User that updates the comment.
     :type current_user: User
     :return: The newly added comment.
     :rtype: Comment
     """
-    comment = repository_comments.get_comment(comment_id, db)
+    comment = await repository_comments.get_comment(comment_id, db)
     if not comment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
     if comment.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
                             detail="You do not have permission to edit this comment")
-    new_comment = repository_comments.update_comment(body, comment_id, db)
+    new_comment = await repository_comments.update_comment(body, comment_id, db)
     return new_comment
 
 
 @router_comments.delete("/{comment_id}", response_model=CommentResponse,
                         dependencies=[Depends(roles.Roles(['admin', 'moderator']))])
-def delete_comment(comment_id: int, db: Session = Depends(get_db)):
+async def delete_comment(comment_id: int, db: AsyncSession = Depends(get_db)):
     """
     Deletes the comment with specified ID.
 
     :param body: The data used to create a new comment.
     :type body: CommentModel
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: User that deletes the comment.
     :type current_user: User
     :return: The newly added comment.
     :rtype: Comment
     """
-    comment = repository_comments.delete_comment(comment_id, db)
+    comment = await repository_comments.delete_comment(comment_id, db)
     if not comment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Comment not found")
     return comment
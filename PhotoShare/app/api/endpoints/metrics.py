@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends
+
+from PhotoShare.app.core.database import pool_stats
+from PhotoShare.app.services.response_cache import response_cache_stats
+from PhotoShare.app.services.roles import Roles
+from PhotoShare.app.services.uploads import upload_stats
+
+router_metrics = APIRouter(prefix='/metrics', tags=["metrics"], dependencies=[Depends(Roles(['admin']))])
+
+
+@router_metrics.get("/db_pool")
+async def read_db_pool():
+    """
+    Функція повертає стан пулу з'єднань з базою даних: видані та вільні з'єднання, overflow, таймаути
+    та гістограму часу очікування з'єднання. Доступна лише адміністраторам.
+
+    Returns:
+    Словник зі статистикою пулу
+    """
+    return pool_stats()
+
+
+@router_metrics.get("/uploads")
+async def read_uploads():
+    """
+    Функція повертає довжину черги завантаження фото та статистику дедуплікації: скільки файлів
+    не довелося завантажувати повторно, бо такий самий вміст вже збережено.
+
+    Returns:
+    Словник зі статистикою завантажень
+    """
+    return upload_stats()
+
+
+@router_metrics.get("/response_cache")
+async def read_response_cache():
+    """
+    Функція повертає статистику кешу відповідей: попадання, промахи та відповіді 304 Not Modified.
+
+    Returns:
+    Словник зі статистикою кешу відповідей
+    """
+    return response_cache_stats()
@@ -1,44 +1,107 @@
-from typing import List, Type
+from typing import List, Type, Literal
 
-from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, UploadFile, File
-from fastapi.responses import Response
-from sqlalchemy import or_
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, status, Path, Query, UploadFile, File, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from PhotoShare.app.core.config import settings
 from PhotoShare.app.core.database import get_db
+from PhotoShare.app.core.pagination import decode_cursor, encode_cursor, make_page
 from PhotoShare.app.models.user import User
 from PhotoShare.app.repositories import photo as photo_repository
-from PhotoShare.app.repositories.users import update_user
-from PhotoShare.app.schemas.photo import PhotoResponse, PhotoUpdate, CreateModelPhoto
-from PhotoShare.app.schemas.tags import NewTagModel
+from PhotoShare.app.schemas.photo import PhotoResponse, PhotoUpdate, PhotoModel, PhotoStatusResponse, \
+    PhotoVariantsResponse
+from PhotoShare.app.schemas.pagination import Page
+from PhotoShare.app.schemas.tags import NewTagModel, NewTagsModel
 from PhotoShare.app.services.auth_service import get_current_user
-from PhotoShare.app.services.photo_service import CloudinaryService
+from PhotoShare.app.services.qr_codes import qr_codes, qr_key, zip_qrcodes, QR_FORMATS, QR_SIZES
+from PhotoShare.app.services.response_cache import response_cache, CachedResponse
+from PhotoShare.app.services.search import search_backend
+from PhotoShare.app.services.storage import ZeroCopyFileResponse, storage
+from PhotoShare.app.services.upload_stream import read_form, stream_form, StagedFile
+from PhotoShare.app.services.uploads import upload_worker, dedup_hits, BulkUpload
+from PhotoShare.app.services.user_cache import user_cache
 from PhotoShare.app.models.photo import Photo, Tag
 
 router = APIRouter(prefix='/photos', tags=["photos"])
 
+MAX_SEARCH_OFFSET = 1000
+MAX_QR_CODES = 100
+QR_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# the form is parsed by read_form, FastAPI only documents it
+PHOTO_FORM = {'requestBody': {'required': True, 'content': {'multipart/form-data': {'schema': {
+    'type': 'object', 'required': ['name', 'description', 'file'],
+    'properties': {'name': {'type': 'string', 'minLength': 3, 'maxLength': 150},
+                   'description': {'type': 'string', 'minLength': 3, 'maxLength': 300},
+                   'file': {'type': 'string', 'format': 'binary'}}}}}}}
+MAX_BULK_FILES = 200
+BULK_FORM = {'requestBody': {'required': True, 'content': {'multipart/form-data': {'schema': {
+    'type': 'object', 'required': ['files'],
+    'properties': {'description': {'type': 'string', 'minLength': 3, 'maxLength': 300,
+                                   'description': 'Sent before the files; defaults to the name of each photo'},
+                   'files': {'type': 'array', 'maxItems': MAX_BULK_FILES,
+                             'items': {'type': 'string', 'format': 'binary'}}}}}}}}
 
-@router.get("/", response_model=list[PhotoResponse])
-def get_photos(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0, le=200),
-               db: Session = Depends(get_db)):
+
+@router.get("/", response_model=Page[PhotoResponse])
+async def get_photos(limit: int = Query(10, ge=10, le=500), cursor: str | None = None,
+                     db: AsyncSession = Depends(get_db),
+                     cached: CachedResponse = Depends(response_cache.depends('photos'))):
     """
-    The get_photos function returns a list of photos.
+    The get_photos function returns a page of photos, newest first.
+    Pages are served from the response cache until a photo changes; the ETag lets clients revalidate with
+    If-None-Match and get 304 Not Modified.
 
     :param limit: int: Limit the number of photos returned
     :param ge: Specify the minimum value of the parameter
     :param le: Limit the number of photos returned to 500
-    :param offset: int: Specify the number of photos to skip
-    :param ge: Specify a minimum value for the limit and offset parameters
-    :param le: Limit the number of photos returned
+    :param cursor: str: The next_cursor of the previous page, empty for the first page
     :param db: Session: Get the database session
-    :return: A list of photos
+    :param cached: CachedResponse: The cached page, if there is one
+    :return: A page of photos and the cursor of the next page
     :doc-author: Trelent
     """
-    photos = photo_repository.get_photos(limit, offset, db)
-    return photos
+    if cached.response is not None:
+        return cached.response
+    photos = await photo_repository.get_photos(limit + 1, decode_cursor(cursor), db)
+    return await cached.store(make_page(photos, limit), Page[PhotoResponse])
+
+
+def check_qr_size(size: int | None):
+    if size is not None and size not in QR_SIZES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Size must be one of {', '.join(map(str, QR_SIZES))}")
+
+
+# declared before /{photo_id}, which would take "qr_codes" for a photo id
+@router.get("/qr_codes", responses={200: {"content": {"application/zip": {}}}}, response_class=StreamingResponse)
+async def get_qrcodes(ids: list[int] = Query([], max_length=MAX_QR_CODES),
+                      fmt: Literal['png', 'svg'] = Query('png', alias='format'), size: int | None = None,
+                      db: AsyncSession = Depends(get_db)):
+    """
+    The get_qrcodes function returns the QR codes of several photos as a zip archive ({photo_id}.png entries).
+    The archive is streamed while the codes are read from the cache, photos without an url are left out.
+
+    :param ids: list[int]: Ids of the photos, ?ids=1&ids=2
+    :param fmt: str: png or svg
+    :param size: int: Width and height of a png in pixels, the default rendering if not given
+    :param db: Session: Pass the database session to the function
+    :return: The zip archive
+    """
+    if not ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Photo ids are required")
+    check_qr_size(size)
+    urls = await photo_repository.get_photo_urls(ids, db)
+    if not urls:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT_FOUND")
+    codes = {str(photo_id): urls[photo_id] for photo_id in dict.fromkeys(ids) if photo_id in urls}
+    return StreamingResponse(zip_qrcodes(codes, fmt, size), media_type='application/zip',
+                             headers={'content-disposition': 'attachment; filename="qr_codes.zip"'})
 
 
 @router.get("/{photo_id}", response_model=PhotoResponse)
-def get_photo(photo_id: int, db: Session = Depends(get_db), user = Depends(get_current_user)):
+async def get_photo(photo_id: int, db: AsyncSession = Depends(get_db), user = Depends(get_current_user)):
     """
     The get_photo function is used to retrieve a photo from the database.
         The function takes in a photo_url and returns the corresponding Photo object.
@@ -49,7 +112,7 @@ def get_photo(photo_id: int, db: Session = Depends(get_db), user = Depends(get_c
     :return: A photo object
     :doc-author: Trelent
     """
-    photo = photo_repository.get_photo_user(photo_id, db, user=user)
+    photo = await photo_repository.get_photo_user(photo_id, db, user=user)
     if photo is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -58,55 +121,154 @@ def get_photo(photo_id: int, db: Session = Depends(get_db), user = Depends(get_c
     return photo
 
 
-@router.get("/qr_code/{photo_id}", responses={200: {"content": {"image/png": {}}}}, response_class=Response)
-def get_qrcode(photo_id: int, db: Session = Depends(get_db)):
+@router.get("/qr_code/{photo_id}", responses={200: {"content": {"image/png": {}, "image/svg+xml": {}}}, 304: {}},
+            response_class=Response)
+async def get_qrcode(photo_id: int, request: Request, fmt: Literal['png', 'svg'] = Query('png', alias='format'),
+                     size: int | None = None, db: AsyncSession = Depends(get_db)):
     """
     The get_qrcode function returns the QR code for a given photo.
+    Codes are rendered once, when the photo gets its url, and kept in a content-addressed cache; the url of
+    a photo never changes, so the response is immutable and its ETag is the content address.
 
     :param photo_id: int: Specify the photo id of the image to be retrieved
+    :param request: Request: Used for the conditional (If-None-Match) requests
+    :param fmt: str: png or svg
+    :param size: int: Width and height of a png in pixels, the default rendering if not given
     :param db: Session: Pass the database session to the function
-    :return: The qr code for a given photo id
+    :return: The qr code for a given photo id, or 304 if the client already has it
     :doc-author: Trelent
     """
-    code = photo_repository.get_qrcode(photo_id, db)
-    if not code:
+    check_qr_size(size)
+    urls = await photo_repository.get_photo_urls([photo_id], db)
+    if photo_id not in urls:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="NOT_FOUND",
         )
-    return Response(content=code, media_type="image/png")
+    etag = f'"{qr_key(urls[photo_id], fmt, size)}"'
+    headers = {'etag': etag, 'cache-control': QR_CACHE_CONTROL}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    path = await qr_codes.ensure(urls[photo_id], fmt, size)
+    return ZeroCopyFileResponse(path, media_type=QR_FORMATS[fmt], headers=headers)
 
 
-@router.post("/", response_model=PhotoResponse, status_code=status.HTTP_201_CREATED)
-def create_photo(body: CreateModelPhoto = Depends(), db: Session = Depends(get_db),
-                 user: User = Depends(get_current_user)):
+@router.post("/", response_model=PhotoResponse, status_code=status.HTTP_202_ACCEPTED, openapi_extra=PHOTO_FORM)
+async def create_photo(request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
     """
-    The create_photo function creates a new photo in the database.
-    It takes in a PhotoModel object, an UploadFile object, and a Session object.
-    The UploadFile is used to upload the image file to Cloudinary and get its URL.
-    The Session is used to create the photo in our database using SQLAlchemy's ORM.
+    The create_photo function accepts a new photo for upload.
+    The form is parsed as it arrives and the file is streamed into the staging area and hashed, so memory does
+    not grow with the file; files that are not images are rejected after their first bytes (415) and files over
+    upload_max_size as soon as the limit is crossed (413). If a photo with the same content is already stored,
+    the new photo reuses its url and is ready at once. Otherwise it is created with status 'pending' and
+    the upload worker pushes it to the storage backend; clients poll /photos/{photo_id}/status until
+    the status becomes 'ready' (or 'failed').
 
-    :param body: PhotoModel: Create a new photo object
-    :param file: UploadFile: Upload the photo to cloudinary
+    :param request: Request: The multipart form with the name, description and file of the photo
     :param db: Session: Get the database session
     :param user: User: Get the user who is currently logged in
-    :return: A photo object
+    :return: The new photo object
     :doc-author: Trelent
     """
-    public_id = CloudinaryService.get_public_id(filename=body.file.filename)
-    public_id = "Y/" + public_id
-    photo_load = CloudinaryService.upload_photo(file=body.file.file, public_id=public_id)
-    version = photo_load.get('version')
-    photo_url = CloudinaryService.get_photo(public_id=public_id, version=version)
-    photo = photo_repository.create_photo(body, photo_url, db, user)
-    user.uploaded_photos += 1
-    update_user(user=user, session=db)
+    upload_worker.check_capacity()
+    fields, files = await read_form(request, upload_worker.staging_dir, settings.upload_max_size)
+    try:
+        body = PhotoModel.model_validate(fields)
+    except ValidationError as err:
+        for file in files:
+            file.discard()
+        raise RequestValidationError(err.errors(include_url=False))
+    if not files:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="The file is missing")
+    staged, content_hash = files[0].path, files[0].content_hash
+    photo_url = await photo_repository.get_photo_url_by_hash(content_hash, db)
+    if photo_url is not None:
+        staged.unlink(missing_ok=True)
+        dedup_hits.inc()
+        photo = await photo_repository.create_photo(body, photo_url, db, user, content_hash=content_hash,
+                                                    variants=storage.variant_urls("Y/" + content_hash),
+                                                    count_upload=True)
+        await user_cache.invalidate(user.email)
+        return photo
+    photo = await photo_repository.create_photo(body, None, db, user, status='pending', content_hash=content_hash)
+    try:
+        upload_worker.enqueue(staged, photo_id=photo.id, user_id=user.id, public_id="Y/" + content_hash)
+    except Exception:
+        staged.unlink(missing_ok=True)
+        await photo_repository.fail_photo(photo.id, db)
+        raise
     return photo
 
 
+@router.post("/bulk", response_class=StreamingResponse, openapi_extra=BULK_FORM,
+             responses={200: {"content": {"application/x-ndjson": {}}}})
+async def bulk_upload(request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
+    """
+    The bulk_upload function uploads an album of up to MAX_BULK_FILES photos in one request.
+    Every file is pushed to the storage backend as soon as it has been received, bulk_upload_concurrency files
+    at a time, while the rest of the form is still arriving. Photos are named after their files. All rows are
+    created in one INSERT and finalised, with the uploaded_photos counter of the user bumped once, in one
+    transaction.
+
+    :param request: Request: The multipart form with the files and an optional description
+    :param db: Session: Get the database session
+    :param user: User: Get the user who is currently logged in
+    :return: NDJSON: one line per file (index, filename, id, status: uploaded, failed or rejected, photo_url or
+        error) as soon as its upload finishes, then a line with the number of uploaded, failed and rejected files
+    :doc-author: Trelent
+    """
+    upload = BulkUpload(user.id, settings.bulk_upload_concurrency, upload_worker.staging_dir)
+    try:
+        async for part in stream_form(request, upload_worker.staging_dir, settings.upload_max_size, MAX_BULK_FILES):
+            if isinstance(part, StagedFile):
+                upload.add(part)
+            elif part[0] == 'description':
+                upload.description = part[1]
+        if not upload.files and not upload.rejected:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No files were uploaded")
+        await upload.create_rows(db)
+    except BaseException:
+        upload.abort()
+        raise
+    return StreamingResponse(upload.results(), media_type="application/x-ndjson")
+
+
+@router.get("/{photo_id}/status", response_model=PhotoStatusResponse)
+async def get_photo_status(photo_id: int, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
+    """
+    The get_photo_status function returns the upload status of a photo and its url once it is uploaded.
+
+    :param photo_id: int: The photo returned by create_photo
+    :param db: Session: Access the database
+    :param user: User: Only the owner can see the status of the upload
+    :return: The id, status and photo_url of the photo
+    """
+    photo = await photo_repository.get_photo_user(photo_id, db, user=user)
+    if photo is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    return photo
+
+
+@router.get("/{photo_id}/variants", response_model=PhotoVariantsResponse)
+async def get_photo_variants(photo_id: int = Path(ge=1), db: AsyncSession = Depends(get_db)):
+    """
+    The get_photo_variants function returns the urls of all transformation presets of a photo (thumb, medium,
+    square, avatar). The urls are built once, when the photo is uploaded, and read from the photo row, so the
+    CDN only ever sees these few transformations of each photo.
+
+    :param photo_id: int: Specify the photo
+    :param db: Session: Access the database
+    :return: The id of the photo and its variants, empty while the photo is being uploaded
+    """
+    variants = await photo_repository.get_photo_variants(photo_id, db)
+    if variants is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    return {'id': photo_id, 'variants': variants}
+
+
 @router.put("/{photo_id}", response_model=PhotoResponse)
-def update_photo(body: PhotoUpdate, photo_id: int = Path(ge=1), db: Session = Depends(get_db),
-                 user: User = Depends(get_current_user)):
+async def update_photo(body: PhotoUpdate, photo_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
+                       user: User = Depends(get_current_user)):
     """
     The update_contact function updates a contact in the database.
     Args:
@@ -120,7 +282,7 @@ def update_photo(body: PhotoUpdate, photo_id: int = Path(ge=1), db: Session = De
     :return: The updated photo
     :doc-author: Trelent
     """
-    photo = photo_repository.update_photo(photo_id, body, db, user)
+    photo = await photo_repository.update_photo(photo_id, body, db, user)
     if photo is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -130,7 +292,8 @@ def update_photo(body: PhotoUpdate, photo_id: int = Path(ge=1), db: Session = De
 
 
 @router.delete("/{photo_id}", response_model=PhotoResponse)
-def delete_photo(photo_id: int = Path(ge=1), db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def delete_photo(photo_id: int = Path(ge=1), db: AsyncSession = Depends(get_db),
+                       user: User = Depends(get_current_user)):
     """
     The delete_contact function deletes a contact from the database.
     Args:
@@ -145,7 +308,7 @@ def delete_photo(photo_id: int = Path(ge=1), db: Session = Depends(get_db), user
     :return: The deleted contact
     :doc-author: Trelent
     """
-    photo = photo_repository.remove_photo(photo_id, db, user)
+    photo = await photo_repository.remove_photo(photo_id, db, user)
     if photo is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -155,7 +318,8 @@ def delete_photo(photo_id: int = Path(ge=1), db: Session = Depends(get_db), user
 
 
 @router.patch("/add_tags", response_model=PhotoResponse, status_code=status.HTTP_200_OK, summary='Add new tag')
-def add_tag(body: NewTagModel, session: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def add_tag(body: NewTagModel, session: AsyncSession = Depends(get_db),
+                  user: User = Depends(get_current_user)):
     """
     The add_tag function adds a tag to the photo.
     The function takes in a NewTagModel object, which contains the id of the photo and name of tag.
@@ -166,20 +330,40 @@ def add_tag(body: NewTagModel, session: Session = Depends(get_db), user: User =
     :param user: User: Get the current user
     :return: A photo object
     """
-    photo = photo_repository.get_photo_user(photo_id=body.photo_id, db=session, user=user)
+    photo = await photo_repository.get_photo_user(photo_id=body.photo_id, db=session, user=user)
     if photo is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not Found")
-    tag = session.query(Tag).filter_by(name=body.tag).first()
-    if len(photo.tags) < 5:
-        if tag is None:
-            tag = Tag(name=body.tag)
-        photo.tags = photo.tags + [tag]
-        photo = photo_repository.update_photo_in_db(photo=photo, session=session)
+    if len(photo.tags) < photo_repository.MAX_TAGS:
+        photo = await photo_repository.add_tags(photo, [body.tag], session)
     return photo
 
 
+@router.post("/{photo_id}/tags", response_model=PhotoResponse, status_code=status.HTTP_200_OK, summary='Add tags')
+async def add_tags(body: NewTagsModel, photo_id: int = Path(ge=1), session: AsyncSession = Depends(get_db),
+                   user: User = Depends(get_current_user)):
+    """
+    The add_tags function adds several tags to the photo at once, creating the tags that don't exist yet.
+    A photo can have at most 5 tags; tags the photo already has are skipped.
+
+    :param body: NewTagsModel: The names of the tags
+    :param photo_id: int: The photo to tag
+    :param session: Session: Get the database session
+    :param user: User: Only the owner can tag the photo
+    :return: The photo with its tags
+    """
+    photo = await photo_repository.get_photo_user(photo_id=photo_id, db=session, user=user)
+    if photo is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not Found")
+    current = {tag.name for tag in photo.tags}
+    if len(current | set(body.tags)) > photo_repository.MAX_TAGS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"A photo can have at most {photo_repository.MAX_TAGS} tags")
+    return await photo_repository.add_tags(photo, body.tags, session)
+
+
 @router.patch("/delete_tag", response_model=PhotoResponse, status_code=status.HTTP_200_OK,summary="Delete Tag")
-def delete_tag(body: NewTagModel, session: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def delete_tag(body: NewTagModel, session: AsyncSession = Depends(get_db),
+                     user: User = Depends(get_current_user)):
     """
     The delete_tag function deletes a tag from the photo.
     The function takes in a NewTagModel object, which contains the photo_id and tag to be deleted.
@@ -190,33 +374,36 @@ def delete_tag(body: NewTagModel, session: Session = Depends(get_db), user: User
     :param user: User: Get the current user
     :return: The photo with the tag removed
     """
-    photo = photo_repository.get_photo_user(photo_id=body.photo_id, db=session, user=user)
+    photo = await photo_repository.get_photo_user(photo_id=body.photo_id, db=session, user=user)
     if photo is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not Found")
     tag = Tag(name=body.tag)
     if tag in photo.tags:
         photo.tags.remove(tag)
-        session.commit()
-        session.refresh(photo)
+        photo = await photo_repository.update_photo_in_db(photo=photo, session=session)
     return photo
 
 
-@router.get("/search/{word}", response_model=list[PhotoResponse], status_code=status.HTTP_200_OK, summary="Search photo")
-def search(word: str = Path(min_length=3), session: Session = Depends(get_db)):
+@router.get("/search/{word}", response_model=Page[PhotoResponse], status_code=status.HTTP_200_OK,
+            summary="Search photo")
+async def search(word: str = Path(min_length=3), limit: int = Query(20, ge=1, le=100), cursor: str | None = None,
+                 session: AsyncSession = Depends(get_db)):
     """
-    The search function searches for photos by name or description.
-    It also searches for tags and returns the photos associated with that tag.
-
+    The search function searches for photos by name, description or tag.
+    Results are ranked (tag matches first, then name, then description) and paginated;
+    the matching is done by the configured search backend (Postgres full-text index or in-memory index).
 
-    :param word: str: Define the type of the parameter and to give it a default value
+    :param word: str: The search text, every word is matched as a prefix
+    :param limit: int: Limit the number of photos returned
+    :param cursor: str: The next_cursor of the previous page, empty for the first page
     :param session: Session: Get the database session
-    :return: A list of photos that contain the word in their description or name
-    """
-    photos = session.query(Photo).filter(Photo.description.contains(word) | Photo.name.contains(word)).all()
-    tag = session.query(Tag).filter_by(name=word).first()
-    photos = photos if photos else []
-    tag_photo = tag.photo if tag else []
-    photos = list(set(photos + tag_photo))
-    if photos == []:
+    :return: A page of photos, best matches first
+    """
+    offset = decode_cursor(cursor) or 0
+    if offset > MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search is limited to the first results")
+    photos = await search_backend.search(word, limit + 1, offset, session)
+    if not photos and not offset:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
-    return photos
+    next_cursor = encode_cursor(offset + limit) if len(photos) > limit else None
+    return {'items': photos[:limit], 'next_cursor': next_cursor}
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from PhotoShare.app.services.image_engine import image_engine, parse_options, transform_key
+from PhotoShare.app.services.storage import storage, LocalStorage, ZeroCopyFileResponse, guess_media_type
+
+router_storage = APIRouter(prefix='/storage', tags=["storage"])
+
+
+@router_storage.get("/{public_id:path}", response_class=Response,
+                    responses={200: {"content": {"image/*": {}}}, 304: {}, 404: {}})
+async def read_file(public_id: str, request: Request):
+    """
+    The read_file function serves photos stored by the local storage backend.
+    Objects are content addressed, so the sha256 of the file is its ETag, and urls carrying the current
+    version (?v=...) can be cached forever. Other query parameters are a transformation (the urls built by
+    LocalStorage.transform), which is rendered once by the image engine and served from its cache.
+
+    :param public_id: str: The public id of the photo
+    :param request: Request: Used for the conditional (If-None-Match) and versioned requests
+    :return: The file, or 304 if the client already has it
+    """
+    if not isinstance(storage, LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    found = await run_in_threadpool(storage.resolve, public_id)
+    if found is None or not found[0].exists():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="NOT FOUND")
+    path, digest = found
+    immutable = request.query_params.get('v') == digest[:12]
+    options = {key: value for key, value in request.query_params.items() if key != 'v'}
+    if options:
+        try:
+            options = parse_options(options)
+        except ValueError as err:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+        digest = transform_key(digest, options) if options else digest
+    etag = f'"{digest}"'
+    headers = {'etag': etag, 'cache-control': 'public, max-age=31536000, immutable' if immutable else 'no-cache'}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if options:
+        try:
+            path = await image_engine.render(path, digest, options)
+        except ValueError as err:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    media_type = await run_in_threadpool(guess_media_type, path)
+    return ZeroCopyFileResponse(path, media_type=media_type, headers=headers, method=request.method)
@@ -1,18 +1,21 @@
 from fastapi import APIRouter, Depends, status, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from PhotoShare.app.models.user import User
 from PhotoShare.app.services.auth_service import get_current_user
+from PhotoShare.app.services.response_cache import response_cache, CachedResponse
 from PhotoShare.app.schemas.user import UserRespond, UserFirstname, UserLastname, UserProfileModel, UserUsername
 from PhotoShare.app.core.database import get_db
 from PhotoShare.app.repositories.users import update_user, get_user_by_email
-from PhotoShare.app.services.photo_service import CloudinaryService
+from PhotoShare.app.services.storage import storage, content_hash
 
 router_user = APIRouter(prefix="/user", tags=["user"])
 
 
 @router_user.get("/profile/{email}", response_model=UserProfileModel, status_code=status.HTTP_200_OK)
-def get_user_profile(email: str, session: Session = Depends(get_db)):
+async def get_user_profile(email: str, session: AsyncSession = Depends(get_db),
+                           cached: CachedResponse = Depends(response_cache.depends('users:{email}'))):
     """
     The get_user_profile function використовується для отримання інформації профілю користувача.
     Ця функція приймає електронний лист і повертає наступне:
@@ -21,16 +24,19 @@ def get_user_profile(email: str, session: Session = Depends(get_db)):
     Args:
     email: str: Отримуємо електронну адресу користувача, який увійшов у систему
     session: Session: Передаємо сеанс бази даних у функцію
+    cached: CachedResponse: Профіль з кешу відповідей, якщо він там є
     Returns:
     Словник інформації про користувача
     """
-    user = get_user_by_email(email=email, session=session)
-    return user
+    if cached.response is not None:
+        return cached.response
+    user = await get_user_by_email(email=email, session=session)
+    return await cached.store(user, UserProfileModel)
 
 
 @router_user.get("/me", response_model=UserRespond, status_code=status.HTTP_200_OK,
                  summary='Отримати інформацію про користувача')
-def me(user: User = Depends(get_current_user)):
+async def me(user: User = Depends(get_current_user)):
     """
     Функція me повертає інформацію для активного user
     Args:
@@ -42,7 +48,8 @@ def me(user: User = Depends(get_current_user)):
 
 
 @router_user.patch("/edit/username/{username}", response_model=UserRespond, status_code=status.HTTP_200_OK)
-def change_username(body: UserUsername, user: User = Depends(get_current_user), session: Session = Depends(get_db)):
+async def change_username(body: UserUsername, user: User = Depends(get_current_user),
+                          session: AsyncSession = Depends(get_db)):
     """
     Функція змінює username користувача
     Args:
@@ -53,13 +60,13 @@ def change_username(body: UserUsername, user: User = Depends(get_current_user),
     user: Повертаємо user з оновленими даними
     """
     user.username = body.username
-    user = update_user(user, session)
+    user = await update_user(user, session)
     return user
 
 
 @router_user.patch("/edit/firstname/{firstname}", response_model=UserRespond, status_code=status.HTTP_200_OK)
-def edit_firstname(body: UserFirstname, user: User = Depends(get_current_user),
-                         session: Session = Depends(get_db)):
+async def edit_firstname(body: UserFirstname, user: User = Depends(get_current_user),
+                         session: AsyncSession = Depends(get_db)):
     """
     Функція змінює first_name користувача
     Args:
@@ -70,13 +77,13 @@ def edit_firstname(body: UserFirstname, user: User = Depends(get_current_user),
     user: Повертаємо user з оновленими даними
     """
     user.first_name = body.first_name
-    user = update_user(user, session)
+    user = await update_user(user, session)
     return user
 
 
 @router_user.patch("/edit/lastname/{lastname}", response_model=UserRespond, status_code=status.HTTP_200_OK)
-def edit_lastname(body: UserLastname, user: User = Depends(get_current_user),
-                  session: Session = Depends(get_db)):
+async def edit_lastname(body: UserLastname, user: User = Depends(get_current_user),
+                        session: AsyncSession = Depends(get_db)):
     """
     Функція змінює last_name користувача
     Args:
@@ -87,15 +94,15 @@ def edit_lastname(body: UserLastname, user: User = Depends(get_current_user),
     user: Повертаємо user з оновленими даними
     """
     user.last_name = body.last_name
-    user = update_user(user, session)
+    user = await update_user(user, session)
     return user
 
 
 @router_user.patch("/edit/avatar", response_model=UserRespond, status_code=status.HTTP_200_OK)
-def upload_avatar(file: UploadFile = File(), user: User = Depends(get_current_user),
-                  session: Session = Depends(get_db)):
+async def upload_avatar(file: UploadFile = File(), user: User = Depends(get_current_user),
+                        session: AsyncSession = Depends(get_db)):
     """
-    Функція оновлює avatar користувача, завантажуючи його на сервіс cloudinary
+    Функція оновлює avatar користувача, завантажуючи його в сховище фото (cloudinary або локальне)
     Args:
     file: str: Отримуємо новий avatar користувача
     :user: Передаємо користувача в якого буде редактовано last_name
@@ -103,13 +110,13 @@ def upload_avatar(file: UploadFile = File(), user: User = Depends(get_current_us
     Returns:
     user: Повертаємо user з оновленими даними
     """
-    public_id = CloudinaryService.get_public_id(filename=file.filename)
+    public_id = await run_in_threadpool(content_hash, file.file)
     public_id = "Y/avatars/" + public_id
-    image = CloudinaryService.upload_photo(file=file.file, public_id=public_id)
+    image = await run_in_threadpool(storage.upload, file=file.file, public_id=public_id)
     version = image.get('version')
-    url = CloudinaryService.get_photo(public_id=public_id, version=version)
+    url = storage.get_url(public_id=public_id, version=version)
     user.avatar = url
-    user = update_user(user=user, session=session)
+    user = await update_user(user=user, session=session)
     return user
 
 
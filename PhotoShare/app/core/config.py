@@ -10,6 +10,13 @@ class Settings(BaseSettings):
     postgres_db_name: str
     postgres_path: str
 
+    db_pool_size: int = 10
+    db_max_overflow: int = 5
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_pgbouncer: bool = False
+
     secret_access_key: str
     secret_refresh_key: str
     secret_email_key: str
@@ -26,10 +33,49 @@ class Settings(BaseSettings):
     redis_port: int
     redis_password: str
 
+    revocation_filter_enabled: bool = True
+    revocation_filter_capacity: int = 100_000
+    revocation_filter_error_rate: float = 0.001
+    revocation_filter_rotation: int = 60 * 15
+
+    user_cache_enabled: bool = True
+    user_cache_ttl: int = 30
+    user_cache_size: int = 10_000
+
+    response_cache_enabled: bool = True
+    response_cache_ttl: int = 60
+    response_cache_local_ttl: int = 5
+    response_cache_local_size: int = 1000
+
+    jwt_cache_enabled: bool = True
+    jwt_cache_size: int = 10_000
+
+    bcrypt_rounds: int = 12
+    password_workers: int = 2
+    password_max_pending: int = 64
+    password_retry_after: int = 1
+
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
 
+    storage_backend: str = 'cloudinary'
+    local_storage_root: str = '/tmp/photoshare/storage'
+    local_storage_url: str = '/storage'
+
+    upload_staging_dir: str = '/tmp/photoshare/staging'
+    upload_workers: int = 4
+    upload_queue_size: int = 256
+    upload_max_size: int = 20 * 1024 * 1024
+    bulk_upload_concurrency: int = 8
+
+    search_backend: str = 'postgres'
+
+    qr_cache_dir: str = '/tmp/photoshare/qr_codes'
+
+    image_workers: int = 2
+    image_cache_dir: str = '/tmp/photoshare/variants'
+
     class Config:
         env_file = Path(__file__).parent.joinpath(".env")
         env_file_encoding = "utf-8"
@@ -1,28 +1,103 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import time
+from uuid import uuid4
+
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from configparser import ConfigParser
 from pathlib import Path
 
 from PhotoShare.app.core.config import settings
+from PhotoShare.app.core.metrics import Counter, Histogram
 
 path_config = Path(__file__).joinpath('config.py')
 config = ConfigParser()
 config.read(path_config)
 
 POSTGRES_URL = settings.postgres_path
-engine = create_engine(POSTGRES_URL, echo=False, max_overflow=5)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ASYNC_POSTGRES_URL = make_url(POSTGRES_URL).set(drivername='postgresql+asyncpg')
+
+pool_wait_time = Histogram()
+pool_timeouts = Counter()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    Пул з'єднань, який записує час очікування вільного з'єднання в гістограму pool_wait_time
+    та рахує випадки, коли з'єднання не вдалося отримати за pool_timeout.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_timeouts.inc()
+            raise
+        finally:
+            pool_wait_time.observe(time.perf_counter() - started)
+
+
+def engine_options() -> dict:
+    """
+    Функція збирає параметри create_async_engine з налаштувань.
+    В режимі PgBouncer (transaction pooling) пулом керує PgBouncer, тому локальний пул вимикається, а
+    підготовлені запити asyncpg не кешуються і отримують унікальні імена, бо з'єднання з сервером змінюється
+    між транзакціями.
+
+    Returns:
+    Словник параметрів для create_async_engine
+    """
+    if settings.db_pgbouncer:
+        return {
+            'poolclass': NullPool,
+            'connect_args': {
+                'statement_cache_size': 0,
+                'prepared_statement_cache_size': 0,
+                'prepared_statement_name_func': lambda: f'__asyncpg_{uuid4()}__',
+            },
+        }
+    return {
+        'poolclass': InstrumentedPool,
+        'pool_size': settings.db_pool_size,
+        'max_overflow': settings.db_max_overflow,
+        'pool_timeout': settings.db_pool_timeout,
+        'pool_recycle': settings.db_pool_recycle,
+        'pool_pre_ping': settings.db_pool_pre_ping,
+    }
+
+
+engine = create_async_engine(ASYNC_POSTGRES_URL, echo=False, **engine_options())
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+
+def pool_stats(pool=None) -> dict:
+    """
+    Функція повертає поточний стан пулу з'єднань: розмір, кількість виданих та вільних з'єднань, overflow,
+    кількість таймаутів та гістограму часу очікування з'єднання.
+
+    Args:
+    pool: Пул з'єднань, за замовчуванням - пул engine
+
+    Returns:
+    Словник зі статистикою пулу
+    """
+    pool = pool if pool is not None else engine.pool
+    stats = {'pool': type(pool).__name__, 'pgbouncer': settings.db_pgbouncer}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(size=pool.size(), checked_out=pool.checkedout(), idle=pool.checkedin(),
+                     overflow=max(pool.overflow(), 0), max_overflow=pool._max_overflow, timeout=pool.timeout())
+    stats.update(timeouts=pool_timeouts.value, wait_time=pool_wait_time.snapshot())
+    return stats
 
 
-def get_db():
+async def get_db():
     """
-    Функція get_db використовується як залежніть для отримання session для роботи з базою даних.
+    Функція get_db використовується як залежніть для отримання асинхронної session для роботи з базою даних.
 
     Returns:
-    Session для роботи з базою даних
+    AsyncSession для роботи з базою даних
     """
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
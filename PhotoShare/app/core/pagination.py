@@ -0,0 +1,42 @@
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Функція кодує ключ останнього запису сторінки в непрозорий курсор для наступного запиту.
+    """
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str | None) -> int | None:
+    """
+    Функція повертає ключ, після якого починається сторінка, або None для першої сторінки.
+    Пошкоджений курсор або від'ємний ключ призводить до 400 Bad Request.
+    """
+    if not cursor:
+        return None
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        last_id = value['id']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        last_id = None
+    if not isinstance(last_id, int) or isinstance(last_id, bool) or last_id < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+    return last_id
+
+
+def make_page(items: list, limit: int) -> dict:
+    """
+    Функція формує сторінку з результату запиту, який отримав limit + 1 записів: зайвий запис означає, що є
+    наступна сторінка, і курсор вказує на останній запис поточної.
+    """
+    items = list(items)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].id)
+    return {'items': items, 'next_cursor': next_cursor}
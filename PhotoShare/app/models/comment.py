@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, func, ARRAY
+from sqlalchemy import Column, Integer, String, func, ARRAY, Index
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql.schema import ForeignKey
@@ -15,8 +15,13 @@ class Comment(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     # updated_at = Column(JSON)
-    user_id = Column('user_id', ForeignKey('users.id', ondelete='SET NULL'), default=None)
+    user_id = Column('user_id', ForeignKey('users.id', ondelete='SET NULL'), default=None, index=True)
     user = relationship('User', backref='comments')
     photo_id = Column('photo_id', ForeignKey('photo.id', ondelete='CASCADE'), default=None)
     photo = relationship('Photo', backref='comments')
 
+    __table_args__ = (
+        # comments of a photo are paged by id
+        Index('ix_comments_photo_id_id', 'photo_id', 'id'),
+    )
+
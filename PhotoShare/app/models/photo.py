@@ -1,40 +1,58 @@
 from datetime import date
 
-from sqlalchemy import Integer, String, ForeignKey, DateTime, func, Column, Table
+from sqlalchemy import Integer, String, ForeignKey, DateTime, func, Column, Table, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from PhotoShare.app.models.base import Base
 from PhotoShare.app.models.user import User
 
+SEARCH_CONFIG = 'simple'
+SEARCH_VECTOR = (f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+                 f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')")
+RATING_AVERAGE = "CASE WHEN rating_count > 0 THEN CAST(rating_sum AS float) / rating_count ELSE 0 END"
+
 photo_m2m_tag = Table(
     "photo_m2m_tag",
     Base.metadata,
-    Column("id", Integer, primary_key=True),
-    Column("photo_id", Integer, ForeignKey("photo.id", ondelete="CASCADE")),
-    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE")),
+    Column("photo_id", Integer, ForeignKey("photo.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_photo_m2m_tag_tag_id", "tag_id"),
 )
 
 
 class Photo(Base):
     __tablename__ = "photo"
     id: Mapped[int] = mapped_column(primary_key=True)
-    name: Mapped[str] = mapped_column(String(150), index=True)
-    description: Mapped[str] = mapped_column(String(300), index=True)
-    photo_url: Mapped[str] = mapped_column(index=True)
+    name: Mapped[str] = mapped_column(String(150))
+    description: Mapped[str] = mapped_column(String(300))
+    photo_url: Mapped[str] = mapped_column(nullable=True)
+    # urls of the TRANSFORMATION_PRESETS of the storage, set when the file is uploaded
+    variants: Mapped[dict] = mapped_column(JSONB, nullable=True)
+    status: Mapped[str] = mapped_column(String(10), default='ready', server_default='ready')
+    content_hash: Mapped[str] = mapped_column(String(64), index=True, nullable=True)
     created_at: Mapped[date] = mapped_column('created_at', DateTime, default=func.now(), nullable=True)
     updated_at: Mapped[date] = mapped_column('updated_at', DateTime, default=func.now(), onupdate=func.now(),
                                              nullable=True)
-    tags: Mapped[list["Tag"]] = relationship("Tag", secondary=photo_m2m_tag, backref="photo")
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
-    user: Mapped["User"] = relationship('User', backref="photo", lazy='joined')
+    tags: Mapped[list["Tag"]] = relationship("Tag", secondary=photo_m2m_tag, backref="photo", lazy="raise_on_sql")
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    user: Mapped["User"] = relationship('User', backref="photo", lazy='raise_on_sql')
+
+    rating_sum: Mapped[int] = mapped_column(default=0, server_default='0')
+    rating_count: Mapped[int] = mapped_column(default=0, server_default='0')
+    rating: Mapped[float] = mapped_column(Computed(RATING_AVERAGE, persisted=True), nullable=True)
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True), nullable=True,
+                                               deferred=True)
 
-    rating: Mapped[float] = mapped_column(nullable=True, default=0)
+    __table_args__ = (
+        Index('ix_photo_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
 
 class Tag(Base):
     __tablename__ = "tags"
     id: Mapped[int] = mapped_column(primary_key=True)
-    name: Mapped[str] = mapped_column(String(25), nullable=False)
+    name: Mapped[str] = mapped_column(String(25), nullable=False, unique=True)
 
     def __eq__(self, other):
         return self.name == other
@@ -1,6 +1,6 @@
 from datetime import date
 
-from sqlalchemy import Integer, String, ForeignKey, DateTime, func, Column, Table
+from sqlalchemy import Integer, String, ForeignKey, DateTime, func, Column, Table, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from PhotoShare.app.core.database import engine
@@ -12,7 +12,12 @@ class Rating(Base):
     __tablename__ = "ratings"
     id: Mapped[int] = mapped_column(primary_key=True)
     rating: Mapped[int] = mapped_column(nullable=False)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
-    user: Mapped["User"] = relationship('User', backref="rating", lazy='joined', passive_deletes=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    user: Mapped["User"] = relationship('User', backref="rating", lazy='raise_on_sql', passive_deletes=False)
     photo_id: Mapped[int] = mapped_column(Integer, ForeignKey("photo.id"), nullable=True)
-    photo: Mapped["Photo"] = relationship('Photo', backref="ratings", lazy='joined', passive_deletes=True)
+    photo: Mapped["Photo"] = relationship('Photo', backref="ratings", lazy='raise_on_sql', passive_deletes=True)
+
+    __table_args__ = (
+        # one rating per user per photo, also the target of INSERT ... ON CONFLICT and the index of photo_id
+        Index('ix_ratings_photo_id_user_id', 'photo_id', 'user_id', unique=True),
+    )
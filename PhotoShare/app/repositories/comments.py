@@ -2,7 +2,8 @@ from typing import List
 
 from datetime import datetime
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 # from sqlalchemy.sql import extract
 # import sqlalchemy as sa
 
@@ -11,38 +12,46 @@ from PhotoShare.app.models.comment import Comment
 from PhotoShare.app.models.user import User
 
 from PhotoShare.app.schemas.comment import CommentModel
+from PhotoShare.app.services.response_cache import response_cache
 
 
-def get_comments(limit: int, photo_id: int, db: Session) -> List[Comment]:
+async def get_comments(limit: int, photo_id: int, db: AsyncSession, after_id: int | None = None) -> List[Comment]:
     """
-    Retrieves a list of comments on a specific post.
+    Retrieves a page of comments on a specific post, oldest first.
 
     :param limit: Maximum number of comments to return.
     :type limit: int
     :param photo_id: ID of the post.
     :type photo_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
+    :param after_id: ID of the last comment of the previous page, None for the first page.
+    :type after_id: int | None
     :return: A list of comments.
     :rtype: List[Comment]
     """
-    return db.query(Comment).filter(Comment.photo_id==photo_id).limit(limit).all()
+    sq = select(Comment).filter(Comment.photo_id == photo_id).order_by(Comment.id).limit(limit)
+    if after_id is not None:
+        sq = sq.where(Comment.id > after_id)
+    result = await db.execute(sq)
+    return result.scalars().all()
 
 
-def get_comment(comment_id: int, db: Session) -> Comment:
+async def get_comment(comment_id: int, db: AsyncSession) -> Comment:
     """
     Retrieves a comment with a specific ID.
 
     :param comment_id: The ID of the comment.
     :type comment_id: int 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The comment.
     :rtype: Comment
     """
-    return db.query(Comment).filter(Comment.id==comment_id).first()
+    result = await db.execute(select(Comment).filter(Comment.id == comment_id))
+    return result.scalars().first()
 
-def create_comment(body: CommentModel, user: User, photo_id: int, db: Session) -> Comment:
+async def create_comment(body: CommentModel, user: User, photo_id: int, db: AsyncSession) -> Comment:
     """
     Creates a new comment.
 
@@ -53,17 +62,18 @@ def create_comment(body: CommentModel, user: User, photo_id: int, db: Session) -
     :param post_id: ID of the post on which the comment is added.
     :type post_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly added comment.
     :rtype: Comment
     """
     comment = Comment(content=body.content, user_id=user.id, photo_id=photo_id)
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
+    await db.refresh(comment)
+    await response_cache.invalidate(f'comments:{photo_id}')
     return comment
 
-def update_comment(body: CommentModel, comment_id: int, db: Session) -> Comment:
+async def update_comment(body: CommentModel, comment_id: int, db: AsyncSession) -> Comment:
     """
     Updates the comment
 
@@ -72,29 +82,32 @@ def update_comment(body: CommentModel, comment_id: int, db: Session) -> Comment:
     :param comment_id: id of a comment to update.
     :type comment_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated comment.
     :rtype: Comment
     """
-    comment = db.query(Comment).filter(Comment.id==comment_id).first()
+    comment = await get_comment(comment_id, db)
     if comment:
         comment.content = body.content
-        db.commit()
+        await db.commit()
+        await db.refresh(comment)
+        await response_cache.invalidate(f'comments:{comment.photo_id}')
     return comment
 
-def delete_comment(comment_id: int, db: Session) -> Comment:
+async def delete_comment(comment_id: int, db: AsyncSession) -> Comment:
     """
     Deletes the comment
     
     :param comment_id: id of a comment to delete.
     :type comment_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The deleted comment.
     :rtype: Comment
     """
-    comment = db.query(Comment).filter(Comment.id==comment_id).first()
+    comment = await get_comment(comment_id, db)
     if comment:
-        db.delete(comment)
-        db.commit()
+        await db.delete(comment)
+        await db.commit()
+        await response_cache.invalidate(f'comments:{comment.photo_id}')
     return comment
\ No newline at end of file
@@ -1,96 +1,236 @@
-import io
+import re
 from datetime import datetime
 
-import qrcode
-from sqlalchemy import select, and_
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, and_, union_all, func, literal, cast, Float, values, column, Integer, String
+from sqlalchemy.dialects.postgresql import insert, JSONB
+from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from PhotoShare.app.models.photo import Photo, Tag
+from PhotoShare.app.models.photo import Photo, Tag, photo_m2m_tag, SEARCH_CONFIG
 from PhotoShare.app.models.user import User
 from PhotoShare.app.repositories.tags import get_tags
 from PhotoShare.app.schemas.photo import PhotoModel, PhotoUpdate
+from PhotoShare.app.services.qr_codes import qr_codes
+from PhotoShare.app.services.response_cache import response_cache
+from PhotoShare.app.services.search import search_backend
 
-from PhotoShare.app.repositories.rating import get_ratings
+MAX_TAGS = 5
 
+# relationships serialised by PhotoResponse. Photo.tags and Photo.user are lazy="raise_on_sql", every query whose
+# photos are returned to the client loads them with these options: one extra query for the tags of the whole list
+# and a join for the owners, however many photos there are
+PHOTO_LOADERS = (selectinload(Photo.tags), joinedload(Photo.user))
 
-def get_photos(limit: int, offset: int, db: Session):
+
+async def get_photos(limit: int, after_id: int | None, db: AsyncSession):
     """
-    The get_photos function returns a list of photos from the database.
-    Args:
-    limit (int): The number of photos to return.
-    offset (int): The starting point for the query.  This is used for pagination, so that you can get more than
-    one page of results at a time.
-    For example, if you have 100 total results and want to get 10 per page, set limit=10 and offset=0 on
-    your first request; then set limit=10 and offset=10 on your second request; etc... until you've gotten
-    all 100 results back in chunks of 10 each time.&quot;
+    The get_photos function returns a page of photos from the database, newest first.
+    Pages are addressed by the id of the last photo of the previous page (keyset pagination), so the query
+    uses the primary key index and costs the same for any page depth.
 
     :param limit: int: Limit the number of photos returned
-    :param offset: int: Specify the number of records to skip before starting to return rows
-    :param db: Session: Pass the database session to the function
+    :param after_id: int: The id of the last photo of the previous page, None for the first page
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of photos
     :doc-author: Trelent
     """
-    photos = db.query(Photo).offset(offset).limit(limit).all()
-    return photos
+    sq = select(Photo).options(*PHOTO_LOADERS).order_by(Photo.id.desc()).limit(limit)
+    if after_id is not None:
+        sq = sq.where(Photo.id < after_id)
+    photos = await db.execute(sq)
+    return photos.scalars().all()
 
 
-def get_photo(photo_id: int, db: Session):
+async def get_photo(photo_id: int, db: AsyncSession):
     """
     The get_photo function takes in a photo_url and returns the corresponding Photo object.
-    If no such photo exists, it returns None.
+    If no such photo exists, it returns None. Tags and user are not loaded, use get_photo_user for a photo
+    that is returned to the client.
 
     :param photo_id: str: Specify the id of the photo
-    :param db: Session: Create a database session
+    :param db: AsyncSession: Create a database session
     :return: A photo object or none if the photo does not exist
     :doc-author: Trelent
     """
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    return photo
+    photo = await db.execute(select(Photo).filter(Photo.id == photo_id))
+    return photo.scalar_one_or_none()
 
 
-def create_photo(body: PhotoModel, photo_url: str, db: Session, user: User):
+async def create_photo(body: PhotoModel, photo_url: str | None, db: AsyncSession, user: User, status: str = 'ready',
+                       content_hash: str | None = None, variants: dict[str, str] | None = None,
+                       count_upload: bool = False):
     """
     The create_photo function creates a new photo in the database.
     It takes three arguments:
     body (PhotoModel): The PhotoModel object that contains the information for creating a new photo.
     url (str): The URL of the image to be uploaded to Cloudinary and associated with this photo.
-    db (Session): A SQLAlchemy Session object used for interacting with our database.
+    db (AsyncSession): A SQLAlchemy Session object used for interacting with our database.
 
     :param body: PhotoModel: Get the name and description of the photo from the request body
     :param photo_url: str: Store the url of the photo in s3
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param user: User: Associate the photo with a user
+    :param status: str: 'pending' while the file is still being uploaded in the background
+    :param content_hash: str: sha256 of the uploaded file
+    :param variants: dict[str, str]: Urls of the transformation presets, None while the file is being uploaded
+    :param count_upload: bool: Bump the owner's uploaded_photos counter in the same transaction, with an atomic
+        update, since user may be a cached snapshot
     :return: The photo object that was created
     :doc-author: Trelent
     """
 
-    photo = Photo(name=body.name, description=body.description, user=user)  # tags=photo_tags,
+    photo = Photo(name=body.name, description=body.description, user=user, tags=[])
     photo.photo_url = photo_url
-    photo.rating = 0
+    photo.status = status
+    photo.content_hash = content_hash
+    photo.variants = variants
     db.add(photo)
-    db.commit()
-    db.refresh(photo)
+    if count_upload:
+        await db.execute(update(User).where(User.id == user.id).values(uploaded_photos=User.uploaded_photos + 1))
+    await db.commit()
+    await refresh_photo(photo, db)
+    await response_cache.invalidate('photos', f'users:{user.email}')
+    search_backend.index_photo(photo.id, photo.name, photo.description, [])
+    if photo_url is not None:
+        qr_codes.prepare(photo_url)
     return photo
 
 
-def get_qrcode(photo_id: int, db: Session):
+async def get_photo_url_by_hash(content_hash: str, db: AsyncSession) -> str | None:
     """
-    Returns qr code encoding the url of the photo
+    Returns the url of an already uploaded photo with the same content, so identical files are stored once.
 
-    :param photo_id: int: ID of the photo.
-    :param db: Session: Pass in the database session
-    :return: The qr code as a byte array
+    :param content_hash: str: sha256 of the file
+    :param db: AsyncSession: Access the database
+    :return: The photo_url of a ready photo with this content, or None
     """
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    if photo:
-        code = qrcode.make(photo.photo_url)
-        bytes_code = io.BytesIO()
-        code.save(bytes_code, format='PNG')
-        return bytes_code.getvalue()
-    return photo
+    result = await db.execute(select(Photo.photo_url)
+                              .where(Photo.content_hash == content_hash, Photo.status == 'ready').limit(1))
+    return result.scalar_one_or_none()
+
+
+async def finalize_photo(photo_id: int, user_id: int, photo_url: str, db: AsyncSession,
+                         variants: dict[str, str] | None = None) -> str | None:
+    """
+    Marks a pending photo as uploaded and bumps the owner's uploaded_photos counter in a single transaction.
+
+    :param photo_id: int: The photo that was uploaded
+    :param user_id: int: The owner of the photo
+    :param photo_url: str: The url of the uploaded file
+    :param db: AsyncSession: Access the database
+    :param variants: dict[str, str]: Urls of the transformation presets of the uploaded file
+    :return: The email of the owner, or None if the photo was deleted while uploading
+    """
+    result = await db.execute(update(Photo).where(Photo.id == photo_id, Photo.status == 'pending')
+                              .values(photo_url=photo_url, variants=variants, status='ready').returning(Photo.id))
+    if result.scalar_one_or_none() is None:
+        await db.rollback()
+        return None
+    email = await db.execute(update(User).where(User.id == user_id)
+                             .values(uploaded_photos=User.uploaded_photos + 1).returning(User.email))
+    email = email.scalar_one_or_none()
+    await db.commit()
+    await response_cache.invalidate('photos', f'users:{email}')
+    qr_codes.prepare(photo_url)
+    return email
+
+
+async def create_pending_photos(photos: list[tuple[PhotoModel, str]], user_id: int, db: AsyncSession) -> list[int]:
+    """
+    Creates the rows of a bulk upload with status 'pending' in one INSERT and one commit.
+
+    :param photos: list[tuple[PhotoModel, str]]: Name and description of each photo with the sha256 of its file
+    :param user_id: int: The owner of the photos
+    :param db: AsyncSession: Access the database
+    :return: The ids of the new photos, in the order of photos
+    """
+    rows = [{'name': body.name, 'description': body.description, 'content_hash': content_hash, 'user_id': user_id,
+             'status': 'pending'} for body, content_hash in photos]
+    result = await db.scalars(insert(Photo).returning(Photo.id, sort_by_parameter_order=True), rows)
+    photo_ids = result.all()
+    await db.commit()
+    await response_cache.invalidate('photos')
+    for photo_id, (body, _) in zip(photo_ids, photos):
+        search_backend.index_photo(photo_id, body.name, body.description, [])
+    return photo_ids
 
 
-def update_photo(photo_id: int, body: PhotoUpdate, db: Session, user: User):
+async def finalize_photos(user_id: int, uploaded: list[tuple[int, str, dict[str, str]]], failed: list[int],
+                          db: AsyncSession) -> str | None:
+    """
+    Finalises the photos of a bulk upload in a single transaction: one UPDATE sets the urls and variants of all
+    uploaded photos, one marks the failed ones and the owner's uploaded_photos counter is bumped once by the number
+    of photos that became ready.
+
+    :param user_id: int: The owner of the photos
+    :param uploaded: list[tuple[int, str, dict[str, str]]]: Id, url and variants of each uploaded photo
+    :param failed: list[int]: Ids of the photos that could not be uploaded
+    :param db: AsyncSession: Access the database
+    :return: The email of the owner
+    """
+    ready = []
+    if uploaded:
+        data = values(column('id', Integer), column('photo_url', String), column('variants', JSONB),
+                      name='uploaded').data(uploaded)
+        result = await db.execute(update(Photo).where(Photo.id == data.c.id, Photo.status == 'pending')
+                                  .values(photo_url=data.c.photo_url, variants=data.c.variants, status='ready')
+                                  .returning(Photo.photo_url).execution_options(synchronize_session=False))
+        ready = result.scalars().all()
+    if failed:
+        await db.execute(update(Photo).where(Photo.id.in_(failed), Photo.status == 'pending').values(status='failed')
+                         .execution_options(synchronize_session=False))
+    email = await db.execute(update(User).where(User.id == user_id)
+                             .values(uploaded_photos=User.uploaded_photos + len(ready)).returning(User.email))
+    email = email.scalar_one_or_none()
+    await db.commit()
+    await response_cache.invalidate('photos', f'users:{email}')
+    for photo_url in set(ready):
+        qr_codes.prepare(photo_url)
+    return email
+
+
+async def fail_photo(photo_id: int, db: AsyncSession):
+    """
+    Marks a pending photo whose upload could not be completed as failed.
+
+    :param photo_id: int: The photo that failed to upload
+    :param db: AsyncSession: Access the database
+    """
+    await db.execute(update(Photo).where(Photo.id == photo_id, Photo.status == 'pending').values(status='failed'))
+    await db.commit()
+    await response_cache.invalidate('photos')
+
+
+async def get_photo_urls(photo_ids: list[int], db: AsyncSession) -> dict[int, str]:
+    """
+    Returns the urls of the uploaded photos among the given ids, which is all a qr code needs.
+
+    :param photo_ids: list[int]: ID of the photos.
+    :param db: AsyncSession: Pass in the database session
+    :return: A dictionary of photo id to url, photos that don't exist or have no url yet are left out
+    """
+    result = await db.execute(select(Photo.id, Photo.photo_url)
+                              .where(Photo.id.in_(photo_ids), Photo.photo_url.is_not(None)))
+    return dict(result.all())
+
+
+async def get_photo_variants(photo_id: int, db: AsyncSession) -> dict[str, str] | None:
+    """
+    Returns the stored urls of the transformation presets of a photo, without loading the photo itself.
+
+    :param photo_id: int: ID of the photo
+    :param db: AsyncSession: Pass in the database session
+    :return: A dictionary of preset name to url, empty while the photo is being uploaded, or None if there is
+        no such photo
+    """
+    result = await db.execute(select(Photo.variants).where(Photo.id == photo_id))
+    row = result.one_or_none()
+    if row is None:
+        return None
+    return row.variants or {}
+
+
+async def update_photo(photo_id: int, body: PhotoUpdate, db: AsyncSession, user: User):
     """
     The update_photo function updates the description of a photo in the database.
     Args:
@@ -102,79 +242,157 @@ def update_photo(photo_id: int, body: PhotoUpdate, db: Session, user: User):
 
     :param photo_id: int: Identify the photo to be updated
     :param body: PhotoUpdate: Pass in the new photo description
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :param user: User: Ensure that the user is authorized to update the photo
     :return: A photo object
     :doc-author: Trelent
     """
-    sq = select(Photo).filter_by(id=photo_id, user=user)
-    result = db.execute(sq)
+    sq = select(Photo).options(*PHOTO_LOADERS).filter_by(id=photo_id, user=user)
+    result = await db.execute(sq)
     photo = result.scalar_one_or_none()
     if photo is None:
         return None
     photo.name = body.name
     photo.description = body.description
-    db.commit()
-    db.refresh(photo)
+    await db.commit()
+    await refresh_photo(photo, db)
+    await response_cache.invalidate('photos')
+    search_backend.index_photo(photo.id, photo.name, photo.description, [tag.name for tag in photo.tags])
     return photo
 
 
-def remove_photo(photo_id: int, db: Session, user: User):
+async def remove_photo(photo_id: int, db: AsyncSession, user: User):
     """
     The remove_photo function removes a photo from the database.
     Args:
     photo_id (int): The id of the photo to be removed.
-    db (Session): A connection to the database.  This is used for querying and deleting photos
+    db (AsyncSession): A connection to the database.  This is used for querying and deleting photos
     from the database.
 
     user (User): The user who owns this particular photo, and therefore has permission to delete it.
     
     :param photo_id: int: Identify the photo to be removed
-    :param db: Session: Pass in the database session
+    :param db: AsyncSession: Pass in the database session
     :param user: User: Check if the user is authorized to delete a photo
     :return: The photo object that was deleted
     :doc-author: Trelent
     """
-    sq = select(Photo).filter_by(id=photo_id, user=user)
-    result = db.execute(sq)
+    sq = select(Photo).options(*PHOTO_LOADERS).filter_by(id=photo_id, user=user)
+    result = await db.execute(sq)
     photo = result.scalar_one_or_none()
     if photo:
-        db.delete(photo)
-        db.commit()
+        await db.delete(photo)
+        await db.commit()
+        await response_cache.invalidate('photos', f'comments:{photo_id}')
+        search_backend.remove_photo(photo_id)
     return photo
 
 
-def calculate_rating(photo_id: int, db: Session) -> int:
+async def refresh_photo(photo: Photo, db: AsyncSession):
     """
-    Calculates rating of a specific photo.
+    Reloads a photo after a commit: the values set by the database (timestamps, rating) and its tags,
+    which a plain refresh expires because of their raise_on_sql loader.
 
-    :param photo_id: The ID of the photo to calculate rating.
-    :type photo_id: int
-    :param db: Pass in the database
-    :type db:
-    :return: Calculated rating.
-    :rtype: int
+    :param photo: Photo: The photo to reload
+    :param db: AsyncSession: Access the database
     """
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
-    if photo:
-        ratings = get_ratings(db, photo_id=photo_id)
-        rating_avg = 0
-        if len(ratings):
-            n_ratings = [r.rating for r in ratings]
-            rating_avg = float(sum(n_ratings)) / len(n_ratings)
-        photo.rating = rating_avg
-        db.commit()
-        db.refresh(photo)
-    return rating_avg
-
-
-def update_photo_in_db(photo, session: Session):
+    await db.refresh(photo)
+    await db.refresh(photo, ['tags'])
+
+
+async def update_photo_in_db(photo, session: AsyncSession):
     session.add(photo)
-    session.commit()
-    session.refresh(photo)
+    await session.commit()
+    await refresh_photo(photo, session)
+    await response_cache.invalidate('photos')
+    search_backend.index_photo(photo.id, photo.name, photo.description, [tag.name for tag in photo.tags])
     return photo
 
 
-def get_photo_user(photo_id: int, db: Session, user: User):
-    photo = db.query(Photo).filter(and_(Photo.id == photo_id, Photo.user == user)).first()
+async def add_tags(photo: Photo, names: list[str], db: AsyncSession):
+    """
+    The add_tags function attaches tags to a photo, creating the tags that don't exist yet.
+    It takes two statements whatever the number of tags: one upsert into tags that returns the ids of new and
+    existing tags, and one multi-row insert into photo_m2m_tag that skips tags the photo already has.
+
+    :param photo: Photo: The photo to tag
+    :param names: list[str]: Names of the tags
+    :param db: AsyncSession: Access the database
+    :return: The photo with its tags
+    """
+    names = list(dict.fromkeys(names))
+    upsert = insert(Tag).values([{'name': name} for name in names])
+    upsert = upsert.on_conflict_do_update(index_elements=['name'], set_={'name': upsert.excluded.name})
+    tag_ids = await db.scalars(upsert.returning(Tag.id))
+    await db.execute(insert(photo_m2m_tag).values([{'photo_id': photo.id, 'tag_id': tag_id} for tag_id in tag_ids])
+                     .on_conflict_do_nothing())
+    await db.commit()
+    await db.refresh(photo, ['tags'])
+    await response_cache.invalidate('photos', 'tags')
+    search_backend.index_photo(photo.id, photo.name, photo.description, [tag.name for tag in photo.tags])
     return photo
+
+
+async def get_photo_user(photo_id: int, db: AsyncSession, user: User):
+    photo = await db.execute(select(Photo).options(*PHOTO_LOADERS)
+                             .filter(and_(Photo.id == photo_id, Photo.user == user)))
+    return photo.scalar_one_or_none()
+
+
+async def get_photos_by_id(photo_ids: list[int], db: AsyncSession):
+    """
+    The get_photos_by_id function loads the photos with the given ids, keeping the order of the ids.
+    Ids of photos that don't exist (anymore) are skipped.
+
+    :param photo_ids: list[int]: The ids of the photos
+    :param db: AsyncSession: Access the database
+    :return: A list of photos
+    """
+    photos = await db.execute(select(Photo).options(*PHOTO_LOADERS).where(Photo.id.in_(photo_ids)))
+    photos = {photo.id: photo for photo in photos.scalars()}
+    return [photos[photo_id] for photo_id in photo_ids if photo_id in photos]
+
+
+def build_search_query(text: str) -> str | None:
+    """
+    Builds a tsquery that matches every word of the text as a prefix, so "sun bea" finds "sunset beach".
+    Only word characters are kept, the user input can't inject tsquery operators.
+
+    :param text: str: The search text
+    :return: The tsquery string, or None if the text has no words
+    """
+    words = re.findall(r'\w+', text.lower())
+    if not words:
+        return None
+    return ' & '.join(f'{word}:*' for word in words)
+
+
+async def search_photos(text: str, limit: int, offset: int, db: AsyncSession):
+    """
+    The search_photos function finds photos by name, description or tag.
+    Name and description are matched with the full-text index (photo.search_vector, GIN), name matches rank
+    above description matches, and photos that have a tag named exactly like the text are merged into the same
+    query and ranked first.
+
+    :param text: str: The search text
+    :param limit: int: Limit the number of photos returned
+    :param offset: int: The number of ranked results to skip
+    :param db: AsyncSession: Access the database
+    :return: A list of photos, best matches first
+    """
+    # every branch yields (photo id, rank) from its own index; only the ids of the requested page are joined
+    # back to photo, so the full rows of the other matches are never read
+    matches = [select(photo_m2m_tag.c.photo_id.label('id'), literal(1.0, Float).label('rank'))
+               .join(Tag, Tag.id == photo_m2m_tag.c.tag_id).where(Tag.name == text)]
+    ts_query = build_search_query(text)
+    if ts_query is not None:
+        ts_query = func.to_tsquery(SEARCH_CONFIG, ts_query)
+        matches.append(select(Photo.id, cast(func.ts_rank(Photo.search_vector, ts_query), Float).label('rank'))
+                       .where(Photo.search_vector.op('@@')(ts_query)))
+    matches = union_all(*matches).subquery()
+    page = (select(matches.c.id, func.sum(matches.c.rank).label('rank')).group_by(matches.c.id)
+            .order_by(func.sum(matches.c.rank).desc(), matches.c.id.desc()).offset(offset).limit(limit).subquery())
+    sq = (select(Photo).options(*PHOTO_LOADERS).join(page, page.c.id == Photo.id)
+          .order_by(page.c.rank.desc(), Photo.id.desc()))
+    photos = await db.execute(sq)
+    return photos.scalars().all()
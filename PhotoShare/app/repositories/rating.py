@@ -1,17 +1,21 @@
 from typing import List
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete, exists, values, column, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from PhotoShare.app.models.photo import Photo
 from PhotoShare.app.models.rating import Rating
-from PhotoShare.app.schemas.rating import RatingModel
+from PhotoShare.app.schemas.rating import RatingModel, RatingBatchItem
+from PhotoShare.app.services.response_cache import response_cache
 
 
-def get_ratings(db: Session, photo_id: int = 0, user_id: int = 0) -> List[Rating]:
+async def get_ratings(db: AsyncSession, photo_id: int = 0, user_id: int = 0) -> List[Rating]:
     """
     Returns list of ratings.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param photo_id: Id of the photo which rating to find. If 0 finds ratings on all photos.
     :type photo_id: int
     :param user_id: Id of the user whose rating to find. If 0 finds ratings by all users.
@@ -19,36 +23,36 @@ def get_ratings(db: Session, photo_id: int = 0, user_id: int = 0) -> List[Rating
     :return: The list of ratings.
     :rtype: List[int]
     """
-    if photo_id and user_id:
-        ratings = db.query(Rating).filter(Rating.photo_id == photo_id, Rating.user_id == user_id).all()
-    elif photo_id and not user_id:
-        ratings = db.query(Rating).filter(Rating.photo_id == photo_id).all()
-    elif user_id and not photo_id:
-        ratings = db.query(Rating).filter(Rating.user_id == user_id).all()
-    else:
-        ratings = db.query(Rating).all()
+    sq = select(Rating)
+    if photo_id:
+        sq = sq.filter(Rating.photo_id == photo_id)
+    if user_id:
+        sq = sq.filter(Rating.user_id == user_id)
+    ratings = await db.execute(sq)
+    return ratings.scalars().all()
 
-    return ratings
 
-
-def get_rating(rating_id: int, db: Session) -> Rating:
+async def get_rating(rating_id: int, db: AsyncSession) -> Rating:
     """
     Returns a rating with the specified ID.
 
     :param rating_id: The ID of the rating to be found.
     :type rating_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The found rating.
     :rtype: Rating
     """
-    rating = db.query(Rating).filter(Rating.id == rating_id).first()
-    return rating
+    rating = await db.execute(select(Rating).filter(Rating.id == rating_id))
+    return rating.scalars().first()
 
 
-def add_rating(body: RatingModel, photo_id: int, user_id: int, db: Session) -> Rating:
+async def add_rating(body: RatingModel, photo_id: int, user_id: int, db: AsyncSession) -> Rating | None:
     """
-    Posts a new rating rating.
+    Posts a new rating rating. The insert skips the rating if the user has already rated the photo (unique
+    (photo_id, user_id) index), so there is no separate check that could race with a concurrent request.
+    The running sum and count of the photo's ratings are updated in the same transaction, so the average rating
+    of the photo never has to be recomputed from all its ratings.
 
     :param body: Data for creating a rating.
     :type body: RatingModel
@@ -57,30 +61,114 @@ def add_rating(body: RatingModel, photo_id: int, user_id: int, db: Session) -> R
     :param user_id: The ID of the user that posts a rating.
     :type user_id: int
     :param db: The database session.
-    :type db: Session
-    :return: New rating.
-    :rtype: Rating
+    :type db: AsyncSession
+    :return: New rating, or None if the user has already rated the photo.
+    :rtype: Rating | None
     """
-    rating = Rating(rating=body.rating, user_id=user_id, photo_id=photo_id)
-    db.add(rating)
-    db.commit()
-    db.refresh(rating)
+    rating = await db.scalar(insert(Rating).values(rating=body.rating, user_id=user_id, photo_id=photo_id)
+                             .on_conflict_do_nothing(index_elements=['photo_id', 'user_id']).returning(Rating))
+    if rating is None:
+        await db.rollback()
+        return None
+    await db.execute(update_photo_rating(photo_id, body.rating, 1))
+    await db.commit()
+    await response_cache.invalidate('photos')
     return rating
 
 
-def delete_rating(rating_id: int, db: Session) -> Rating:
+async def delete_rating(rating_id: int, db: AsyncSession) -> Rating | None:
     """
-    Deletes a specified rating.
+    Deletes a specified rating and takes it out of the photo's running sum and count in the same transaction.
 
     :param rating_id: ID of the rating to be deleted.
     :type rating_id: int
     :param db: The database session.
-    :type db: Session
-    :return: The deleted rating.
-    :rtype: Rating
+    :type db: AsyncSession
+    :return: The deleted rating, or None if it does not exist or was deleted by a concurrent request.
+    :rtype: Rating | None
     """
-    rating = db.query(Rating).filter(Rating.id == rating_id).first()
-    if rating:
-        db.delete(rating)
-        db.commit()
+    # only the request whose DELETE removed the row takes the rating out of the totals
+    rating = await db.scalar(delete(Rating).where(Rating.id == rating_id).returning(Rating))
+    if rating is None:
+        await db.rollback()
+        return None
+    await db.execute(update_photo_rating(rating.photo_id, -rating.rating, -1))
+    await db.commit()
+    await response_cache.invalidate('photos')
     return rating
+
+
+def update_photo_rating(photo_id: int, rating: int, count: int):
+    """
+    Returns the statement that adds a rating to the running sum and count of a photo (or removes it, with negative
+    values). The update is relative, so concurrent ratings of the same photo are not lost.
+
+    :param photo_id: The ID of the rated photo.
+    :type photo_id: int
+    :param rating: The value added to the sum of ratings.
+    :type rating: int
+    :param count: The value added to the number of ratings.
+    :type count: int
+    :return: The update statement.
+    """
+    return (update(Photo).where(Photo.id == photo_id)
+            .values(rating_sum=Photo.rating_sum + rating, rating_count=Photo.rating_count + count))
+
+
+async def add_ratings(items: List[RatingBatchItem], user_id: int, db: AsyncSession) -> tuple[List[dict], List[dict]]:
+    """
+    Posts many ratings of one user at once, with a fixed number of queries per batch: one query checks all photos
+    (exists, owner, already rated), one multi-row insert adds the ratings, skipping the ones that hit the unique
+    (photo_id, user_id) index because of a concurrent request, and one update adds the batch to the running sum and
+    count of every rated photo.
+
+    :param items: The photo IDs and ratings. Only the first rating of a photo in the batch is used.
+    :type items: List[RatingBatchItem]
+    :param user_id: The ID of the user that posts the ratings.
+    :type user_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The created ratings and the rejected photo IDs with the reason.
+    :rtype: tuple[List[dict], List[dict]]
+    """
+    ratings, rejected = {}, []
+    for item in items:
+        if item.photo_id in ratings:
+            rejected.append({'photo_id': item.photo_id, 'detail': 'duplicate photo in the batch'})
+        else:
+            ratings[item.photo_id] = item.rating
+    rated = exists().where(Rating.photo_id == Photo.id, Rating.user_id == user_id)
+    photos = await db.execute(select(Photo.id, Photo.user_id, rated).where(Photo.id.in_(ratings)))
+    photos = {photo_id: (owner_id, is_rated) for photo_id, owner_id, is_rated in photos}
+    for photo_id in list(ratings):
+        if photo_id not in photos:
+            detail = 'Photo not found'
+        elif photos[photo_id][0] == user_id:
+            detail = 'the user can not rate their own photo'
+        elif photos[photo_id][1]:
+            detail = 'current user have already rated this photo'
+        else:
+            continue
+        del ratings[photo_id]
+        rejected.append({'photo_id': photo_id, 'detail': detail})
+    if not ratings:
+        return [], rejected
+
+    created = await db.execute(
+        insert(Rating).values([{'photo_id': photo_id, 'user_id': user_id, 'rating': rating}
+                               for photo_id, rating in ratings.items()])
+        .on_conflict_do_nothing(index_elements=['photo_id', 'user_id'])
+        .returning(Rating.id, Rating.photo_id, Rating.user_id, Rating.rating))
+    created = [dict(row) for row in created.mappings()]
+    for photo_id in ratings.keys() - {row['photo_id'] for row in created}:
+        rejected.append({'photo_id': photo_id, 'detail': 'current user have already rated this photo'})
+    if created:
+        totals = values(column('photo_id', Integer), column('rating', Integer), name='totals').data(
+            [(row['photo_id'], row['rating']) for row in created])
+        await db.execute(update(Photo).where(Photo.id == totals.c.photo_id)
+                         .values(rating_sum=Photo.rating_sum + totals.c.rating, rating_count=Photo.rating_count + 1)
+                         .execution_options(synchronize_session=False))
+    await db.commit()
+    if created:
+        await response_cache.invalidate('photos')
+    return created, rejected
@@ -1,69 +1,75 @@
 from typing import List
 
 from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from PhotoShare.app.models.photo import Tag
 from PhotoShare.app.schemas.photo import TagModel
+from PhotoShare.app.services.response_cache import response_cache
+from PhotoShare.app.services.search import search_backend
 
 
-def get_tags(offset: int, limit: int, db: Session) -> List[Tag]:
+async def get_tags(after_id: int | None, limit: int, db: AsyncSession) -> List[Tag]:
 
     """
-    The get_tags function returns a list of tags from the database.
+    The get_tags function returns a page of tags from the database ordered by id.
         Args:
-            offset (int): The number of items to skip before starting to collect the result set.
-            limit (int): The numbers of items to return after offset has been applied.
+            after_id (int): The id of the last tag of the previous page, None for the first page.
+            limit (int): The numbers of items to return.
 
-    :param offset: int: Specify the offset of the first row to return
+    :param after_id: int: Start after the tag with this id
     :param limit: int: Limit the number of tags returned
-    :param db: Session: Pass the database session to the function
+    :param db: AsyncSession: Pass the database session to the function
     :return: A list of tags
     :doc-author: Trelent
     """
-    sq = select(Tag).offset(offset).limit(limit)
-    tags = db.execute(sq)
+    sq = select(Tag).order_by(Tag.id).limit(limit)
+    if after_id is not None:
+        sq = sq.where(Tag.id > after_id)
+    tags = await db.execute(sq)
     return tags.scalars().all()
 
 
-def get_tag(tag_id: int, db: Session):
+async def get_tag(tag_id: int, db: AsyncSession):
 
     """
     The get_tag function returns a single tag from the database.
         Args:
             tag_id (int): The id of the desired tag.
-            db (Session): A connection to the database.
+            db (AsyncSession): A connection to the database.
 
     :param tag_id: int: Specify the id of the tag we want to get
-    :param db: Session: Pass the database session into the function
+    :param db: AsyncSession: Pass the database session into the function
     :return: A single row from the tag table
     :doc-author: Trelent
     """
     sq = select(Tag).filter_by(id=tag_id)
-    tag = db.execute(sq)
+    tag = await db.execute(sq)
     return tag.scalar_one_or_none()
 
 
-def create_tag(body: TagModel, db: Session) -> Tag:
+async def create_tag(body: TagModel, db: AsyncSession) -> Tag:
 
     """
     The create_tag function creates a new tag in the database.
 
     :param body: TagModel: Specify the type of data that will be passed into the function
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The created tag object
     :doc-author: Trelent
     """
-    tag = db.query(Tag).filter_by(name=body.name).first()
+    tag = await db.execute(select(Tag).filter_by(name=body.name))
+    tag = tag.scalar_one_or_none()
     if tag is None:
         tag = Tag(name=body.name)
         db.add(tag)
-        db.commit()
-        db.refresh(tag)
+        await db.commit()
+        await db.refresh(tag)
+        await response_cache.invalidate('tags')
     return tag
 
 
-def update_tag(tag_id: int, body: TagModel, db: Session) -> Tag | None:
+async def update_tag(tag_id: int, body: TagModel, db: AsyncSession) -> Tag | None:
 
     """
     The update_tag function updates a tag in the database.
@@ -73,20 +79,24 @@ def update_tag(tag_id: int, body: TagModel, db: Session) -> Tag | None:
 
     :param tag_id: int: Identify the tag to be updated
     :param body: TagModel: Pass in the new tag name
-    :param db: Session: Access the database
+    :param db: AsyncSession: Access the database
     :return: The updated tag object
     :doc-author: Trelent
     """
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
+    tag = await get_tag(tag_id, db)
     if tag:
-        tag .name = body.name
-        db.commit()
+        old_name, tag.name = tag.name, body.name
+        await db.commit()
+        await response_cache.invalidate('tags', 'photos')
+        search_backend.rename_tag(old_name, tag.name)
     return tag
 
 
-def remove_tag(tag_id: int, db: Session) -> Tag | None:
-    tag = db.query(Tag).filter(Tag.id == tag_id).first()
+async def remove_tag(tag_id: int, db: AsyncSession) -> Tag | None:
+    tag = await get_tag(tag_id, db)
     if tag:
-        db.delete(tag)
-        db.commit()
+        await db.delete(tag)
+        await db.commit()
+        await response_cache.invalidate('tags', 'photos')
+        search_backend.remove_tag(tag.name)
     return tag
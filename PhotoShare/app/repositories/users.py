@@ -1,65 +1,73 @@
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from libgravatar import Gravatar
 
 from PhotoShare.app.models.user import User
 from PhotoShare.app.schemas.user import UserRegisterModel
-from PhotoShare.app.services.auth_service import get_password_hash, create_access_token, create_refresh_token
+from PhotoShare.app.services.auth_service import create_access_token, create_refresh_token
+from PhotoShare.app.services.passwords import password_pool
+from PhotoShare.app.services.response_cache import response_cache
+from PhotoShare.app.services.user_cache import user_cache
 
 
-def update_user(user: User, session: Session):
+async def update_user(user: User, session: AsyncSession):
     """
-    Функція update_user user та session для роботи з базою даних
+    Функція update_user user та session для роботи з базою даних. Після збереження користувач видаляється з user_cache,
+    а його профіль і списки фото (з його username) - з кешу відповідей
     Args:
     user: User: об'єкт користувача
-    session: Session: Передаємо об’єкт сеансу функції
+    session: AsyncSession: Передаємо об’єкт сеансу функції
     Returns:
     Оновлений об’єкт користувача
     """
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await user_cache.invalidate(user.email)
+    await response_cache.invalidate(f'users:{user.email}', 'photos')
+    await session.refresh(user)
     return user
 
 
-def get_user_by_email(email: str, session: Session):
+async def get_user_by_email(email: str, session: AsyncSession):
     """
     Функція get_user_by_email приймає електронний лист і сеанс,
     і повертає користувача з цією електронною поштою. Якщо такого користувача не існує, повертається None.
 
     Args:
     email: str: Вказуємо email користувача, якого ми хочемо отримати
-    session: Session: Передаємо об’єкт сеансу функції
+    session: AsyncSession: Передаємо об’єкт сеансу функції
 
     Returns:
     Об’єкт користувача, який відповідає наданій адресі електронної пошти
     """
-    user = session.query(User).filter_by(email=email).first()
-    return user
+    user = await session.execute(select(User).filter_by(email=email))
+    return user.scalars().first()
 
 
-def create_user(body: UserRegisterModel, session: Session):
+async def create_user(body: UserRegisterModel, session: AsyncSession):
     """
     Функція create_user створює нового користуваа в базі данних
 
     Args:
     email: str: Вказуємо email і пароль в body запиту користувача, якого ми хочемо створити
-    session: Session: Передаємо об’єкт сеансу функції
+    session: AsyncSession: Передаємо об’єкт сеансу функції
 
     Returns:
     Об'єкт класу User користувача якаго ми створили в базі даних
     """
-    is_db_full = session.query(User).first()
+    is_db_full = await session.execute(select(User.id).limit(1))
+    is_db_full = is_db_full.scalars().first()
     try:
         g = Gravatar(body.email)
         avatar = g.get_image()
     except Exception as err:
         raise err
-    user = get_user_by_email(body.email, session)
+    user = await get_user_by_email(body.email, session)
     if user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                             detail='User exists already')
-    hashed_password = get_password_hash(password=body.password)
+    hashed_password = await password_pool.hash(body.password)
     user = User(email=body.email,
                 password=hashed_password,
                 avatar=avatar,
@@ -70,43 +78,44 @@ def create_user(body: UserRegisterModel, session: Session):
     user.username = None if body.username == "string" else body.username
     if not is_db_full:
         user.role = 'admin'
-    user = update_user(user, session)
+    user = await update_user(user, session)
     return user
 
 
-def set_user_confirmation(email: str, session: Session):
+async def set_user_confirmation(email: str, session: AsyncSession):
     """
     Функція set_user_confirmation встановлює для статусу підтвердження користувача значення True.
 
     Args:
     email: str: Email користувача
-    session: Session: Передача сеанса бази даних у функцію
+    session: AsyncSession: Передача сеанса бази даних у функцію
 
     Returns:
     Об'єкт користувача
     """
-    user = get_user_by_email(email, session)
+    user = await get_user_by_email(email, session)
     if user:
         user.confirmed = True
-        session.commit()
+        await session.commit()
+        await user_cache.invalidate(email)
     return user
 
 
-def user_login(email: str, session: Session):
+async def user_login(email: str, session: AsyncSession):
     """
     Функція user_login вибирає користуваа з бази даних, email якого ми передали як аргумент у ф-цію. Створює access та
     refresh токени
 
     Args:
     email: str: Email користувача
-    session: Session: Передача сеанса бази даних у функцію
+    session: AsyncSession: Передача сеанса бази даних у функцію
 
     Returns:
     Об'єкт користувача, access та refresh_token
     """
     access_token = None
     refresh_token = None  # noqa
-    user = get_user_by_email(email, session)
+    user = await get_user_by_email(email, session)
     if user:
         if user.banned:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail='Operation not permitted')
@@ -115,27 +124,29 @@ def user_login(email: str, session: Session):
         access_token = create_access_token(data={"email": user.email})
         refresh_token = create_refresh_token(data={"email": user.email})  # noqa
         user.refresh_token = refresh_token
-        session.commit()
+        await session.commit()
+        await user_cache.invalidate(email)
         return user, access_token, refresh_token
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not Found")
 
 
-def reset_refresh_token(user, session: Session):
+async def reset_refresh_token(user, session: AsyncSession):
     """
     Функція reset_refresh_token скидає значення поля refresh_token в базі данних
 
     Args:
     user: User: об'єкт користувача
-    session: Session: Передача сеанса бази даних у функцію
+    session: AsyncSession: Передача сеанса бази даних у функцію
 
     Returns:
     співпрограмму для виконання в EventLoop
     """
     user.refresh_token = None
-    session.commit()
+    await session.commit()
+    await user_cache.invalidate(user.email)
 
 
-def refresh_token(email: str, token: str, session: Session):
+async def refresh_token(email: str, token: str, session: AsyncSession):
     """
     Функція refresh_token використовується для оновлення маркера доступу (access_token) та маркера оновлення
     (refresh_token).
@@ -148,18 +159,19 @@ def refresh_token(email: str, token: str, session: Session):
     Args:
     email: str: Email користувача
     token: str: Токен взятий з request
-    session: Session: Передача сеанса бази даних у функцію
+    session: AsyncSession: Передача сеанса бази даних у функцію
 
     Returns:
     access_token та refresh_token
     """
-    user = get_user_by_email(email, session)
+    user = await get_user_by_email(email, session)
     if user.refresh_token != token:
-        reset_refresh_token(user=user, session=session)
+        await reset_refresh_token(user=user, session=session)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
 
     access_token = create_access_token(data={"email": user.email})  # noqa
     refresh_token = create_refresh_token(data={"email": user.email})  # noqa
     user.refresh_token = refresh_token
-    session.commit()
+    await session.commit()
+    await user_cache.invalidate(email)
     return access_token, refresh_token
@@ -1,6 +1,5 @@
 from datetime import datetime
 
-from fastapi import Form, UploadFile
 from pydantic import BaseModel, Field
 
 from PhotoShare.app.schemas.user import UserPhotoRespond, UserRespond
@@ -17,12 +16,6 @@ class TagResponse(TagModel):
         from_attributes = True
 
 
-class CreateModelPhoto(BaseModel):
-    name: str = Form(...)
-    description: str = Form(...)
-    file: UploadFile = Form(...)
-
-
 class PhotoModel(BaseModel):
     name: str = Field(max_length=150, min_length=3)
     description: str = Field(max_length=300, min_length=3)
@@ -33,13 +26,29 @@ class PhotoUpdate(PhotoModel):
     ...
 
 
+class PhotoStatusResponse(BaseModel):
+    id: int
+    status: str
+    photo_url: str | None
+
+    class Config:
+        from_attributes = True
+
+
+class PhotoVariantsResponse(BaseModel):
+    id: int
+    variants: dict[str, str]
+
+
 class PhotoResponse(PhotoModel):
     id: int = 1
-    photo_url: str
+    photo_url: str | None
+    variants: dict[str, str] | None = None
+    status: str = 'ready'
     created_at: datetime | None
     updated_at: datetime | None
     user: UserPhotoRespond | None
-    rating: int = 0
+    rating: float = 0
     tags: list[TagModel]
 
     class Config:
@@ -6,4 +6,23 @@ class RatingModel(BaseModel):
 class RatingResponse(RatingModel):
     id: int
     user_id: int
-    photo_id: int
\ No newline at end of file
+    photo_id: int
+
+
+class RatingBatchItem(BaseModel):
+    photo_id: int
+    rating: int = Field(ge=1, le=5)
+
+
+class RatingBatch(BaseModel):
+    ratings: list[RatingBatchItem] = Field(min_length=1, max_length=1000)
+
+
+class RatingRejected(BaseModel):
+    photo_id: int
+    detail: str
+
+
+class RatingBatchResponse(BaseModel):
+    created: list[RatingResponse]
+    rejected: list[RatingRejected]
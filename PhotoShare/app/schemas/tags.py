@@ -1,6 +1,12 @@
-from pydantic import BaseModel
+from typing import Annotated
+
+from pydantic import BaseModel, Field
 
 
 class NewTagModel(BaseModel):
     photo_id : int
     tag: str
+
+
+class NewTagsModel(BaseModel):
+    tags: list[Annotated[str, Field(min_length=1, max_length=25)]] = Field(min_length=1, max_length=5)
@@ -1,11 +1,11 @@
 from datetime import datetime, timedelta
 from pathlib import Path
 
-from passlib.context import CryptContext
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt, JWTError                                                                                  # noqa
 from fastapi import status, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi_mail.errors import ConnectionErrors
 from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
@@ -14,13 +14,10 @@ from PhotoShare.app.core.config import settings
 from PhotoShare.app.core.database import get_db
 from PhotoShare.app.services.redis import RedisService as redis_cache                                           # noqa
 from PhotoShare.app.models.user import User
-from PhotoShare.app.services.logout import (
-    get_revoked_tokens,
-    get_key_from_token,
-    get_valid_token_from_revoked
-)
+from PhotoShare.app.services.jwt_cache import verified_tokens
+from PhotoShare.app.services.logout import is_token_revoked
+from PhotoShare.app.services.user_cache import user_cache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 SECRET_ACCESS_KEY = settings.secret_access_key
 SECRET_REFRESH_KEY = settings.secret_refresh_key
 SECRET_EMAIL_KEY = settings.secret_email_key
@@ -43,32 +40,6 @@ conf = ConnectionConfig(
 )
 
 
-def verify_password(plain_password, hashed_password):
-    """
-    Функція verify_password приймає як аргументи простий текстовий пароль і хешований пароль.
-    Потім він використовує об’єкт pwd_context, щоб перевірити, чи збігається простий текстовий пароль із хешованим
-    пароль.
-
-    Args: hashed_password: збережений хешований пароль із бази даних
-
-    Returns:
-    Логічне значення перевірки на відповідність паролів
-    """
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def get_password_hash(password: str):
-    """
-    Функція get_password_hash приймає пароль як аргумент і повертає хешовану версію цього пароля.
-
-    Args: password: str: Передавача пароля, який потрібно хешувати
-
-    Returns:
-    Хешований пароль
-    """
-    return pwd_context.hash(password)
-
-
 def create_access_token(data: dict, expires_delta: float | None = None):
     """
     Функція create_access_token створює маркер JWT, який використовується для автентифікації користувача.
@@ -139,17 +110,18 @@ def create_email_confirmation_token(data: dict, expires_delta: float | None = No
     return encoded_jwt
 
 
-def get_current_user(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
-                     session: Session = Depends(get_db), cache=Depends(redis_cache.get_redis)):
+async def get_current_user(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme),
+                           session: AsyncSession = Depends(get_db), cache=Depends(redis_cache.get_redis)):
     """
     Функція get_current_user — це залежність, яка використовуватиметься в
     для отримання поточного користувача. Вона приймає додатковий параметр маркера, який
     передається Depends(oauth2_scheme). Схема oauth2 повертає об’єкт типу
     HTTPAuthorizationCredentials, який містить JWT.
+    Користувач спершу шукається в user_cache, і лише при промаху завантажується з бази даних.
 
     Args:
     token: HTTPAuthorizationCredentials: Отримайте маркер jwt із заголовка з поля "авторизація"
-    session: Session: Сессія для роботи з базою даних
+    session: AsyncSession: Сессія для роботи з базою даних
     cache: Redis: Редіс кліент для роботи з кешом
 
     Returns:
@@ -161,23 +133,26 @@ def get_current_user(token: HTTPAuthorizationCredentials = Depends(oauth2_scheme
         headers={"WWW-Authenticate": "Bearer"},
     )
     token = token.credentials
-    tokens_revoked_all = get_revoked_tokens(cache=cache)
-    tokens_revoked_valid = get_valid_token_from_revoked(tokens_revoked_all, cache=cache)
-
-    if get_key_from_token(token) in tokens_revoked_valid:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail='You are not authorizated'
-        )
     try:
-        # Decode JWT
-        payload = jwt.decode(token, SECRET_ACCESS_KEY, algorithms=[ALGORITHM])
+        # Decode JWT, already verified tokens are taken from verified_tokens
+        payload = verified_tokens.decode(token, SECRET_ACCESS_KEY, algorithms=[ALGORITHM])
         email = payload.get("email")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = session.query(User).filter_by(email=email).first()
+
+    if await is_token_revoked(token, cache=cache):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='You are not authorizated'
+        )
+    user = user_cache.get(email, session=session)
+    if user is None:
+        version = user_cache.version()
+        result = await session.execute(select(User).filter_by(email=email))
+        user = result.scalars().first()
+        user_cache.set(user, version)
     return user
 
 
@@ -244,7 +219,7 @@ def get_email_form_confirmation_token(token: str):
     Адреса електронної пошти, пов’язана з маркером
     """
     try:
-        payload = jwt.decode(token, SECRET_EMAIL_KEY, algorithms=[ALGORITHM])
+        payload = verified_tokens.decode(token, SECRET_EMAIL_KEY, algorithms=[ALGORITHM])
         email = payload.get('email')
         return email
     except JWTError:
@@ -264,7 +239,7 @@ def get_email_form_refresh_token(refresh_token: str):
     Електронна адреса користувача, який намагається оновити маркер доступу
     """
     try:
-        payload = jwt.decode(refresh_token, SECRET_REFRESH_KEY, algorithms=[ALGORITHM])
+        payload = verified_tokens.decode(refresh_token, SECRET_REFRESH_KEY, algorithms=[ALGORITHM])
         email = payload.get('email')
         return email
     except JWTError:
@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageColor, ImageDraw, ImageFilter, ImageOps, UnidentifiedImageError
+
+from PhotoShare.app.core.config import settings
+
+# the parameters of a cloudinary transformation the engine understands, in the order they are applied
+TRANSFORM_PARAMS = ('width', 'height', 'crop', 'gravity', 'zoom', 'effect', 'color', 'radius', 'angle')
+CROP_MODES = ('scale', 'fit', 'limit', 'fill', 'thumb', 'crop', 'pad')
+GRAVITY = {
+    'north_west': (0.0, 0.0), 'north': (0.5, 0.0), 'north_east': (1.0, 0.0),
+    'west': (0.0, 0.5), 'center': (0.5, 0.5), 'east': (1.0, 0.5),
+    'south_west': (0.0, 1.0), 'south': (0.5, 1.0), 'south_east': (1.0, 1.0),
+    # there is no face detection, these keep the center of the photo
+    'auto': (0.5, 0.5), 'face': (0.5, 0.5), 'faces': (0.5, 0.5),
+}
+EFFECTS = ('grayscale', 'sepia', 'negate', 'blur', 'sharpen', 'pixelate')
+JPEG_QUALITY = 85
+# exif orientations that swap width and height
+TRANSPOSED = (5, 6, 7, 8)
+
+
+def parse_options(options: dict) -> dict:
+    """
+    The parse_options function checks the options of a transformation and converts them to their types.
+    Empty options are skipped, so the options of a preset and of a query string give the same result.
+
+    :param options: dict: Transformation parameters as given in TRANSFORM_PARAMS, values may be strings
+    :return: The options that are set, with numbers converted
+    :raises ValueError: for an unknown parameter or an invalid value
+    """
+    parsed = {}
+    for key, value in options.items():
+        if key not in TRANSFORM_PARAMS:
+            raise ValueError(f'Unknown transformation parameter {key}')
+        if value in (None, '', 0, '0'):
+            continue
+        if key in ('width', 'height', 'angle'):
+            value = int(value)
+        elif key == 'zoom':
+            value = float(value)
+        elif key == 'radius':
+            value = 'max' if value == 'max' else int(value)
+        elif key == 'crop' and value not in CROP_MODES:
+            raise ValueError(f'Crop must be one of {", ".join(CROP_MODES)}')
+        elif key == 'gravity' and value not in GRAVITY:
+            raise ValueError(f'Unknown gravity {value}')
+        elif key == 'effect':
+            name, _, strength = value.partition(':')
+            if name not in EFFECTS or strength and not strength.isdigit():
+                raise ValueError(f'Effect must be one of {", ".join(EFFECTS)}, with an optional :strength')
+        elif key == 'color':
+            parse_color(value)
+        if key in ('width', 'height') and not 0 < value <= 10000:
+            raise ValueError(f'{key} must be between 1 and 10000')
+        parsed[key] = value
+    return parsed
+
+
+def transform_key(digest: str, options: dict) -> str:
+    """
+    The transform_key function returns the content address of a transformed photo: the sha256 of the content
+    of the original and of the canonical form of the parsed options.
+
+    :param digest: str: sha256 of the original file
+    :param options: dict: Options returned by parse_options
+    :return: The hex digest
+    """
+    spec = '&'.join(f'{key}={options[key]}' for key in TRANSFORM_PARAMS if key in options)
+    return hashlib.sha256(f'{digest}:{spec}'.encode()).hexdigest()
+
+
+def parse_color(value: str) -> tuple:
+    # cloudinary writes hex colors as rgb:ff0000
+    return ImageColor.getrgb('#' + value[4:] if value.startswith('rgb:') else value)
+
+
+def target_size(size: tuple[int, int], width: int | None, height: int | None) -> tuple[int, int]:
+    # a missing side keeps the aspect ratio of the photo
+    if width and height:
+        return width, height
+    if width:
+        return width, max(1, round(size[1] * width / size[0]))
+    if height:
+        return max(1, round(size[0] * height / size[1])), height
+    return size
+
+
+def open_image(source, options: dict) -> Image.Image:
+    """
+    Opens the photo and, for a JPEG that is scaled down, lets the decoder skip detail: draft mode decodes
+    at 1/2, 1/4 or 1/8 of the size, never smaller than what the transformation needs, which is several times
+    faster than decoding the full image and resizing it.
+    """
+    try:
+        image = Image.open(source)
+    except UnidentifiedImageError as err:
+        raise ValueError('The file is not an image') from err
+    crop = options.get('crop', 'scale')
+    if image.format == 'JPEG' and crop != 'crop' and ('width' in options or 'height' in options):
+        size = image.size
+        if image.getexif().get(0x0112) in TRANSPOSED:
+            size = size[::-1]
+        width, height = target_size(size, options.get('width'), options.get('height'))
+        if crop in ('fill', 'thumb'):
+            # the photo is scaled to cover the box, then cut
+            scale = max(width / size[0], height / size[1]) * options.get('zoom', 1.0)
+            width, height = round(size[0] * scale), round(size[1] * scale)
+        if width < size[0] and height < size[1]:
+            if size != image.size:
+                width, height = height, width
+            image.draft('RGB', (width, height))
+    image = ImageOps.exif_transpose(image)
+    return image.convert('RGBA') if image.mode == 'P' else image
+
+
+def resize(image: Image.Image, options: dict) -> Image.Image:
+    crop = options.get('crop', 'scale')
+    if 'width' not in options and 'height' not in options:
+        return image
+    width, height = target_size(image.size, options.get('width'), options.get('height'))
+    centering = GRAVITY[options.get('gravity', 'center')]
+    if crop == 'scale':
+        return image.resize((width, height), Image.LANCZOS)
+    if crop in ('fit', 'pad') or crop == 'limit' and (width < image.width or height < image.height):
+        fitted = ImageOps.contain(image, (width, height), Image.LANCZOS)
+        if crop != 'pad':
+            return fitted
+        if fitted.mode not in ('RGB', 'RGBA'):
+            fitted = fitted.convert('RGB')
+        return ImageOps.pad(fitted, (width, height), color=parse_color(options.get('color', 'white')),
+                            centering=centering)
+    if crop in ('fill', 'thumb'):
+        zoom = options.get('zoom', 1.0)
+        if zoom > 1:
+            image = ImageOps.fit(image, (round(image.width / zoom), round(image.height / zoom)),
+                                 centering=centering)
+        return ImageOps.fit(image, (width, height), Image.LANCZOS, centering=centering)
+    if crop == 'crop':
+        width, height = min(width, image.width), min(height, image.height)
+        left = round((image.width - width) * centering[0])
+        top = round((image.height - height) * centering[1])
+        return image.crop((left, top, left + width, top + height))
+    return image
+
+
+def apply_effect(image: Image.Image, effect: str) -> Image.Image:
+    name, _, strength = effect.partition(':')
+    if name == 'grayscale':
+        return ImageOps.grayscale(image)
+    if name == 'sepia':
+        return ImageOps.colorize(ImageOps.grayscale(image), '#2e1f0f', '#f5e6c8')
+    if name == 'negate':
+        return ImageOps.invert(image.convert('RGB'))
+    if name == 'blur':
+        return image.filter(ImageFilter.GaussianBlur(int(strength or 100) / 20))
+    if name == 'sharpen':
+        return image.filter(ImageFilter.SHARPEN)
+    # pixelate
+    block = int(strength or 10)
+    small = image.resize((max(1, image.width // block), max(1, image.height // block)), Image.NEAREST)
+    return small.resize(image.size, Image.NEAREST)
+
+
+def round_corners(image: Image.Image, radius) -> Image.Image:
+    image = image.convert('RGBA')
+    mask = Image.new('L', image.size, 0)
+    draw = ImageDraw.Draw(mask)
+    if radius == 'max':
+        draw.ellipse((0, 0, image.width - 1, image.height - 1), fill=255)
+    else:
+        draw.rounded_rectangle((0, 0, image.width - 1, image.height - 1), radius=radius, fill=255)
+    image.putalpha(mask)
+    return image
+
+
+def transform_image(source, options: dict) -> tuple[bytes, str]:
+    """
+    The transform_image function applies a transformation to a photo: resize and crop, effect, rounded
+    corners and rotation, in this order. CPU bound, it runs in the process pool of the ImageEngine.
+
+    :param source: A path or a binary file object of the original photo
+    :param options: dict: Options returned by parse_options
+    :return: The encoded image and its media type (JPEG, or PNG when the photo has transparency)
+    """
+    image = open_image(source, options)
+    image = resize(image, options)
+    if 'effect' in options:
+        image = apply_effect(image, options['effect'])
+    if 'radius' in options:
+        image = round_corners(image, options['radius'])
+    if 'angle' in options:
+        # cloudinary rotates clockwise
+        fill = None if image.mode == 'RGBA' else parse_color(options.get('color', 'white'))
+        image = image.rotate(-options['angle'], Image.BICUBIC, expand=True, fillcolor=fill)
+    output = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(output, format='PNG', optimize=False)
+        return output.getvalue(), 'image/png'
+    image.convert('RGB').save(output, format='JPEG', quality=JPEG_QUALITY)
+    return output.getvalue(), 'image/jpeg'
+
+
+def render_file(source: str, target: str, options: dict) -> str:
+    """
+    Transforms the photo at source and writes it to target atomically. Only paths cross the process
+    boundary, the photo itself is never pickled.
+
+    :return: The media type of the written image
+    """
+    content, media_type = transform_image(source, options)
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+        file.write(content)
+    os.replace(file.name, target)
+    return media_type
+
+
+class ImageEngine:
+    """
+    Local engine for the transformations that Cloudinary applies on its CDN, so they can be served by the local
+    storage, tested and benchmarked offline. Transformations run in a separate process pool and their results
+    are kept in a content-addressed cache on disk (variants/ab/abcdef...), keyed by the content of the original
+    and the transformation, so every variant is rendered once; concurrent requests for a variant that is being
+    rendered wait for the same result. With workers=0 the thread pool of the event loop is used.
+    """
+
+    def __init__(self, workers: int, cache_dir: str):
+        self.workers = workers
+        self.root = Path(cache_dir)
+        self._executor = None
+        self._rendering = {}
+
+    def _get_executor(self):
+        if self.workers and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    async def render(self, source: Path, key: str, options: dict) -> Path:
+        """
+        Returns the path of the variant with the given key, rendering it if it is not cached yet.
+
+        :param source: Path: The original photo
+        :param key: str: The content address of the variant, see transform_key
+        :param options: dict: Options returned by parse_options
+        :return: The path of the cached variant
+        :raises ValueError: if the original is not an image
+        """
+        path = self.path(key)
+        if path.exists():
+            return path
+        rendering = self._rendering.get(key)
+        if rendering is None:
+            rendering = asyncio.get_running_loop().run_in_executor(self._get_executor(), render_file,
+                                                                   str(source), str(path), options)
+            self._rendering[key] = rendering
+            rendering.add_done_callback(lambda _: self._rendering.pop(key, None))
+        await asyncio.shield(rendering)
+        return path
+
+    async def transform(self, source: Path, digest: str, options: dict) -> tuple[Path, str]:
+        """
+        Returns the transformed photo, rendering it if it is not cached yet.
+
+        :param source: Path: The original photo
+        :param digest: str: sha256 of the original photo
+        :param options: dict: Transformation parameters, see parse_options
+        :return: The path of the cached variant and its content address
+        :raises ValueError: for invalid options
+        """
+        options = parse_options(options)
+        key = transform_key(digest, options)
+        return await self.render(source, key, options), key
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_engine = ImageEngine(workers=settings.image_workers, cache_dir=settings.image_cache_dir)
@@ -0,0 +1,63 @@
+import hmac
+import time
+from collections import OrderedDict
+
+from jose import jwt                                                                                            # noqa
+
+from PhotoShare.app.core.config import settings
+
+
+class VerifiedTokenCache:
+    """
+    Обмежений LRU кеш вже перевірених JWT. Ключем є підпис токена разом з ключем та алгоритмами перевірки,
+    значенням - підписана частина (header.payload), час закінчення дії та розкодований payload.
+    Повторний токен не перевіряється HMAC і не розбирається заново, якщо його підписана частина збігається з
+    збереженою, а `exp` ще не настав. Прострочені записи видаляються при зверненні або витісняються як найстаріші.
+    """
+
+    def __init__(self, size: int, enabled: bool = True):
+        self.size = size
+        self.enabled = enabled
+        self._entries = OrderedDict()
+
+    def decode(self, token: str, key: str, algorithms: list) -> dict:
+        """
+        Функція повертає payload токена, спершу шукаючи його серед вже перевірених. При промаху викликається
+        jwt.decode, тому помилки (JWTError, ExpiredSignatureError) такі самі, як і без кешу.
+        Args:
+        token: JWT
+        key: Секретний ключ для перевірки підпису
+        algorithms: Дозволені алгоритми
+        Returns:
+        Словник з payload токена
+        """
+        if not self.enabled or token.count('.') != 2:
+            return jwt.decode(token, key, algorithms=algorithms)
+        signing_input, signature = token.rsplit('.', 1)
+        cache_key = (key, tuple(algorithms), signature)
+        entry = self._entries.get(cache_key)
+        if entry is not None:
+            cached_input, exp, payload = entry
+            if hmac.compare_digest(cached_input, signing_input) and (exp is None or exp > time.time()):
+                self._entries.move_to_end(cache_key)
+                return dict(payload)
+            self._entries.pop(cache_key, None)
+        payload = jwt.decode(token, key, algorithms=algorithms)
+        exp = payload.get('exp')
+        self._entries[cache_key] = (signing_input, exp if isinstance(exp, (int, float)) else None, payload)
+        self._evict()
+        return dict(payload)
+
+    def _evict(self):
+        now = time.time()
+        while self._entries:
+            _, (_, exp, _) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.size and (exp is None or exp > now):
+                break
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+verified_tokens = VerifiedTokenCache(size=settings.jwt_cache_size, enabled=settings.jwt_cache_enabled)
@@ -1,75 +1,112 @@
 from datetime import datetime, timedelta
+import math
 import pickle
 
+from jose import jwt, JWTError                                                                                  # noqa
+
+from PhotoShare.app.core.config import settings
+from PhotoShare.app.services.revocation_filter import RevocationFilter
+
 ACCESS_TOKEN_TTL = 60*15
+REVOKED_TOKEN_PREFIX = 'revoked:'
+REVOKED_TOKENS_CHANNEL = 'revoked_tokens'
+LEGACY_TOKENS_KEY = 'tokens'
+
+revocation_filter = RevocationFilter(prefix=REVOKED_TOKEN_PREFIX,
+                                     capacity=settings.revocation_filter_capacity,
+                                     error_rate=settings.revocation_filter_error_rate,
+                                     rotation=settings.revocation_filter_rotation,
+                                     enabled=settings.revocation_filter_enabled)
 
 
-def add_token_to_revoked(token: str, cache=None) -> dict:
+async def add_token_to_revoked(token: str, cache=None) -> dict:
     """
-    Функція додає дійсний access_token до відкликаних з метою унеможливлення його подальшого використання
+    Функція додає дійсний access_token до відкликаних з метою унеможливлення його подальшого використання.
+    Для кожного токена створюється окремий ключ у Redis, час життя якого дорівнює часу, що залишився до `exp`
+    токена, тому прострочені записи видаляє сам Redis. Ключ також публікується в канал REVOKED_TOKENS_CHANNEL,
+    щоб локальні фільтри відкликаних токенів усіх процесів дізналися про нього.
     Args:
     token (str): Access_token, який буде додано до списку відкликаних маркерів.
     cache: Передаємо об'єкт Redis
     Returns:
-    Словник відкликаних токенів
+    Словник з відкликаним токеном та часом його валідності
     """
     key = get_key_from_token(token=token)
-    token_ttl = datetime.utcnow() + timedelta(seconds=ACCESS_TOKEN_TTL)
-    tokens_revoked_redis = cache.get('tokens')
-    if tokens_revoked_redis:
-        token_revoked = pickle.loads(tokens_revoked_redis)
-        token_revoked.update({key: token_ttl})
-    else:
-        token_revoked = {key: token_ttl}
-    cache.set('tokens', pickle.dumps(token_revoked))
-    return token_revoked
+    token_exp = get_token_expire(token)
+    ttl = math.ceil((token_exp - datetime.utcnow()).total_seconds())
+    if ttl > 0:
+        await cache.set(REVOKED_TOKEN_PREFIX + key, 1, ex=ttl)
+        await cache.publish(REVOKED_TOKENS_CHANNEL, key)
+        revocation_filter.add(key)
+    return {key: token_exp}
 
 
-def update_valid_tokens_redis(tokens: dict, cache=None):
+async def is_token_revoked(token: str, cache=None) -> bool:
     """
-    Функція оноввлює в кеші ще валідні по часу відкликані токені
+    Функція перевіряє, чи був токен відкликаний. Спершу перевіряється локальний фільтр відкликаних токенів, і лише
+    якщо він повідомляє про можливий збіг, виконується одна команда EXISTS в Redis.
     Args:
-    tokens: Словник токенів для запису в Redis кеш
+    token: Токен доступу
     cache: Redis клієнт
     Returns:
-    Співпрограмму для EventLoop
+    True, якщо токен відкликано
     """
-    cache.set('tokens', pickle.dumps(tokens))                                                             # noqa
+    key = get_key_from_token(token)
+    if not revocation_filter.might_contain(key):
+        return False
+    return bool(await cache.exists(REVOKED_TOKEN_PREFIX + key))
 
 
-def get_revoked_tokens(cache) -> dict:
+async def migrate_revoked_tokens(cache) -> int:
     """
-    Функція отримує усі відкликані токени з кешу
-    :cache: Redis кліент
+    Функція переносить відкликані токени зі старого формату (один pickle-словник під ключем `tokens`) до окремих
+    ключів з TTL. Старий ключ зчитується та видаляється в одній транзакції, тому міграцію безпечно запускати
+    з кількох процесів одночасно.
+    Args:
+    cache: Redis клієнт
     Returns:
-    словник відкликаних токенів
+    Кількість перенесених ще валідних токенів
     """
-    tokens_revoked_redis = cache.get('tokens')
-    if tokens_revoked_redis:
-        return pickle.loads(tokens_revoked_redis)
+    pipe = cache.pipeline()
+    pipe.get(LEGACY_TOKENS_KEY)
+    pipe.delete(LEGACY_TOKENS_KEY)
+    tokens_revoked_redis, _ = await pipe.execute()
+    if not tokens_revoked_redis:
+        return 0
+    now = datetime.utcnow()
+    migrated = 0
+    pipe = cache.pipeline(transaction=False)
+    for key, token_exp in pickle.loads(tokens_revoked_redis).items():
+        ttl = math.ceil((token_exp - now).total_seconds())
+        if ttl > 0:
+            pipe.set(REVOKED_TOKEN_PREFIX + key, 1, ex=ttl)
+            migrated += 1
+    await pipe.execute()
+    return migrated
 
 
-def get_valid_token_from_revoked(revoked_tokens: dict, cache=None) -> dict:
+def get_token_expire(token: str) -> datetime:
     """
-    Функція нормалізує словник усіх відкладених токенів. Для кожного відкладеного токена перевіряється час його
-    валідності. Як токен вже не валідний, тоді він повністю видаляється зі списку відкликаних токенів.
-    revoked_tokens: Словник з усіма відкладеними токенами
-    cache: Redis клієнт для роботи з кешом
+    Функція повертає час закінчення дії токена з поля `exp` без перевірки підпису (токен вже перевірено при
+    автентифікації). Якщо поле відсутнє, використовується стандартний час життя access_token.
+    Args:
+    token: Токен доступу
     Returns:
-    Нормалізований словник з відкладеними токенами
+    Час закінчення дії токена (UTC)
     """
-    tokens_valid = {}
-    if revoked_tokens:
-        tokens_valid = list(filter(lambda x: datetime.utcnow() < x[1], revoked_tokens.items()))
-        tokens_valid = {box[0]: box[1] for box in tokens_valid}
-        update_valid_tokens_redis(tokens_valid, cache=cache)
-    return tokens_valid
+    try:
+        exp = jwt.get_unverified_claims(token).get('exp')
+    except JWTError:
+        exp = None
+    if exp is None:
+        return datetime.utcnow() + timedelta(seconds=ACCESS_TOKEN_TTL)
+    return datetime.utcfromtimestamp(exp)
 
 
 def get_key_from_token(token: str) -> str:
     """
     Функція виділяє унікальну(підписану) частину токена. Оскільки вона не повторюється, то вона буде використовуватись
-    як ключ в словнику відкладених токенів
+    як ключ відкликаного токена в Redis
     Args:
     :token: Токен доступу
     Args:
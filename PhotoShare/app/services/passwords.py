@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from PhotoShare.app.core.config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Функція перевіряє пароль і, якщо хеш створено застарілою схемою або з іншою вартістю bcrypt,
+    одразу повертає новий хеш (passlib deprecated="auto").
+
+    Returns:
+    Пара (пароль вірний, новий хеш або None)
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordPool:
+    """
+    Асинхронний фасад над окремим пулом процесів для bcrypt, щоб хешування не займало потоки, які обслуговують
+    інші запити. Кількість задач у черзі обмежена max_pending: якщо черга заповнена, запит одразу отримує
+    503 з заголовком Retry-After замість того, щоб чекати. При workers=0 використовується пул потоків event loop.
+    """
+
+    def __init__(self, workers: int, max_pending: int, retry_after: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self.workers and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Server is busy, try later',
+                                headers={'Retry-After': str(self.retry_after)})
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Функція повертає bcrypt хеш пароля, обчислений у пулі.
+        """
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Функція перевіряє пароль у пулі та повертає новий хеш, якщо старий потрібно оновити.
+        """
+        return await self._run(verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_pool = PasswordPool(workers=settings.password_workers, max_pending=settings.password_max_pending,
+                             retry_after=settings.password_retry_after)
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import io
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+import qrcode
+import qrcode.image.svg
+from PIL import Image
+from starlette.concurrency import run_in_threadpool
+
+from PhotoShare.app.core.config import settings
+
+QR_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+QR_SIZES = (128, 256, 512, 1024)
+# variants rendered as soon as a photo gets its url, the others on first request
+PREPARED_VARIANTS = (('png', None),)
+
+
+def qr_key(data: str, fmt: str = 'png', size: int | None = None) -> str:
+    """
+    The qr_key function returns the content address of a qr code: the code is a pure function of the data,
+    the format and the size, so their sha256 names the file and is the ETag of the response.
+
+    :param data: str: The encoded data (the url of the photo)
+    :param fmt: str: png or svg
+    :param size: int: Width and height of a png in pixels, None for the default rendering
+    :return: The hex digest
+    """
+    size = None if fmt == 'svg' else size
+    return hashlib.sha256(f'{fmt}:{size or ""}:{data}'.encode()).hexdigest()
+
+
+def render_qrcode(data: str, fmt: str = 'png', size: int | None = None) -> bytes:
+    """
+    Renders a qr code. CPU bound, so callers run it off the event loop.
+
+    :param data: str: The data to encode
+    :param fmt: str: png or svg (vector, size is ignored)
+    :param size: int: Width and height of a png in pixels, None for the default rendering
+    :return: The encoded image
+    """
+    output = io.BytesIO()
+    if fmt == 'svg':
+        qrcode.make(data, image_factory=qrcode.image.svg.SvgPathImage).save(output)
+        return output.getvalue()
+    image = qrcode.make(data).get_image()
+    if size is not None:
+        image = image.resize((size, size), Image.NEAREST)
+    image.save(output, format='PNG')
+    return output.getvalue()
+
+
+class QrCodeCache:
+    """
+    Content-addressed cache of rendered qr codes on the local filesystem (codes/ab/abcdef....png).
+    Codes never change for a given key, so a file that exists is always valid and is served as is.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._tasks = set()
+
+    def path(self, key: str, fmt: str) -> Path:
+        return self.root / key[:2] / f'{key}.{fmt}'
+
+    def _write(self, path: Path, content: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as target:
+            target.write(content)
+        os.replace(target.name, path)
+
+    def _render(self, data: str, fmt: str, size: int | None) -> Path:
+        path = self.path(qr_key(data, fmt, size), fmt)
+        if not path.exists():
+            self._write(path, render_qrcode(data, fmt, size))
+        return path
+
+    async def ensure(self, data: str, fmt: str = 'png', size: int | None = None) -> Path:
+        """
+        Returns the path of the rendered qr code, rendering it in the threadpool if it is not cached yet.
+
+        :param data: str: The data to encode
+        :param fmt: str: png or svg
+        :param size: int: Width and height of a png in pixels, None for the default rendering
+        :return: The path of the cached file
+        """
+        path = self.path(qr_key(data, fmt, size), fmt)
+        if path.exists():
+            return path
+        return await run_in_threadpool(self._render, data, fmt, size)
+
+    def prepare(self, data: str):
+        """
+        Renders the PREPARED_VARIANTS of the qr code in the background, called when a photo gets its url,
+        so requests find them in the cache.
+
+        :param data: str: The url of the photo
+        """
+        for fmt, size in PREPARED_VARIANTS:
+            task = asyncio.create_task(self.ensure(data, fmt, size))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+
+class _ZipBuffer(io.RawIOBase):
+    """
+    Write-only, unseekable sink for ZipFile; what was written so far is taken out with drain.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def zip_qrcodes(codes: dict[str, str], fmt: str = 'png', size: int | None = None):
+    """
+    Streams a zip archive of qr codes, one entry per code, rendering the codes that are not cached yet
+    as the archive is sent. The codes are already compressed images, so they are stored as is.
+
+    :param codes: dict[str, str]: Names of the entries (without the extension) and the data to encode
+    :param fmt: str: png or svg
+    :param size: int: Width and height of a png in pixels, None for the default rendering
+    :return: An async generator of the chunks of the archive
+    """
+    buffer = _ZipBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, data in codes.items():
+            path = await qr_codes.ensure(data, fmt, size)
+            archive.writestr(f'{name}.{fmt}', await run_in_threadpool(path.read_bytes))
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+qr_codes = QrCodeCache(root=settings.qr_cache_dir)
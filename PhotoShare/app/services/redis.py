@@ -1,18 +1,59 @@
+import asyncio
+
 import redis
+import redis.asyncio
 
 from PhotoShare.app.core.config import settings
 
 
 class RedisService:
     rds = None
+    subscribers = []
 
     @classmethod
     def init(cls):
 
-        RedisService.rds = redis.Redis(host=settings.redis_host, port=settings.redis_port,
-                                       password=settings.redis_password, db=0, encoding="utf-8")
+        RedisService.rds = redis.asyncio.Redis(host=settings.redis_host, port=settings.redis_port,
+                                               password=settings.redis_password, db=0, encoding="utf-8")
         return RedisService.rds
 
     @classmethod
-    def get_redis(cls):
+    async def get_redis(cls):
         return RedisService.rds
+
+    @classmethod
+    def subscribe(cls, channel: str, on_message, on_connect=None, on_disconnect=None):
+        """
+        Запускає фонову задачу, яка слухає канал Redis pub/sub та передає кожне повідомлення в on_message.
+        on_connect (співпрограма) викликається після кожної (пере)підписки, on_disconnect - після втрати з'єднання.
+        """
+        task = asyncio.create_task(cls._listen(channel, on_message, on_connect, on_disconnect),
+                                   name=f'redis-subscriber:{channel}')
+        cls.subscribers.append(task)
+        return task
+
+    @classmethod
+    async def _listen(cls, channel: str, on_message, on_connect, on_disconnect):
+        while True:
+            pubsub = cls.rds.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(channel)
+                if on_connect:
+                    await on_connect(cls.rds)
+                async for message in pubsub.listen():
+                    on_message(message['data'])
+            except redis.RedisError:
+                if on_disconnect:
+                    on_disconnect()
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.reset()
+
+    @classmethod
+    async def close(cls):
+        for task in cls.subscribers:
+            task.cancel()
+        await asyncio.gather(*cls.subscribers, return_exceptions=True)
+        cls.subscribers.clear()
+        if cls.rds is not None:
+            await cls.rds.close()
@@ -0,0 +1,235 @@
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from functools import lru_cache
+from urllib.parse import urlencode
+
+import redis
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from starlette import status
+
+from PhotoShare.app.core.config import settings
+from PhotoShare.app.core.metrics import Counter
+from PhotoShare.app.services.redis import RedisService
+
+RESPONSE_INVALIDATED_CHANNEL = 'response_invalidated'
+VERSION_KEY = 'response_cache:version:'
+ENTRY_KEY = 'response_cache:entry:'
+ETAG_LENGTH = 34
+
+cache_hits = Counter()
+cache_misses = Counter()
+not_modified = Counter()
+
+
+@lru_cache(maxsize=None)
+def _adapter(response_type) -> TypeAdapter:
+    return TypeAdapter(response_type)
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(etag: str, if_none_match: str | None) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return etag in tags or '*' in tags
+
+
+class CachedResponse:
+    """
+    Результат пошуку відповіді в кеші для одного запиту. Якщо response не None, ендпоінт повертає його без звернення
+    до бази даних; інакше будує відповідь як зазвичай та віддає її через store.
+    """
+
+    def __init__(self, cache: 'ResponseCache', key: str | None, if_none_match: str | None):
+        self.cache = cache
+        self.key = key
+        self.if_none_match = if_none_match
+        self.response: Response | None = None
+
+    def respond(self, etag: str, body: bytes) -> Response:
+        if etag_matches(etag, self.if_none_match):
+            not_modified.inc()
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(content=body, media_type='application/json', headers={'ETag': etag})
+
+    async def store(self, content, response_type) -> Response:
+        """
+        Функція серіалізує відповідь ендпоінта так само, як це робить response_model, зберігає її в кеші
+        та повертає готову Response з ETag (або 304, якщо клієнт вже має таку саму відповідь).
+        Args:
+        content: Те, що ендпоінт повернув би без кешу
+        response_type: response_model ендпоінта
+        Returns:
+        Response з JSON тілом
+        """
+        adapter = _adapter(response_type)
+        body = adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+        etag = make_etag(body)
+        if self.key is not None:
+            await self.cache.set(self.key, etag.encode() + body)
+        return self.respond(etag, body)
+
+
+class ResponseCache:
+    """
+    Кеш серіалізованих відповідей публічних ендпоінтів для читання: Redis, спільний для всіх процесів,
+    та невеликий LRU кеш у пам'яті процесу (L1), записи якого живуть local_ttl секунд.
+
+    Кожна відповідь належить до простору імен ('photos', 'tags', 'comments:<photo_id>', 'users:<email>'), номер
+    версії якого входить у ключ запису разом зі шляхом і параметрами запиту. Репозиторії після кожної зміни
+    викликають invalidate: версія збільшується в Redis (INCR) і публікується в канал RESPONSE_INVALIDATED_CHANNEL,
+    тому старі записи всіх процесів стають недосяжними без пошуку та видалення ключів і зникають за ttl.
+    Версія читається до запиту в базу даних, тому відповідь, побудована під час зміни, зберігається
+    під старою версією і ніколи не буде віддана.
+    """
+
+    def __init__(self, ttl: int, local_ttl: int, local_size: int, enabled: bool = True):
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.local_size = local_size
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._versions = OrderedDict()
+
+    def _remember(self, store: OrderedDict, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.local_size:
+            store.popitem(last=False)
+
+    async def version(self, namespace: str) -> int | None:
+        """
+        Функція повертає поточну версію простору імен, або None, якщо Redis недоступний і кешувати не можна.
+        """
+        version = self._versions.get(namespace)
+        if version is not None:
+            self._versions.move_to_end(namespace)
+            return version
+        if RedisService.rds is None:
+            version = 0
+        else:
+            try:
+                version = int(await RedisService.rds.get(VERSION_KEY + namespace) or 0)
+            except redis.RedisError:
+                return None
+        self._remember(self._versions, namespace, version)
+        return version
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at >= time.monotonic():
+                self._entries.move_to_end(key)
+                return value
+            self._entries.pop(key, None)
+        if RedisService.rds is None:
+            return None
+        try:
+            value = await RedisService.rds.get(ENTRY_KEY + key)
+        except redis.RedisError:
+            return None
+        if value is not None:
+            self._remember(self._entries, key, (time.monotonic() + self.local_ttl, value))
+        return value
+
+    async def set(self, key: str, value: bytes):
+        self._remember(self._entries, key, (time.monotonic() + self.local_ttl, value))
+        if RedisService.rds is not None:
+            try:
+                await RedisService.rds.set(ENTRY_KEY + key, value, ex=self.ttl)
+            except redis.RedisError:
+                pass
+
+    async def lookup(self, namespace: str, request: Request) -> CachedResponse:
+        """
+        Функція шукає відповідь на запит у кеші.
+        Args:
+        namespace: Простір імен відповіді
+        request: Запит; ключ будується з його шляху та відсортованих параметрів
+        Returns:
+        CachedResponse, response якого заповнений, якщо відповідь знайдено
+        """
+        if_none_match = request.headers.get('if-none-match')
+        if not self.enabled:
+            return CachedResponse(self, None, if_none_match)
+        version = await self.version(namespace)
+        if version is None:
+            return CachedResponse(self, None, if_none_match)
+        query = urlencode(sorted(request.query_params.multi_items()))
+        cached = CachedResponse(self, f'{namespace}:{version}:{request.url.path}?{query}', if_none_match)
+        value = await self.get(cached.key)
+        if value is None:
+            cache_misses.inc()
+        else:
+            cache_hits.inc()
+            cached.response = cached.respond(value[:ETAG_LENGTH].decode(), value[ETAG_LENGTH:])
+        return cached
+
+    def depends(self, namespace: str):
+        """
+        Функція повертає залежність FastAPI, яка шукає відповідь у кеші. Простір імен може містити параметри шляху
+        та запиту у фігурних дужках, наприклад 'comments:{photo_id}'.
+        """
+        async def dependency(request: Request) -> CachedResponse:
+            params = defaultdict(str, {**request.query_params, **request.path_params})
+            return await self.lookup(namespace.format_map(params), request)
+
+        return dependency
+
+    async def invalidate(self, *namespaces: str):
+        """
+        Функція робить недійсними всі збережені відповіді вказаних просторів імен у всіх процесах.
+        Викликається репозиторіями після кожного збереження змін.
+        Args:
+        namespaces: Простори імен, відповіді яких змінилися
+        """
+        if RedisService.rds is None:
+            for namespace in namespaces:
+                self._versions[namespace] = self._versions.get(namespace, 0) + 1
+            return
+        try:
+            async with RedisService.rds.pipeline(transaction=False) as pipe:
+                for namespace in namespaces:
+                    pipe.incr(VERSION_KEY + namespace)
+                versions = await pipe.execute()
+                for namespace, version in zip(namespaces, versions):
+                    self._remember(self._versions, namespace, version)
+                    pipe.publish(RESPONSE_INVALIDATED_CHANNEL, f'{namespace} {version}')
+                await pipe.execute()
+        except redis.RedisError:
+            for namespace in namespaces:
+                self._versions.pop(namespace, None)
+
+    def on_message(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        namespace, version = data.rsplit(' ', 1)
+        if namespace in self._versions and self._versions[namespace] < int(version):
+            self._versions[namespace] = int(version)
+
+    def clear(self):
+        self._versions.clear()
+        self._entries.clear()
+
+    async def on_connect(self, cache):
+        self.clear()
+
+    def on_disconnect(self):
+        self.clear()
+
+
+def response_cache_stats() -> dict:
+    total = cache_hits.value + cache_misses.value
+    return {'hits': cache_hits.value, 'misses': cache_misses.value, 'not_modified': not_modified.value,
+            'hit_rate': cache_hits.value / total if total else 0.0}
+
+
+response_cache = ResponseCache(ttl=settings.response_cache_ttl, local_ttl=settings.response_cache_local_ttl,
+                               local_size=settings.response_cache_local_size, enabled=settings.response_cache_enabled)
@@ -0,0 +1,103 @@
+import hashlib
+import math
+import threading
+import time
+
+
+class BloomFilter:
+    """
+    Простий фільтр Блума на bytearray. Може повернути хибнопозитивну відповідь з ймовірністю error_rate,
+    але ніколи не повертає хибнонегативну.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationFilter:
+    """
+    Локальний фільтр відкликаних токенів, який стоїть перед перевіркою в Redis.
+    Фільтр складається з двох поколінь фільтрів Блума: нові ключі додаються в поточне покоління, а раз на
+    `rotation` секунд поточне стає попереднім, а найстаріше відкидається. Оскільки відкликаний токен живе не довше
+    за час життя access_token, достатньо, щоб rotation був не меншим за нього.
+    Поки фільтр не синхронізований з Redis (старт або втрата з'єднання), він відповідає "можливо відкликаний",
+    і перевірка йде в Redis як раніше.
+    """
+
+    def __init__(self, prefix: str, capacity: int, error_rate: float, rotation: int, enabled: bool = True):
+        self.prefix = prefix
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rotation = rotation
+        self.enabled = enabled
+        self.ready = False
+        self._lock = threading.Lock()
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = time.monotonic()
+
+    def _rotate(self):
+        now = time.monotonic()
+        if now - self._rotated_at < self.rotation:
+            return
+        with self._lock:
+            if now - self._rotated_at >= self.rotation:
+                self._previous = self._current
+                self._current = BloomFilter(self.capacity, self.error_rate)
+                self._rotated_at = now
+
+    def add(self, key: str):
+        self._rotate()
+        with self._lock:
+            self._current.add(key)
+
+    def might_contain(self, key: str) -> bool:
+        """
+        Функція повертає False лише тоді, коли токен гарантовано не відкликаний, і запит до Redis не потрібен.
+        Args:
+        key: Підписана частина токена
+        Returns:
+        Чи може токен бути відкликаним
+        """
+        if not (self.enabled and self.ready):
+            return True
+        self._rotate()
+        return key in self._current or key in self._previous
+
+    async def on_connect(self, cache):
+        """
+        Функція заповнює фільтр усіма ключами відкликаних токенів з Redis. Викликається після підписки на канал,
+        тому токени, відкликані під час сканування, не будуть пропущені.
+        Args:
+        cache: Redis клієнт
+        """
+        prefix_len = len(self.prefix)
+        async for name in cache.scan_iter(match=self.prefix + '*', count=1000):
+            if isinstance(name, bytes):
+                name = name.decode()
+            self.add(name[prefix_len:])
+        self.ready = True
+
+    def on_message(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        self.add(data)
+
+    def on_disconnect(self):
+        self.ready = False
+
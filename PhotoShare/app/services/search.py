@@ -0,0 +1,244 @@
+import heapq
+import re
+from abc import ABC, abstractmethod
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from PhotoShare.app.core.config import settings
+from PhotoShare.app.core.database import SessionLocal
+from PhotoShare.app.models.photo import Photo
+
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+TAG_WEIGHT = 1.0
+
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.5
+FUZZY_MATCH = 0.3
+FUZZY_MIN_LENGTH = 4
+
+
+def tokenize(text: str | None) -> list[str]:
+    """
+    Splits the text into lowercase words, the same way the full-text query is built from the search text.
+    """
+    return re.findall(r'\w+', text.lower()) if text else []
+
+
+class SearchBackend(ABC):
+    """
+    Interface of the photo search behind /photos/search. The repositories report every change of a photo
+    or a tag with the index_* / remove_* / rename_tag methods, which are synchronous and cheap, so backends
+    that keep their own index stay in step with the database.
+    """
+
+    async def load(self):
+        """
+        Builds the index from the database at startup.
+        """
+
+    @abstractmethod
+    async def search(self, text: str, limit: int, offset: int, db: AsyncSession) -> list[Photo]:
+        """
+        Finds photos by name, description or tag.
+
+        :param text: str: The search text, every word is matched as a prefix
+        :param limit: int: Limit the number of photos returned
+        :param offset: int: The number of ranked results to skip
+        :param db: AsyncSession: Access the database
+        :return: A list of photos, best matches first
+        """
+
+    def index_photo(self, photo_id: int, name: str | None, description: str | None, tags: list[str]):
+        """
+        Called when a photo is created or its name, description or tags change.
+        """
+
+    def remove_photo(self, photo_id: int):
+        """
+        Called when a photo is deleted.
+        """
+
+    def rename_tag(self, old_name: str, new_name: str):
+        """
+        Called when a tag is renamed.
+        """
+
+    def remove_tag(self, name: str):
+        """
+        Called when a tag is deleted.
+        """
+
+
+class PostgresSearch(SearchBackend):
+    """
+    Full-text search in Postgres (photo.search_vector). The index is maintained by the database,
+    so the change notifications are ignored.
+    """
+
+    async def search(self, text: str, limit: int, offset: int, db: AsyncSession) -> list[Photo]:
+        from PhotoShare.app.repositories import photo as photo_repository
+        return await photo_repository.search_photos(text, limit, offset, db)
+
+
+class InMemorySearch(SearchBackend):
+    """
+    Inverted index over the name, description and tag names of all photos, kept in the memory of the process.
+    Matching and ranking never touch the database, only the photos of the requested page are loaded by primary key.
+    Words of the query match whole words, prefixes (via a sorted vocabulary) and, for words of four letters and
+    more, words one typo away (insertion, deletion, substitution or transposition, via a deletion index).
+
+    The index only sees changes made by this process, so it is meant for tests and single-process deployments.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.postings: dict[str, dict[int, float]] = {}
+        self.vocabulary: list[str] = []
+        self.deletions: dict[str, set[str]] = defaultdict(set)
+        self.documents: dict[int, dict[str, float]] = {}
+        self.photo_tags: dict[int, list[str]] = {}
+        self.tag_photos: dict[str, set[int]] = defaultdict(set)
+        self.texts: dict[int, tuple[str | None, str | None]] = {}
+
+    async def load(self):
+        async with SessionLocal() as session:
+            photos = await session.execute(select(Photo).options(selectinload(Photo.tags)))
+            self.clear()
+            for photo in photos.scalars():
+                self.index_photo(photo.id, photo.name, photo.description, [tag.name for tag in photo.tags])
+
+    @staticmethod
+    def _fuzzy_keys(token: str) -> set[str]:
+        # a query word of FUZZY_MIN_LENGTH letters may be one insertion away from a shorter word
+        if len(token) < FUZZY_MIN_LENGTH - 1:
+            return set()
+        return {token[:i] + token[i + 1:] for i in range(len(token))} | {token}
+
+    def _add_token(self, token: str, photo_id: int, weight: float):
+        postings = self.postings.get(token)
+        if postings is None:
+            postings = self.postings[token] = {}
+            insort(self.vocabulary, token)
+            for key in self._fuzzy_keys(token):
+                self.deletions[key].add(token)
+        postings[photo_id] = weight
+
+    def _remove_token(self, token: str, photo_id: int):
+        postings = self.postings[token]
+        postings.pop(photo_id, None)
+        if not postings:
+            del self.postings[token]
+            del self.vocabulary[bisect_left(self.vocabulary, token)]
+            for key in self._fuzzy_keys(token):
+                self.deletions[key].discard(token)
+                if not self.deletions[key]:
+                    del self.deletions[key]
+
+    def index_photo(self, photo_id: int, name: str | None, description: str | None, tags: list[str]):
+        self.remove_photo(photo_id)
+        weights = {}
+        for tokens, weight in ((tokenize(description), DESCRIPTION_WEIGHT),
+                               ([token for tag in tags for token in tokenize(tag)], TAG_WEIGHT),
+                               (tokenize(name), NAME_WEIGHT)):
+            for token in tokens:
+                weights[token] = max(weight, weights.get(token, 0.0))
+        for token, weight in weights.items():
+            self._add_token(token, photo_id, weight)
+        self.documents[photo_id] = weights
+        self.photo_tags[photo_id] = list(tags)
+        self.texts[photo_id] = (name, description)
+        for tag in tags:
+            self.tag_photos[tag].add(photo_id)
+
+    def remove_photo(self, photo_id: int):
+        for token in self.documents.pop(photo_id, {}):
+            self._remove_token(token, photo_id)
+        for tag in self.photo_tags.pop(photo_id, []):
+            self.tag_photos[tag].discard(photo_id)
+            if not self.tag_photos[tag]:
+                del self.tag_photos[tag]
+        self.texts.pop(photo_id, None)
+
+    def _retag(self, name: str, new_name: str | None):
+        for photo_id in list(self.tag_photos.get(name, ())):
+            tags = [new_name if tag == name else tag for tag in self.photo_tags[photo_id]]
+            self.index_photo(photo_id, *self.texts[photo_id], [tag for tag in tags if tag is not None])
+
+    def rename_tag(self, old_name: str, new_name: str):
+        self._retag(old_name, new_name)
+
+    def remove_tag(self, name: str):
+        self._retag(name, None)
+
+    def _match(self, word: str) -> dict[int, float]:
+        scores = {}
+
+        def add(token, quality):
+            for photo_id, weight in self.postings[token].items():
+                scores[photo_id] = max(scores.get(photo_id, 0.0), weight * quality)
+
+        for i in range(bisect_left(self.vocabulary, word), len(self.vocabulary)):
+            token = self.vocabulary[i]
+            if not token.startswith(word):
+                break
+            add(token, EXACT_MATCH if token == word else PREFIX_MATCH)
+        if len(word) >= FUZZY_MIN_LENGTH:
+            candidates = set()
+            for key in self._fuzzy_keys(word):
+                candidates |= self.deletions.get(key, set())
+            for token in candidates - {word}:
+                add(token, FUZZY_MATCH)
+        return scores
+
+    def rank(self, text: str, limit: int | None = None) -> list[int]:
+        """
+        Returns the ids of the matching photos, best matches first. Every word of the text has to match;
+        photos with a tag named exactly like the text come first, as in the SQL search.
+
+        :param text: str: The search text
+        :param limit: int: Only the best limit photos are needed, None for all of them
+        :return: A list of photo ids
+        """
+        words = tokenize(text)
+        scores = None
+        for word in dict.fromkeys(words):
+            matches = self._match(word)
+            if scores is None:
+                scores = matches
+            else:
+                scores = {photo_id: score + matches[photo_id] for photo_id, score in scores.items()
+                          if photo_id in matches}
+            if not scores:
+                break
+        scores = scores or {}
+        for photo_id in self.tag_photos.get(text, ()):
+            scores[photo_id] = scores.get(photo_id, 0.0) + len(words) + 1
+        key = lambda photo_id: (scores[photo_id], photo_id)                                   # noqa: E731
+        if limit is None:
+            return sorted(scores, key=key, reverse=True)
+        return heapq.nlargest(limit, scores, key=key)
+
+    async def search(self, text: str, limit: int, offset: int, db: AsyncSession) -> list[Photo]:
+        from PhotoShare.app.repositories import photo as photo_repository
+        ids = self.rank(text, offset + limit)[offset:]
+        if not ids:
+            return []
+        return await photo_repository.get_photos_by_id(ids, db)
+
+
+def create_search_backend(backend: str) -> SearchBackend:
+    if backend == 'postgres':
+        return PostgresSearch()
+    if backend == 'memory':
+        return InMemorySearch()
+    raise ValueError(f'Unknown search backend {backend}')
+
+
+search_backend = create_search_backend(settings.search_backend)
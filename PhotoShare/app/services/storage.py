@@ -0,0 +1,220 @@
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from urllib.parse import urlencode
+
+import anyio
+from starlette.responses import FileResponse
+
+from PhotoShare.app.core.config import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+SNIFF_SIZE = 16
+
+# named transformations whose urls are built once, when the photo is uploaded, and stored with the photo
+TRANSFORMATION_PRESETS = {
+    'thumb': {'width': 200, 'height': 200, 'crop': 'fill'},
+    'medium': {'width': 800, 'crop': 'limit'},
+    'square': {'width': 600, 'height': 600, 'crop': 'fill', 'gravity': 'auto'},
+    'avatar': {'width': 150, 'height': 150, 'crop': 'thumb', 'gravity': 'face', 'radius': 'max'},
+}
+
+
+def content_hash(file) -> str:
+    """
+    The content_hash function returns the sha256 of a file object, read in chunks so the file is never held
+    in memory as a whole. The file is rewound afterwards so it can be uploaded.
+
+    :param file: A binary file object
+    :return: The hex digest of the content
+    """
+    digest = hashlib.sha256()
+    while chunk := file.read(CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+class StorageBackend(ABC):
+    """
+    Interface of the photo storage. Methods are synchronous (SDK calls, disk IO), callers run them
+    in the threadpool.
+    """
+
+    @abstractmethod
+    def upload(self, file, public_id: str) -> dict:
+        """
+        Stores the file under public_id.
+
+        :param file: A file object or a path to the file
+        :param public_id: str: The name of the stored object
+        :return: A dictionary with at least the version of the stored object
+        """
+
+    @abstractmethod
+    def get_url(self, public_id: str, version: str | None = None) -> str:
+        """
+        Returns the url of the stored photo (200x200 thumbnail for Cloudinary).
+        """
+
+    @abstractmethod
+    def transform(self, public_id: str, **options) -> str:
+        """
+        Returns the url of the photo with the given transformation applied. Empty options are skipped.
+        """
+
+    def variant_urls(self, public_id: str) -> dict[str, str]:
+        """
+        Returns the urls of all TRANSFORMATION_PRESETS of the photo, stored with the photo when it is uploaded
+        so the urls are never built per request.
+
+        :param public_id: str: The name of the stored object
+        :return: A dictionary of preset name to url
+        """
+        return {name: self.transform(public_id, **options) for name, options in TRANSFORMATION_PRESETS.items()}
+
+    @abstractmethod
+    def delete(self, public_id: str):
+        """
+        Removes the stored object.
+        """
+
+
+class LocalStorage(StorageBackend):
+    """
+    Content-addressed storage on the local filesystem. Each file is stored once under its sha256
+    (objects/ab/abcdef...), and public ids are small reference files pointing at the object, so an upload
+    never needs a remote service. Files are served by the /storage router with ZeroCopyFileResponse.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip('/')
+        self.objects = self.root / 'objects'
+        self.refs = self.root / 'refs'
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest
+
+    def _ref_path(self, public_id: str) -> Path:
+        path = (self.refs / public_id).resolve()
+        if self.refs.resolve() not in path.parents:
+            raise ValueError(f'Invalid public id {public_id}')
+        return path
+
+    def upload(self, file, public_id: str) -> dict:
+        self.objects.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        source = open(file, 'rb') if isinstance(file, (str, os.PathLike)) else file
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.objects, delete=False) as target:
+                while chunk := source.read(CHUNK_SIZE):
+                    digest.update(chunk)
+                    target.write(chunk)
+        finally:
+            if source is not file:
+                source.close()
+        digest = digest.hexdigest()
+        path = self.object_path(digest)
+        if path.exists():
+            os.unlink(target.name)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(target.name, path)
+        ref = self._ref_path(public_id)
+        ref.parent.mkdir(parents=True, exist_ok=True)
+        ref.write_text(digest)
+        return {'public_id': public_id, 'version': digest[:12], 'etag': digest}
+
+    def resolve(self, public_id: str) -> tuple[Path, str] | None:
+        """
+        Returns the path of the object stored under public_id and its sha256, or None if there is no such object.
+        """
+        try:
+            digest = self._ref_path(public_id).read_text()
+        except (OSError, ValueError):
+            return None
+        return self.object_path(digest), digest
+
+    def get_url(self, public_id: str, version: str | None = None) -> str:
+        url = f'{self.base_url}/{public_id}'
+        return f'{url}?v={version}' if version else url
+
+    def transform(self, public_id: str, **options) -> str:
+        options = {key: value for key, value in options.items() if value}
+        return f'{self.get_url(public_id)}?{urlencode(options)}' if options else self.get_url(public_id)
+
+    def delete(self, public_id: str):
+        # objects may be shared by several public ids, only the reference is removed
+        try:
+            self._ref_path(public_id).unlink(missing_ok=True)
+        except ValueError:
+            pass
+
+
+class ZeroCopyFileResponse(FileResponse):
+    """
+    FileResponse that hands the open file to the server when it supports the ASGI zero-copy extension
+    (sendfile), so the file is never read into Python; otherwise the file is read in chunks of CHUNK_SIZE
+    in a worker thread, as FileResponse does.
+    """
+    chunk_size = CHUNK_SIZE
+
+    async def __call__(self, scope, receive, send):
+        if "http.response.zerocopysend" not in scope.get("extensions", {}):
+            await super().__call__(scope, receive, send)
+            return
+        if self.stat_result is None:
+            self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            self.set_stat_headers(self.stat_result)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only or not self.stat_result.st_size:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({"type": "http.response.zerocopysend", "file": file, "more_body": False})
+            finally:
+                file.close()
+        if self.background is not None:
+            await self.background()
+
+
+def sniff_media_type(header: bytes) -> str:
+    """
+    Returns the media type of an image from its first bytes (SNIFF_SIZE are enough), or
+    application/octet-stream if they are not the signature of a known image format.
+    """
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, media_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return media_type
+    return 'application/octet-stream'
+
+
+def guess_media_type(path: Path) -> str:
+    with open(path, 'rb') as file:
+        return sniff_media_type(file.read(SNIFF_SIZE))
+
+
+def create_storage(backend: str) -> StorageBackend:
+    if backend == 'local':
+        return LocalStorage(root=settings.local_storage_root, base_url=settings.local_storage_url)
+    if backend == 'cloudinary':
+        from PhotoShare.app.services.photo_service import CloudinaryStorage
+        return CloudinaryStorage()
+    raise ValueError(f'Unknown storage backend {backend}')
+
+
+storage = create_storage(settings.storage_backend)
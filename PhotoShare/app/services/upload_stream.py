@@ -0,0 +1,233 @@
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, Request, status
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from PhotoShare.app.services.storage import SNIFF_SIZE, sniff_media_type
+
+# written to disk once this much of a file is buffered, which bounds the memory of an upload
+CHUNK_SIZE = 1024 * 1024
+MAX_FIELDS_SIZE = 64 * 1024
+# headers and boundaries of the parts on top of the files and fields
+FORM_OVERHEAD = 16 * 1024
+IMAGE_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/bmp', 'image/webp')
+
+
+@dataclass
+class StagedFile:
+    field_name: str
+    filename: str | None
+    path: Path
+    content_hash: str
+    size: int
+    media_type: str
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+
+
+class _FileWriter:
+    """
+    Receives the data of one file part: checks the signature of the image in the first bytes, counts the size,
+    hashes the data and buffers it until CHUNK_SIZE can be written to the staged file in the threadpool.
+    The staged file is created by the first flush, so the parser callbacks never touch the file system.
+    """
+
+    def __init__(self, staging_dir: Path, field_name: str, filename: str | None, max_size: int):
+        self.staging_dir = staging_dir
+        self.file = None
+        self.field_name = field_name
+        self.filename = filename
+        self.max_size = max_size
+        self.digest = hashlib.sha256()
+        self.buffer = bytearray()
+        self.size = 0
+        self.media_type = None
+
+    def feed(self, data: bytes):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f'The file is larger than {self.max_size} bytes')
+        self.digest.update(data)
+        self.buffer += data
+        if self.media_type is None and len(self.buffer) >= SNIFF_SIZE:
+            self.sniff()
+
+    def sniff(self):
+        self.media_type = sniff_media_type(bytes(self.buffer[:SNIFF_SIZE]))
+        if self.media_type not in IMAGE_TYPES:
+            raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                detail=f'{self.filename or self.field_name} is not a JPEG, PNG, GIF, BMP or WebP image')
+
+    def flush(self):
+        if self.file is None:
+            self.file = tempfile.NamedTemporaryFile(dir=self.staging_dir, suffix='.part', delete=False)
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self) -> StagedFile:
+        if self.media_type is None:
+            self.sniff()
+        self.flush()
+        self.file.close()
+        return StagedFile(self.field_name, self.filename, Path(self.file.name), self.digest.hexdigest(), self.size,
+                          self.media_type)
+
+    def discard(self):
+        if self.file is not None:
+            self.file.close()
+            os.unlink(self.file.name)
+
+
+class _FormReader:
+    """
+    Callbacks of the multipart parser. Parts that were completed by the last chunk are collected in done.
+    """
+
+    def __init__(self, staging_dir: Path, max_file_size: int, max_files: int):
+        self.staging_dir = staging_dir
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.files = 0
+        self.fields_size = 0
+        self.writer: _FileWriter | None = None
+        self.field_name = ''
+        self.field = bytearray()
+        self.header_name = b''
+        self.header_value = b''
+        self.disposition = b''
+        self.done = []
+
+    def callbacks(self) -> dict:
+        return {'on_part_begin': self.on_part_begin, 'on_part_data': self.on_part_data,
+                'on_part_end': self.on_part_end, 'on_header_field': self.on_header_field,
+                'on_header_value': self.on_header_value, 'on_header_end': self.on_header_end,
+                'on_headers_finished': self.on_headers_finished}
+
+    def on_part_begin(self):
+        self.disposition = b''
+        self.field = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        if self.header_name.lower() == b'content-disposition':
+            self.disposition = self.header_value
+        self.header_name = self.header_value = b''
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.disposition)
+        if b'name' not in options:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='The Content-Disposition of a part must have a name')
+        self.field_name = options[b'name'].decode(errors='replace')
+        if b'filename' in options:
+            self.files += 1
+            if self.files > self.max_files:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f'At most {self.max_files} files can be uploaded at once')
+            self.writer = _FileWriter(self.staging_dir, self.field_name, options[b'filename'].decode(errors='replace'),
+                                      self.max_file_size)
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.writer is not None:
+            self.writer.feed(data[start:end])
+            return
+        self.fields_size += end - start
+        if self.fields_size > MAX_FIELDS_SIZE:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                detail=f'The form fields are larger than {MAX_FIELDS_SIZE} bytes')
+        self.field += data[start:end]
+
+    def on_part_end(self):
+        if self.writer is not None:
+            self.done.append(self.writer)
+            self.writer = None
+        else:
+            self.done.append((self.field_name, self.field.decode(errors='replace')))
+
+
+async def stream_form(request: Request, staging_dir: Path, max_file_size: int, max_files: int = 1):
+    """
+    The stream_form function parses a multipart/form-data body as it arrives, instead of letting Starlette spool
+    it to a temporary file before the handler runs. Files go straight to the staging directory, so the memory
+    of an upload stays below CHUNK_SIZE whatever the size of the file; a file that is not an image is rejected
+    after its first bytes and a body that is too large as soon as the limit is crossed, with the rest of
+    the body never read. Each part is yielded as soon as it is complete.
+
+    :param request: Request: The request with the form; its body must not have been read
+    :param staging_dir: Path: Where the files are written, created at startup by UploadWorker.start
+    :param max_file_size: int: Largest accepted file in bytes (413 above)
+    :param max_files: int: Largest accepted number of files (400 above)
+    :return: An async generator of (name, value) tuples for the fields and StagedFile for the files; staged files
+        belong to the caller, the file being received when the stream fails is removed
+    """
+    content_type, options = parse_options_header(request.headers.get('content-type', ''))
+    if content_type != b'multipart/form-data' or b'boundary' not in options:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail='Expected a multipart/form-data body')
+    length = request.headers.get('content-length')
+    if length and length.isdigit() and int(length) > max_files * max_file_size + MAX_FIELDS_SIZE + FORM_OVERHEAD:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f'The body is larger than {max_files} files of {max_file_size} bytes')
+    reader = _FormReader(staging_dir, max_file_size, max_files)
+    parser = MultipartParser(options[b'boundary'], reader.callbacks())
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartParseError as err:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f'Malformed form: {err}')
+            while reader.done:
+                part = reader.done.pop(0)
+                if isinstance(part, _FileWriter):
+                    try:
+                        part = await run_in_threadpool(part.close)
+                    except BaseException:
+                        part.discard()
+                        raise
+                yield part
+            if reader.writer is not None and len(reader.writer.buffer) >= CHUNK_SIZE:
+                await run_in_threadpool(reader.writer.flush)
+        parser.finalize()
+        if reader.writer is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail='The form ended in the middle of a file')
+    finally:
+        for part in reader.done:
+            if isinstance(part, _FileWriter):
+                part.discard()
+        if reader.writer is not None:
+            reader.writer.discard()
+
+
+async def read_form(request: Request, staging_dir: Path, max_file_size: int,
+                    max_files: int = 1) -> tuple[dict[str, str], list[StagedFile]]:
+    """
+    The read_form function receives the whole form with stream_form.
+
+    :return: The fields and the staged files; if the form is rejected, the files staged so far are removed
+    """
+    fields, files = {}, []
+    try:
+        async for part in stream_form(request, staging_dir, max_file_size, max_files):
+            if isinstance(part, StagedFile):
+                files.append(part)
+            else:
+                fields[part[0]] = part[1]
+    except BaseException:
+        for file in files:
+            file.discard()
+        raise
+    return fields, files
@@ -0,0 +1,343 @@
+import asyncio
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from PhotoShare.app.core.config import settings
+from PhotoShare.app.core.database import SessionLocal
+from PhotoShare.app.core.metrics import Counter
+from PhotoShare.app.repositories import photo as photo_repository
+from PhotoShare.app.schemas.photo import PhotoModel
+from PhotoShare.app.services.storage import storage
+from PhotoShare.app.services.upload_stream import StagedFile
+from PhotoShare.app.services.user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+dedup_hits = Counter()
+dedup_misses = Counter()
+# finalisation of bulk uploads that outlive their request
+_bulk_uploads = set()
+STAGED_NAME = re.compile(r'(\d+)\.(\d+)\.(.+)')
+
+
+@dataclass(frozen=True)
+class UploadJob:
+    photo_id: int
+    user_id: int
+    public_id: str
+    path: Path
+
+    @classmethod
+    def staged(cls, staging_dir: Path, photo_id: int, user_id: int, public_id: str) -> 'UploadJob':
+        return cls(photo_id, user_id, public_id, staging_dir / f'{photo_id}.{user_id}.{public_id.replace("/", "~")}')
+
+    @classmethod
+    def from_staged(cls, path: Path) -> 'UploadJob':
+        """
+        Restores the job of a file named by staged.
+
+        :raises ValueError: if the name is not {photo_id}.{user_id}.{public_id}
+        """
+        match = STAGED_NAME.fullmatch(path.name)
+        if match is None:
+            raise ValueError(f'{path.name} is not a staged upload')
+        photo_id, user_id, public_id = match.groups()
+        return cls(int(photo_id), int(user_id), public_id.replace('~', '/'), path)
+
+    @property
+    def content_hash(self) -> str:
+        # public ids of photos are "Y/<sha256 of the content>"
+        return self.public_id.rsplit('/', 1)[-1]
+
+
+async def push_file(path: Path, public_id: str, content_hash: str) -> tuple[str, dict[str, str]]:
+    """
+    The push_file function uploads a staged file to the storage backend, unless a photo with the same content
+    is already stored, in which case its url is reused.
+
+    :param path: Path: The staged file
+    :param public_id: str: Public id of the photo in the storage
+    :param content_hash: str: sha256 of the file
+    :return: The url of the photo and the urls of its variants
+    """
+    async with SessionLocal() as session:
+        photo_url = await photo_repository.get_photo_url_by_hash(content_hash, session)
+    if photo_url is None:
+        dedup_misses.inc()
+        image = await run_in_threadpool(storage.upload, file=str(path), public_id=public_id)
+        photo_url = storage.get_url(public_id=public_id, version=image.get('version'))
+    else:
+        dedup_hits.inc()
+    return photo_url, storage.variant_urls(public_id)
+
+
+class UploadWorker:
+    """
+    Background pipeline for photo uploads. The request only streams the file into the staging directory,
+    hashing it on the way (see upload_stream), and queues a job; worker tasks push the staged file to the storage
+    backend and finalise the photo row in one transaction. Files whose content is already stored are not uploaded again.
+    Staged files are named after the job, so jobs that were queued when the process stopped are picked up
+    again on the next start.
+    """
+
+    def __init__(self, staging_dir: str, workers: int, queue_size: int):
+        self.staging_dir = Path(staging_dir)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue = asyncio.Queue()
+        self._tasks = []
+
+    def check_capacity(self):
+        """
+        The check_capacity function rejects a new upload with 503 and Retry-After when the queue is full,
+        before anything is written to the database.
+        """
+        if self.queue.qsize() >= self.queue_size:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Upload queue is full',
+                                headers={'Retry-After': '5'})
+
+    def enqueue(self, staged: Path, photo_id: int, user_id: int, public_id: str) -> UploadJob:
+        """
+        The enqueue function names the staged file after its job and queues it for upload.
+
+        :param staged: Path: The file staged by stream_form
+        :param photo_id: int: The pending photo row
+        :param user_id: int: The owner of the photo
+        :param public_id: str: Public id of the photo in the storage
+        :return: The queued job
+        """
+        job = UploadJob.staged(self.staging_dir, photo_id, user_id, public_id)
+        staged.rename(job.path)
+        self.queue.put_nowait(job)
+        return job
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        for path in sorted(self.staging_dir.iterdir()):
+            if path.suffix == '.part':
+                # left by a request that did not finish
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                if not path.is_file():
+                    raise ValueError(f'{path.name} is not a file')
+                job = UploadJob.from_staged(path)
+            except ValueError as err:
+                logger.warning('Skipping %s in the upload staging directory: %s', path, err)
+                continue
+            self.queue.put_nowait(job)
+        self._tasks = [asyncio.create_task(self._run(), name=f'upload-worker:{i}') for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                await self.process(job)
+            except Exception:                                                                           # noqa
+                logger.exception('Upload of photo %s failed', job.photo_id)
+                async with SessionLocal() as session:
+                    await photo_repository.fail_photo(job.photo_id, session)
+                job.path.unlink(missing_ok=True)
+            finally:
+                self.queue.task_done()
+
+    async def process(self, job: UploadJob):
+        """
+        The process function uploads a staged file and finalises the photo: the url, variants and status
+        of the photo and the uploaded_photos counter of its owner are written in one transaction. If a photo
+        with the same content was uploaded meanwhile, its url is reused and nothing is uploaded.
+
+        :param job: UploadJob: The staged upload
+        """
+        photo_url, variants = await push_file(job.path, job.public_id, job.content_hash)
+        async with SessionLocal() as session:
+            email = await photo_repository.finalize_photo(job.photo_id, job.user_id, photo_url, session,
+                                                          variants=variants)
+        if email:
+            await user_cache.invalidate(email)
+        job.path.unlink(missing_ok=True)
+
+
+class BulkUpload:
+    """
+    Upload of an album in one request. Each file is pushed to the storage backend as soon as its part of the form
+    has been received, at most concurrency files at a time, while the rest of the body is still arriving; files
+    with the same content are pushed once. When the form is complete, the rows of all photos are created in one
+    INSERT (create_rows), and a background task waits for the pushes and finalises all photos, with the
+    owner's counter bumped once, in one transaction, so the upload completes even if the client goes away.
+    Once the rows exist, every photo has a staged file named after its UploadJob until the transaction has
+    committed, so photos that were still pending when the process stopped are uploaded by the UploadWorker
+    on the next start. The results of the files are streamed as NDJSON lines as their pushes finish.
+    """
+
+    def __init__(self, user_id: int, concurrency: int, staging_dir: Path):
+        self.user_id = user_id
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.staging_dir = staging_dir
+        self.description = None
+        self.files: list[tuple[int, StagedFile, PhotoModel]] = []
+        self.rejected = []
+        # the file that is pushed for each content
+        self.sources: dict[str, StagedFile] = {}
+        self.pushes: dict[str, asyncio.Task] = {}
+        self.photo_ids = []
+        self.jobs: list[UploadJob] = []
+        self.finished = None
+
+    @staticmethod
+    def photo_name(filename: str | None, index: int) -> str:
+        """
+        Names a photo after its file: the name without extension, the whole file name when that is too short
+        for a PhotoModel, or the position of the file in the form.
+        """
+        filename = (filename or '').strip()
+        for name in (Path(filename).stem.strip(), filename):
+            if len(name) >= 3:
+                return name[:150]
+        return f'Photo {index + 1}'
+
+    def add(self, staged: StagedFile):
+        """
+        Validates a received file and starts its push. The photo is named after the file, the description
+        is the description field of the form if it came before the file.
+
+        :param staged: StagedFile: A file yielded by stream_form
+        """
+        index = len(self.files) + len(self.rejected)
+        name = self.photo_name(staged.filename, index)
+        try:
+            body = PhotoModel(name=name, description=self.description or name)
+        except ValidationError as err:
+            staged.discard()
+            self.rejected.append({'index': index, 'filename': staged.filename, 'status': 'rejected',
+                                  'error': err.errors()[0]['msg']})
+            return
+        if staged.content_hash in self.sources:
+            staged.discard()
+        else:
+            self.sources[staged.content_hash] = staged
+            self.pushes[staged.content_hash] = asyncio.create_task(self._push(staged))
+        self.files.append((index, staged, body))
+
+    async def _push(self, staged: StagedFile) -> tuple[str, dict[str, str]]:
+        async with self.semaphore:
+            return await push_file(staged.path, 'Y/' + staged.content_hash, staged.content_hash)
+
+    def abort(self):
+        """
+        Stops the pushes of a form that was rejected; no rows were created yet.
+        """
+        for push in self.pushes.values():
+            push.cancel()
+        for staged in self.sources.values():
+            staged.discard()
+
+    def _stage_jobs(self):
+        # a hard link per photo: the pushes keep reading the files they were given
+        for job, (_, staged, _) in zip(self.jobs, self.files):
+            os.link(self.sources[staged.content_hash].path, job.path)
+
+    def _discard_files(self):
+        for job in self.jobs:
+            job.path.unlink(missing_ok=True)
+        for staged in self.sources.values():
+            staged.discard()
+
+    async def create_rows(self, db: AsyncSession):
+        """
+        Creates the pending photos of all valid files in one INSERT, stages a file for the UploadJob of each
+        of them and starts the task that finalises them.
+        """
+        if self.files:
+            self.photo_ids = await photo_repository.create_pending_photos(
+                [(body, staged.content_hash) for _, staged, body in self.files], self.user_id, db)
+            self.jobs = [UploadJob.staged(self.staging_dir, photo_id, self.user_id, 'Y/' + staged.content_hash)
+                         for photo_id, (_, staged, _) in zip(self.photo_ids, self.files)]
+            try:
+                await run_in_threadpool(self._stage_jobs)
+            except Exception:
+                await run_in_threadpool(self._discard_files)
+                await photo_repository.finalize_photos(self.user_id, [], self.photo_ids, db)
+                raise
+        self.finished = asyncio.create_task(self._finish())
+        _bulk_uploads.add(self.finished)
+        self.finished.add_done_callback(_bulk_uploads.discard)
+
+    async def _finish(self) -> dict:
+        if not self.files:
+            return {'uploaded': 0, 'failed': 0, 'rejected': len(self.rejected)}
+        results = await asyncio.gather(*self.pushes.values(), return_exceptions=True)
+        pushed = dict(zip(self.pushes, results))
+        uploaded, failed = [], []
+        for photo_id, (_, staged, _) in zip(self.photo_ids, self.files):
+            result = pushed[staged.content_hash]
+            if isinstance(result, BaseException):
+                failed.append(photo_id)
+            else:
+                uploaded.append((photo_id, *result))
+        for content_hash, result in pushed.items():
+            if isinstance(result, BaseException):
+                logger.error('Bulk upload of %s failed', content_hash, exc_info=result)
+        async with SessionLocal() as session:
+            email = await photo_repository.finalize_photos(self.user_id, uploaded, failed, session)
+        # only now, a restart before the commit uploads the photos again from their staged files
+        await run_in_threadpool(self._discard_files)
+        if email:
+            await user_cache.invalidate(email)
+        return {'uploaded': len(uploaded), 'failed': len(failed), 'rejected': len(self.rejected)}
+
+    async def results(self):
+        """
+        Streams the result of every file as a line of NDJSON, in the order the pushes finish, and a summary
+        line once all photos are finalised.
+
+        :return: An async generator of the lines
+        """
+        for result in self.rejected:
+            yield json.dumps(result) + '\n'
+        waiting = {}
+        for photo_id, (index, staged, _) in zip(self.photo_ids, self.files):
+            waiting.setdefault(self.pushes[staged.content_hash], []).append((index, staged.filename, photo_id))
+        pending = set(waiting)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for push in done:
+                for index, filename, photo_id in waiting[push]:
+                    result = {'index': index, 'filename': filename, 'id': photo_id}
+                    if push.cancelled() or push.exception() is not None:
+                        result.update(status='failed', error='Upload failed')
+                    else:
+                        result.update(status='uploaded', photo_url=push.result()[0])
+                    yield json.dumps(result) + '\n'
+        yield json.dumps(await asyncio.shield(self.finished)) + '\n'
+
+
+def upload_stats() -> dict:
+    """
+    The upload_stats function reports the upload queue length and how often uploads were deduplicated.
+
+    :return: A dictionary with the queue length, dedup hits, misses and hit rate
+    """
+    total = dedup_hits.value + dedup_misses.value
+    return {'queued': upload_worker.queue.qsize(), 'dedup_hits': dedup_hits.value,
+            'dedup_misses': dedup_misses.value, 'dedup_hit_rate': dedup_hits.value / total if total else 0.0}
+
+
+upload_worker = UploadWorker(staging_dir=settings.upload_staging_dir, workers=settings.upload_workers,
+                             queue_size=settings.upload_queue_size)
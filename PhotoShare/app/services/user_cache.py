@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+
+import redis
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from PhotoShare.app.core.config import settings
+from PhotoShare.app.models.user import User
+from PhotoShare.app.services.redis import RedisService
+
+USER_INVALIDATED_CHANNEL = 'user_invalidated'
+
+
+class UserCache:
+    """
+    Короткоживучий кеш автентифікованих користувачів у пам'яті процесу, ключем якого є email.
+    Зберігаються лише значення колонок, а не ORM-об'єкт, тому кожен запит отримує власний екземпляр User,
+    прив'язаний до його сесії. Записи живуть ttl секунд, кількість записів обмежена size (LRU).
+    Кожна зміна користувача видаляє запис локально та публікує email в канал USER_INVALIDATED_CHANNEL,
+    щоб інші процеси теж видалили свої записи.
+    """
+
+    def __init__(self, ttl: int, size: int, enabled: bool = True):
+        self.ttl = ttl
+        self.size = size
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._version = 0
+
+    def version(self) -> int:
+        """
+        Функція повертає номер останнього скидання кешу. Його потрібно отримати до завантаження користувача з бази
+        даних і передати в set, щоб не закешувати дані, які змінилися під час завантаження.
+        """
+        return self._version
+
+    def get(self, email: str, session=None) -> User | None:
+        """
+        Функція повертає користувача з кешу, або None, якщо запису немає чи він застарів.
+        Args:
+        email: Email користувача
+        session: Сесія, до якої буде прив'язано відновлений об'єкт User
+        Returns:
+        Об'єкт користувача без запиту до бази даних
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(email)
+        if entry is None:
+            return None
+        expires_at, snapshot = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(email, None)
+            return None
+        self._entries.move_to_end(email)
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        if session is not None:
+            session.add(user)
+        return user
+
+    def set(self, user: User, version: int):
+        if not self.enabled or user is None or self._version != version:
+            return
+        snapshot = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._entries[user.email] = (time.monotonic() + self.ttl, snapshot)
+        self._entries.move_to_end(user.email)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def discard(self, email: str):
+        self._version += 1
+        self._entries.pop(email, None)
+
+    async def invalidate(self, email: str):
+        """
+        Функція видаляє користувача з кешу цього процесу та повідомляє інші процеси через Redis.
+        Викликається після кожного збереження змін користувача (профіль, бан, пароль, роль, токени).
+        Args:
+        email: Email користувача
+        """
+        self.discard(email)
+        if self.enabled and RedisService.rds is not None:
+            try:
+                await RedisService.rds.publish(USER_INVALIDATED_CHANNEL, email)
+            except redis.RedisError:
+                pass
+
+    def on_message(self, data):
+        if isinstance(data, bytes):
+            data = data.decode()
+        self.discard(data)
+
+    def clear(self):
+        self._version += 1
+        self._entries.clear()
+
+    async def on_connect(self, cache):
+        self.clear()
+
+    def on_disconnect(self):
+        self.clear()
+
+
+user_cache = UserCache(ttl=settings.user_cache_ttl, size=settings.user_cache_size, enabled=settings.user_cache_enabled)
@@ -2,17 +2,26 @@ import pytest
 
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app
 from PhotoShare.app.models.base import Base
 from PhotoShare.app.core.database import get_db
 from PhotoShare.app.core.config import settings
+from PhotoShare.app.services.response_cache import response_cache
+from PhotoShare.app.services.user_cache import user_cache
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{settings.postgres_user}:" \
                           f"{settings.postgres_password}@snuffleupagus.db.elephantsql.com/{settings.postgres_db_name}"
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# TestClient runs every request in its own event loop, so asyncpg connections must not be pooled between requests
+async_engine = create_async_engine(make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql+asyncpg"),
+                                   poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
 
 
 @pytest.fixture(scope="module")
@@ -33,13 +42,14 @@ def session():
 def client(session):
     # Dependency override
 
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
+    # tests change users directly through the sync session, bypassing the repository invalidation
+    user_cache.enabled = False
+    response_cache.enabled = False
 
     yield TestClient(app)
 
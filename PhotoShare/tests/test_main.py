@@ -1,9 +1,22 @@
 from unittest.mock import patch
 
+import pytest
+
 from main import startup
+from PhotoShare.app.services.logout import REVOKED_TOKENS_CHANNEL
+from PhotoShare.app.services.response_cache import RESPONSE_INVALIDATED_CHANNEL
+from PhotoShare.app.services.user_cache import USER_INVALIDATED_CHANNEL
 
 
-def test_startup():
-    with patch("PhotoShare.app.services.redis.RedisService.init", autospec=True) as mock_init:
-        startup()
+@pytest.mark.asyncio
+async def test_startup():
+    with patch("PhotoShare.app.services.redis.RedisService.init", autospec=True) as mock_init, \
+            patch("PhotoShare.app.services.redis.RedisService.subscribe") as mock_subscribe, \
+            patch("main.migrate_revoked_tokens") as mock_migrate, \
+            patch("main.upload_worker.start") as mock_upload_worker_start:
+        await startup()
         mock_init.assert_called_once()
+        mock_migrate.assert_awaited_once_with(mock_init.return_value)
+        mock_upload_worker_start.assert_awaited_once()
+        channels = [call.args[0] for call in mock_subscribe.call_args_list]
+        assert channels == [REVOKED_TOKENS_CHANNEL, USER_INVALIDATED_CHANNEL, RESPONSE_INVALIDATED_CHANNEL]
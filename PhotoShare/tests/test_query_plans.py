@@ -0,0 +1,309 @@
+"""
+Query plan regression tests: every repository query runs against tables seeded with enough rows that a missing
+index shows up as a sequential scan in its EXPLAIN, and every list query, serialised the way its endpoint does it,
+sends the same number of statements whatever the page size.
+
+The tables are created in a throw-away schema of the database given in QUERY_PLAN_DATABASE_URL
+(postgresql+asyncpg://...), the tests are skipped without it.
+"""
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.pool import NullPool
+
+from PhotoShare.app.models.base import Base
+from PhotoShare.app.models.user import User
+from PhotoShare.app.repositories import comments as comment_repository
+from PhotoShare.app.repositories import photo as photo_repository
+from PhotoShare.app.repositories import rating as rating_repository
+from PhotoShare.app.repositories import tags as tag_repository
+from PhotoShare.app.repositories import users as user_repository
+from PhotoShare.app.schemas.comment import CommentResponse
+from PhotoShare.app.schemas.photo import PhotoResponse, PhotoModel, PhotoUpdate, TagModel, TagResponse
+from PhotoShare.app.schemas.rating import RatingModel, RatingBatchItem, RatingResponse
+from PhotoShare.app.services.search import InMemorySearch
+
+DATABASE_URL = os.environ.get("QUERY_PLAN_DATABASE_URL")
+SCHEMA = "query_plans"
+
+USERS = 1000
+PHOTOS = 20000
+TAGS = 2000
+COMMENTS = 50000
+RATINGS = 50000
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="QUERY_PLAN_DATABASE_URL is not set")
+
+SEED = [
+    ("INSERT INTO users (email, username, password, banned, confirmed, role, uploaded_photos, created_at) "
+     "SELECT 'user' || i || '@example.com', 'user' || i, 'password', false, true, 'user', 0, now() "
+     "FROM generate_series(1, :users) AS i"),
+    ("INSERT INTO photo (name, description, photo_url, status, content_hash, user_id) "
+     "SELECT 'photo' || i, 'description of photo ' || i, 'url' || i, 'ready', md5(i::text), i % :users + 1 "
+     "FROM generate_series(1, :photos) AS i"),
+    "INSERT INTO tags (name) SELECT 'tag' || i FROM generate_series(1, :tags) AS i",
+    ("INSERT INTO photo_m2m_tag (photo_id, tag_id) "
+     "SELECT i, i % :tags + 1 FROM generate_series(1, :photos) AS i "
+     "UNION ALL SELECT i, (i + :tags / 2) % :tags + 1 FROM generate_series(1, :photos) AS i"),
+    ("INSERT INTO comments (content, user_id, photo_id, created_at, updated_at) "
+     "SELECT 'comment ' || i, i % :users + 1, i % :photos + 1, now(), now() FROM generate_series(0, :comments - 1) AS i"),
+    ("INSERT INTO ratings (rating, photo_id, user_id) "
+     "SELECT i % 5 + 1, i % :photos + 1, (i / :photos * 337 + i) % :users + 1 "
+     "FROM generate_series(0, :ratings - 1) AS i"),
+    ("UPDATE photo SET rating_sum = totals.rating_sum, rating_count = totals.rating_count "
+     "FROM (SELECT photo_id, sum(rating) AS rating_sum, count(*) AS rating_count FROM ratings GROUP BY photo_id) "
+     "AS totals WHERE photo.id = totals.photo_id"),
+    "ANALYZE",
+]
+
+
+def cached_user(user_id: int, db, **columns) -> User:
+    # a user rebuilt from a snapshot, the way user_cache returns it
+    user = User(id=user_id, email=f"user{user_id}@example.com", password="password", **columns)
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
+
+async def add_tags(photo_id, names, db):
+    photo = await photo_repository.get_photo(photo_id, db)
+    return await photo_repository.add_tags(photo, names, db)
+
+
+QUERIES = {
+    "get_photos": lambda db: photo_repository.get_photos(10, None, db),
+    "get_photos after_id": lambda db: photo_repository.get_photos(10, PHOTOS // 2, db),
+    "get_photo": lambda db: photo_repository.get_photo(100, db),
+    "get_photo_user": lambda db: photo_repository.get_photo_user(101, db, User(id=102)),
+    "get_photo_urls": lambda db: photo_repository.get_photo_urls(list(range(100, 200)), db),
+    "get_photo_variants": lambda db: photo_repository.get_photo_variants(109, db),
+    "get_photo_url_by_hash": lambda db: photo_repository.get_photo_url_by_hash("c4ca4238a0b923820dcc509a6f75849b", db),
+    "search_photos": lambda db: photo_repository.search_photos("photo1234", 20, 0, db),
+    "search_photos by tag": lambda db: photo_repository.search_photos("tag17", 20, 0, db),
+    "update_photo": lambda db: photo_repository.update_photo(103, PhotoUpdate(name="new", description="new"), db,
+                                                             User(id=104)),
+    "add_tags": lambda db: add_tags(108, ["tag9", "tag10", "brand new"], db),
+    "finalize_photo": lambda db: photo_repository.finalize_photo(105, 106, "url", db, {"thumb": "url"}),
+    "fail_photo": lambda db: photo_repository.fail_photo(107, db),
+    "create_photo": lambda db: photo_repository.create_photo(PhotoModel(name="copy", description="copy"), "url1", db,
+                                                             cached_user(133, db),
+                                                             content_hash="c4ca4238a0b923820dcc509a6f75849b",
+                                                             count_upload=True),
+    "create_pending_photos": lambda db: photo_repository.create_pending_photos(
+        [(PhotoModel(name=f"album{i}", description="album"), "c4ca4238a0b923820dcc509a6f75849b") for i in range(20)],
+        110, db),
+    "finalize_photos": lambda db: photo_repository.finalize_photos(
+        110, [(photo_id, "url", {"thumb": "url"}) for photo_id in range(111, 131)], [131, 132], db),
+    "get_tags": lambda db: tag_repository.get_tags(TAGS // 2, 100, db),
+    "get_tag": lambda db: tag_repository.get_tag(5, db),
+    "create_tag": lambda db: tag_repository.create_tag(TagModel(name="tag5"), db),
+    "get_comments": lambda db: comment_repository.get_comments(10, 200, db),
+    "get_comments after_id": lambda db: comment_repository.get_comments(10, 200, db, after_id=200),
+    "get_comment": lambda db: comment_repository.get_comment(300, db),
+    "get_ratings by photo": lambda db: rating_repository.get_ratings(db, photo_id=400),
+    "get_ratings by user": lambda db: rating_repository.get_ratings(db, user_id=401),
+    "get_rating": lambda db: rating_repository.get_rating(402, db),
+    "add_rating": lambda db: rating_repository.add_rating(RatingModel(rating=3), 403, 999, db),
+    "add_ratings": lambda db: rating_repository.add_ratings([RatingBatchItem(photo_id=photo_id, rating=4)
+                                                             for photo_id in range(500, 520)], 998, db),
+    "delete_rating": lambda db: rating_repository.delete_rating(404, db),
+    "get_user_by_email": lambda db: user_repository.get_user_by_email("user7@example.com", db),
+}
+
+memory_search = InMemorySearch()
+for photo_id in range(1, 101):
+    memory_search.index_photo(photo_id, f"photo{photo_id}", None, [])
+
+# name: (query taking the page size, response model, number of statements)
+LIST_QUERIES = {
+    "get_photos": (lambda limit, db: photo_repository.get_photos(limit, None, db), PhotoResponse, 2),
+    "search_photos": (lambda limit, db: photo_repository.search_photos("photo", limit, 0, db), PhotoResponse, 2),
+    "memory search": (lambda limit, db: memory_search.search("photo", limit, 0, db), PhotoResponse, 2),
+    "get_tags": (lambda limit, db: tag_repository.get_tags(None, limit, db), TagResponse, 1),
+    "get_comments": (lambda limit, db: comment_repository.get_comments(limit, 200, db), CommentResponse, 1),
+    "get_ratings": (lambda limit, db: rating_repository.get_ratings(db, user_id=401), RatingResponse, 1),
+}
+
+
+def create_engine():
+    return create_async_engine(DATABASE_URL, poolclass=NullPool,
+                               connect_args={"server_settings": {"search_path": SCHEMA}})
+
+
+async def seed():
+    engine = create_engine()
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all)
+        for statement in SEED:
+            await conn.execute(text(statement), {"users": USERS, "photos": PHOTOS, "tags": TAGS,
+                                                 "comments": COMMENTS, "ratings": RATINGS})
+    await engine.dispose()
+
+
+async def drop():
+    engine = create_engine()
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    await engine.dispose()
+
+
+def seq_scans(plan: dict) -> list[str]:
+    scans = [plan["Relation Name"]] if plan["Node Type"] == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        scans += seq_scans(child)
+    return scans
+
+
+@contextmanager
+def recorded_statements(engine):
+    """
+    Collects (statement, parameters) of everything the engine sends to the database inside the block.
+    """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+@contextmanager
+def assert_queries(engine, expected: int):
+    """
+    Fails if the block sends a number of statements other than expected, listing the statements it sent.
+    """
+    with recorded_statements(engine) as statements:
+        yield statements
+    assert len(statements) == expected, \
+        f"{len(statements)} statements instead of {expected}:\n\n" + "\n\n".join(sql for sql, _ in statements)
+
+
+async def explain(query) -> list[tuple[str, list[str]]]:
+    """
+    Runs the query, recording every statement it sends, and returns the statements whose plans contain
+    sequential scans together with the scanned tables.
+    """
+    engine = create_engine()
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            await session.execute(text("SELECT 1"))
+            with recorded_statements(engine) as statements:
+                await query(session)
+            await session.rollback()
+        results = []
+        async with engine.connect() as conn:
+            for statement, parameters in statements:
+                if not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")):
+                    continue
+                plan = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                plan = plan.scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                scans = seq_scans(plan[0]["Plan"])
+                if scans:
+                    results.append((statement, scans))
+        return results
+    finally:
+        await engine.dispose()
+
+
+async def serialise_list(query, schema, limit: int, expected: int) -> list:
+    """
+    Runs a list query and validates every item with the response model inside assert_queries, so relationships
+    loaded one item at a time while serialising count as well.
+    """
+    engine = create_engine()
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            await session.execute(text("SELECT 1"))
+            with assert_queries(engine, expected):
+                items = [schema.model_validate(item, from_attributes=True) for item in await query(limit, session)]
+            await session.rollback()
+        return items
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    asyncio.run(seed())
+    yield
+    asyncio.run(drop())
+
+
+@pytest.mark.parametrize("name", QUERIES)
+def test_query_uses_indexes(seeded, name):
+    results = asyncio.run(explain(QUERIES[name]))
+    assert not results, "\n\n".join(f"Seq Scan on {', '.join(scans)}:\n{statement}" for statement, scans in results)
+
+
+async def create_photo_with_stale_user(user_id: int) -> int:
+    """
+    Creates a photo counted as uploaded for a cached user whose uploaded_photos is behind the database and returns
+    the counter stored afterwards.
+    """
+    engine = create_engine()
+    try:
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            await session.execute(text("UPDATE users SET uploaded_photos = 5 WHERE id = :id"), {"id": user_id})
+            await session.commit()
+            await photo_repository.create_photo(PhotoModel(name="copy", description="copy"), "url1", session,
+                                                cached_user(user_id, session, uploaded_photos=2),
+                                                content_hash="c4ca4238a0b923820dcc509a6f75849b", count_upload=True)
+            result = await session.execute(text("SELECT uploaded_photos FROM users WHERE id = :id"), {"id": user_id})
+            return result.scalar()
+    finally:
+        await engine.dispose()
+
+
+def test_create_photo_counts_with_stale_user(seeded):
+    assert asyncio.run(create_photo_with_stale_user(134)) == 6
+
+
+async def delete_rating_twice(rating_id: int) -> tuple[list, tuple]:
+    """
+    Deletes the same rating from two sessions at once and returns the results and the totals of the photo before
+    and after.
+    """
+    engine = create_engine()
+    totals = text("SELECT rating_sum, rating_count FROM photo WHERE id = (SELECT photo_id FROM ratings WHERE id = :id)")
+    try:
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        async with sessions() as first, sessions() as second:
+            before = (await first.execute(totals, {"id": rating_id})).one()
+            photo_id = (await first.execute(text("SELECT photo_id FROM ratings WHERE id = :id"),
+                                            {"id": rating_id})).scalar()
+            await first.commit()
+            results = await asyncio.gather(rating_repository.delete_rating(rating_id, first),
+                                           rating_repository.delete_rating(rating_id, second))
+            after = (await first.execute(text("SELECT rating_sum, rating_count FROM photo WHERE id = :id"),
+                                         {"id": photo_id})).one()
+            return results, (tuple(before), tuple(after))
+    finally:
+        await engine.dispose()
+
+
+def test_concurrent_delete_rating_counts_once(seeded):
+    results, (before, after) = asyncio.run(delete_rating_twice(405))
+    deleted = [rating for rating in results if rating is not None]
+    assert len(deleted) == 1
+    assert after == (before[0] - deleted[0].rating, before[1] - 1)
+
+
+@pytest.mark.parametrize("limit", [5, 50])
+@pytest.mark.parametrize("name", LIST_QUERIES)
+def test_list_queries_are_constant(seeded, name, limit):
+    query, schema, expected = LIST_QUERIES[name]
+    items = asyncio.run(serialise_list(query, schema, limit, expected))
+    assert items
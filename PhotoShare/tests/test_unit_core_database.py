@@ -0,0 +1,42 @@
+import unittest
+
+from sqlalchemy.pool import NullPool
+
+from PhotoShare.app.core.database import InstrumentedPool, pool_stats
+from PhotoShare.app.core.metrics import Histogram
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_observe_is_cumulative(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 4)
+        self.assertAlmostEqual(snapshot['sum'], 4.25)
+        self.assertEqual(snapshot['buckets'], {'0.1': 1, '1.0': 3, '+Inf': 4})
+
+
+class TestPoolStats(unittest.TestCase):
+
+    def test_queue_pool(self):
+        pool = InstrumentedPool(lambda: None, pool_size=3, max_overflow=2, timeout=5)
+        stats = pool_stats(pool)
+        self.assertEqual(stats['pool'], 'InstrumentedPool')
+        self.assertEqual(stats['size'], 3)
+        self.assertEqual(stats['checked_out'], 0)
+        self.assertEqual(stats['idle'], 0)
+        self.assertEqual(stats['overflow'], 0)
+        self.assertEqual(stats['max_overflow'], 2)
+        self.assertIn('wait_time', stats)
+
+    def test_null_pool(self):
+        stats = pool_stats(NullPool(lambda: None))
+        self.assertEqual(stats['pool'], 'NullPool')
+        self.assertNotIn('checked_out', stats)
+        self.assertIn('timeouts', stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+
+from PhotoShare.app.core.pagination import encode_cursor, decode_cursor, make_page
+
+
+class TestPagination(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(10_000)), 10_000)
+        self.assertIsNone(decode_cursor(None))
+        self.assertIsNone(decode_cursor(''))
+
+    def test_invalid_cursor(self):
+        for cursor in ('not a cursor', encode_cursor('1'), 'e30'):
+            with self.assertRaises(HTTPException) as err:
+                decode_cursor(cursor)
+            self.assertEqual(err.exception.status_code, 400)
+
+    def test_negative_cursor(self):
+        # search uses the cursor as an OFFSET, which must not be negative
+        self.assertEqual(decode_cursor(encode_cursor(0)), 0)
+        with self.assertRaises(HTTPException) as err:
+            decode_cursor(encode_cursor(-5))
+        self.assertEqual(err.exception.status_code, 400)
+
+    def test_make_page(self):
+        rows = [SimpleNamespace(id=i) for i in (9, 8, 7)]
+        page = make_page(rows, 2)
+        self.assertEqual(page['items'], rows[:2])
+        self.assertEqual(decode_cursor(page['next_cursor']), 8)
+        self.assertIsNone(make_page(rows, 3)['next_cursor'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 from PhotoShare.app.repositories.comments import get_comments, get_comment, create_comment, \
     update_comment, delete_comment
@@ -8,12 +8,14 @@ from PhotoShare.app.models.comment import Comment
 from PhotoShare.app.models.user import User
 from PhotoShare.app.schemas.comment import CommentModel
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
-class TestComment(unittest.TestCase):
+class TestComment(unittest.IsolatedAsyncioTestCase):
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
         self.test_user = User(id=1,
                               email='someemail@gmail.com',
                               role=1,
@@ -24,51 +26,48 @@ class TestComment(unittest.TestCase):
                               password='secret')
         self.test_photo = MagicMock(spec=Photo, id=1, photo_url="http://example.com/photo.jpg")
 
-    def test_get_comment(self):
+    async def test_get_comment(self):
         expected_comment = Comment(id=1, content="Test content")
-        self.session.query().filter().first.return_value = expected_comment
-        result = get_comment(comment_id=1, db=self.session)
+        self.result.scalars.return_value.first.return_value = expected_comment
+        result = await get_comment(comment_id=1, db=self.session)
         self.assertEqual(result, expected_comment)
 
-    def test_get_comments(self):
+    async def test_get_comments(self):
         expected_comments = [Comment(id=1, content="content1"), Comment(id=2, content="content2")]
-        self.session.query().filter().limit().all.return_value = expected_comments
-        result = get_comments(2, 1, self.session)
+        self.result.scalars.return_value.all.return_value = expected_comments
+        result = await get_comments(2, 1, self.session)
         self.assertEqual(result, expected_comments)
 
-    def test_create_comment(self):
+    async def test_create_comment(self):
         comment_model = CommentModel(content="Test content")
         expected_comment = Comment(id=1, content=comment_model.content, user_id=1, photo_id=1)
-        self.session.add = MagicMock()
-        self.session.commit = MagicMock()
-        self.session.refresh = MagicMock()
-        result = create_comment(comment_model, self.test_user, 1, self.session)
+        result = await create_comment(comment_model, self.test_user, 1, self.session)
 
         self.assertEqual(result.content, expected_comment.content)
         self.assertEqual(result.user_id, expected_comment.user_id)
         self.assertEqual(result.photo_id, expected_comment.photo_id)
 
-    def test_create_comments_by_photo(self):
+    async def test_create_comments_by_photo(self):
         comments = [Comment(), Comment(), Comment()]
-        self.session.query().filter().limit().all.return_value = comments
-        result = get_comments(limit=10, photo_id=1, db=self.session)
+        self.result.scalars.return_value.all.return_value = comments
+        result = await get_comments(limit=10, photo_id=1, db=self.session)
         self.assertEqual(result, comments)
 
-    def test_update_comment(self):
+    async def test_update_comment(self):
         comment_model = CommentModel(id=1, content="Updated content")
         existing_comment = Comment(id=1, content="Old content")
-        self.session.query().filter().first.return_value = existing_comment
-        updated_comment_obj = update_comment(comment_model, 1, self.session)
+        self.result.scalars.return_value.first.return_value = existing_comment
+        updated_comment_obj = await update_comment(comment_model, 1, self.session)
         self.assertIsNotNone(updated_comment_obj, "update_comment return None")
         self.assertEqual(updated_comment_obj.content, "Updated content")
 
-    def test_delete_comment(self):
+    async def test_delete_comment(self):
         existing_comment = Comment(id=1, content="Old content")
-        self.session.query().filter().first.return_value = existing_comment
-        deleted_comment = delete_comment(1, self.session)
+        self.result.scalars.return_value.first.return_value = existing_comment
+        deleted_comment = await delete_comment(1, self.session)
         self.assertEqual(deleted_comment, existing_comment)
-        self.session.delete.assert_called_once_with(existing_comment)
-        self.session.commit.assert_called_once()
+        self.session.delete.assert_awaited_once_with(existing_comment)
+        self.session.commit.assert_awaited_once()
 
 
 if __name__ == '__main__':
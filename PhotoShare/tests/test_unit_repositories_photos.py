@@ -1,92 +1,131 @@
 import unittest
-from unittest.mock import MagicMock
-from sqlalchemy.orm import Session
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from PhotoShare.app.models.photo import Photo
 from PhotoShare.app.models.user import User
-from PhotoShare.app.repositories.photo import get_photos, get_photo, create_photo, update_photo, remove_photo
+from PhotoShare.app.repositories.photo import get_photos, get_photo, create_photo, update_photo, remove_photo, \
+    build_search_query, search_photos, add_tags, get_photo_variants
 from PhotoShare.app.schemas.photo import PhotoModel
 
 
-class TestPhoto(unittest.TestCase):
+class TestPhoto(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
         self.user = User(id=1)
 
-    def test_get_photos_found(self):
+    async def test_get_photos_found(self):
         expect_res = [Photo(), Photo()]
-        self.session.execute().scalars().all.return_value = expect_res
-        result = get_photos(limit=2, offset=0, db=self.session)
+        self.result.scalars().all.return_value = expect_res
+        result = await get_photos(limit=2, after_id=None, db=self.session)
         self.assertEqual(result, expect_res)
 
-    def test_get_photo_found(self):
+    async def test_get_photo_found(self):
         expect_res = Photo()
-        self.session.execute().scalar_one_or_none.return_value = expect_res
-        result = get_photo(photo_id=1, db=self.session)
+        self.result.scalar_one_or_none.return_value = expect_res
+        result = await get_photo(photo_id=1, db=self.session)
         self.assertEqual(result, expect_res)
 
-    def test_get_photo_not_found(self):
-        self.session.execute.return_value.scalar_one_or_none.return_value = None
-        result = get_photo(photo_id=1, db=self.session)
+    async def test_get_photo_not_found(self):
+        self.result.scalar_one_or_none.return_value = None
+        result = await get_photo(photo_id=1, db=self.session)
         self.assertIsNone(result)
 
-    def test_create_found(self):
+    async def test_create_found(self):
         body = PhotoModel(name="Test Photo", description="new_desc", photo_url="test_url")
-        result = create_photo(body=body, photo_url="photo_url", user=self.user, db=self.session)
+        result = await create_photo(body=body, photo_url="photo_url", user=self.user, db=self.session)
         self.assertEqual(result.description, body.description)
         self.assertTrue(hasattr(result, "id"))
 
-    def test_get_photo_from_id_found(self):
+    async def test_get_photo_from_id_found(self):
         expect_res = Photo()
-        self.session.execute().scalar_one_or_none.return_value = expect_res
-        result = get_photo(photo_id=1, db=self.session)
+        self.result.scalar_one_or_none.return_value = expect_res
+        result = await get_photo(photo_id=1, db=self.session)
         self.assertEqual(result, expect_res)
 
-    def test_get_photo_from_id_not_found(self):
-        self.session.execute().scalar_one_or_none.return_value = None
-        result = get_photo(photo_id=1, db=self.session)
+    async def test_get_photo_from_id_not_found(self):
+        self.result.scalar_one_or_none.return_value = None
+        result = await get_photo(photo_id=1, db=self.session)
         self.assertIsNone(result)
 
-    def test_get_photo_from_url_found(self):
+    async def test_get_photo_from_url_found(self):
         expect_res = Photo()
-        self.session.execute().scalar_one_or_none.return_value = expect_res
-        result = get_photo(photo_id=1, db=self.session)
+        self.result.scalar_one_or_none.return_value = expect_res
+        result = await get_photo(photo_id=1, db=self.session)
         self.assertEqual(result, expect_res)
 
-    def test_get_photo_from_url_not_found(self):
-        self.session.execute().scalar_one_or_none.return_value = None
-        result = get_photo(photo_id=0, db=self.session)
+    async def test_get_photo_from_url_not_found(self):
+        self.result.scalar_one_or_none.return_value = None
+        result = await get_photo(photo_id=0, db=self.session)
         self.assertIsNone(result)
 
-    def test_remove_found(self):
+    async def test_remove_found(self):
         expect_res = Photo()
-        self.session.execute().scalar_one_or_none.return_value = expect_res
-        result = remove_photo(photo_id=1, user=self.user, db=self.session)
+        self.result.scalar_one_or_none.return_value = expect_res
+        result = await remove_photo(photo_id=1, user=self.user, db=self.session)
         self.assertEqual(result, expect_res)
 
-    def test_remove_not_found(self):
-        self.session.execute().scalar_one_or_none.return_value = None
-        result = remove_photo(photo_id=100, user=self.user, db=self.session)
+    async def test_remove_not_found(self):
+        self.result.scalar_one_or_none.return_value = None
+        result = await remove_photo(photo_id=100, user=self.user, db=self.session)
         self.assertIsNone(result)
 
-    def test_update_photo_found(self):
+    async def test_update_photo_found(self):
         expect_res = Photo(description="old_desc")
         body = PhotoModel(name="test_name", description="new_desc", tags="last, python", photo_url="test_url")
-        self.session.query().filter().first.return_value = expect_res
+        self.result.scalar_one_or_none.return_value = expect_res
         self.session.commit.return_value = None
-        result = update_photo(photo_id=1, body=body, user=self.user, db=self.session)
+        result = await update_photo(photo_id=1, body=body, user=self.user, db=self.session)
         self.assertEqual(result.description, "new_desc")
         self.assertTrue(hasattr(result, "updated_at"))
 
-    def test_change_description_not_found(self):
+    async def test_change_description_not_found(self):
         body = PhotoModel(name="test_name", description="test description test test", tags="last, python",
                           photo_url="test_url")
-        self.session.execute().scalar_one_or_none.return_value = None
+        self.result.scalar_one_or_none.return_value = None
         self.session.commit.return_value = None
-        result = update_photo(body=body, photo_id=1, user=self.user, db=self.session)
+        result = await update_photo(body=body, photo_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
 
 if __name__ == '__main__':
     unittest.main()
+
+    def test_build_search_query(self):
+        self.assertEqual(build_search_query("Sunset beach"), "sunset:* & beach:*")
+        self.assertEqual(build_search_query("cat's | !dog"), "cat:* & s:* & dog:*")
+        self.assertIsNone(build_search_query("!&|"))
+
+    async def test_search_photos(self):
+        expect_res = [Photo(), Photo()]
+        self.result.scalars().all.return_value = expect_res
+        result = await search_photos("sunset", limit=2, offset=0, db=self.session)
+        self.assertEqual(result, expect_res)
+        sql = str(self.session.execute.call_args.args[0])
+        self.assertIn("@@ to_tsquery", sql)
+        self.assertIn("UNION ALL", sql)
+
+    async def test_add_tags(self):
+        photo = Photo(id=1, name="Sunset", description=None)
+        self.session.scalars.return_value = [3, 4]
+        result = await add_tags(photo, ["sea", "sky", "sea"], self.session)
+        self.assertEqual(result, photo)
+        upsert = self.session.scalars.call_args.args[0]
+        self.assertEqual(len(upsert.compile().params), 2)
+        self.assertIn("ON CONFLICT (name) DO UPDATE", str(upsert))
+        link = self.session.execute.call_args.args[0]
+        self.assertIn("ON CONFLICT DO NOTHING", str(link))
+        self.assertEqual(sorted(link.compile().params.values()), [1, 1, 3, 4])
+        self.session.commit.assert_awaited_once()
+        self.session.refresh.assert_awaited_once_with(photo, ["tags"])
+
+    async def test_get_photo_variants(self):
+        self.result.one_or_none.return_value = MagicMock(variants={"thumb": "thumb_url"})
+        self.assertEqual(await get_photo_variants(1, self.session), {"thumb": "thumb_url"})
+        self.result.one_or_none.return_value = MagicMock(variants=None)
+        self.assertEqual(await get_photo_variants(1, self.session), {})
+        self.result.one_or_none.return_value = None
+        self.assertIsNone(await get_photo_variants(1, self.session))
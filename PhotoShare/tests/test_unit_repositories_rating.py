@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from PhotoShare.app.models.rating import Rating
+from PhotoShare.app.repositories.rating import add_rating, delete_rating, add_ratings
+from PhotoShare.app.schemas.rating import RatingModel, RatingBatchItem
+
+
+class TestRating(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.session = AsyncMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
+
+    def executed_sql(self):
+        return [str(call.args[0].compile(compile_kwargs={"literal_binds": True}))
+                for call in self.session.execute.call_args_list]
+
+    async def test_add_rating_updates_sum_and_count(self):
+        self.session.scalar.return_value = Rating(id=3, rating=4, user_id=1, photo_id=7)
+        result = await add_rating(RatingModel(rating=4), photo_id=7, user_id=1, db=self.session)
+        self.assertEqual(result.rating, 4)
+        insert_sql = str(self.session.scalar.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("ON CONFLICT (photo_id, user_id) DO NOTHING", insert_sql)
+        sql, = self.executed_sql()
+        self.assertIn("rating_sum=(photo.rating_sum + 4), rating_count=(photo.rating_count + 1) WHERE photo.id = 7",
+                      sql)
+        self.session.commit.assert_awaited_once()
+
+    async def test_add_rating_already_rated(self):
+        self.session.scalar.return_value = None
+        self.assertIsNone(await add_rating(RatingModel(rating=4), photo_id=7, user_id=1, db=self.session))
+        self.session.execute.assert_not_called()
+        self.session.commit.assert_not_awaited()
+
+    async def test_delete_rating_updates_sum_and_count(self):
+        self.session.scalar.return_value = Rating(id=3, rating=5, photo_id=7)
+        result = await delete_rating(rating_id=3, db=self.session)
+        self.assertEqual(result.id, 3)
+        delete_sql = str(self.session.scalar.call_args.args[0].compile(compile_kwargs={"literal_binds": True}))
+        self.assertIn("DELETE FROM ratings WHERE ratings.id = 3 RETURNING", delete_sql)
+        sql, = self.executed_sql()
+        self.assertIn("rating_sum=(photo.rating_sum + -5), rating_count=(photo.rating_count + -1) WHERE photo.id = 7",
+                      sql)
+        self.session.commit.assert_awaited_once()
+
+    async def test_delete_rating_not_found(self):
+        # also the case of a concurrent request that deleted the rating first
+        self.session.scalar.return_value = None
+        self.assertIsNone(await delete_rating(rating_id=3, db=self.session))
+        self.session.execute.assert_not_called()
+        self.session.commit.assert_not_awaited()
+
+    async def test_add_ratings_batch(self):
+        photos = [(1, 2, False), (2, 2, False), (3, 1, False), (4, 2, True)]
+        inserted = MagicMock()
+        # photo 2 was rated by a concurrent request between the check and the insert
+        inserted.mappings.return_value = [{'id': 10, 'photo_id': 1, 'user_id': 1, 'rating': 5}]
+        self.session.execute.side_effect = [photos, inserted, MagicMock()]
+        items = [RatingBatchItem(photo_id=photo_id, rating=rating) for photo_id, rating in
+                 [(1, 5), (1, 4), (2, 3), (3, 3), (4, 2), (5, 1)]]
+        created, rejected = await add_ratings(items, user_id=1, db=self.session)
+        self.assertEqual(created, [{'id': 10, 'photo_id': 1, 'user_id': 1, 'rating': 5}])
+        self.assertEqual(sorted((item['photo_id'], item['detail']) for item in rejected), [
+            (1, 'duplicate photo in the batch'),
+            (2, 'current user have already rated this photo'),
+            (3, 'the user can not rate their own photo'),
+            (4, 'current user have already rated this photo'),
+            (5, 'Photo not found'),
+        ])
+        select_sql, insert_sql, update_sql = self.executed_sql()
+        self.assertIn("ON CONFLICT (photo_id, user_id) DO NOTHING", insert_sql)
+        self.assertIn("FROM (VALUES (1, 5)) AS totals", update_sql)
+        self.session.commit.assert_awaited_once()
+
+    async def test_add_ratings_nothing_to_insert(self):
+        self.session.execute.side_effect = [[(1, 1, False)]]
+        created, rejected = await add_ratings([RatingBatchItem(photo_id=1, rating=5)], user_id=1, db=self.session)
+        self.assertEqual(created, [])
+        self.assertEqual(rejected, [{'photo_id': 1, 'detail': 'the user can not rate their own photo'}])
+        self.session.commit.assert_not_awaited()
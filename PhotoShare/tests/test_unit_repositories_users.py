@@ -1,7 +1,7 @@
 import pytest
 import unittest
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, patch
 
 from PhotoShare.app.repositories.users import create_user
 from PhotoShare.app.schemas.user import UserRegisterModel
@@ -9,10 +9,10 @@ from PhotoShare.app.schemas.user import UserRegisterModel
 
 # Mocking SQLAlchemy Session
 class MockSession:
-    def query(self, model):
+    async def execute(self, statement):
         return self
 
-    def filter_by(self, **kwargs):
+    def scalars(self):
         return self
 
     def first(self):
@@ -21,10 +21,10 @@ class MockSession:
     def add(self, obj):
         return None
 
-    def commit(self):
+    async def commit(self):
         return None
 
-    def refresh(self, obj):
+    async def refresh(self, obj):
         return None
 
 
@@ -34,7 +34,8 @@ class MockGravatar:
         return "mock_avatar_url"
 
 
-def test_create_user():
+@pytest.mark.asyncio
+async def test_create_user():
     # Given
     session = MockSession()
     user_model = UserRegisterModel(
@@ -43,17 +44,17 @@ def test_create_user():
         password="testpassword",
         first_name="Jhon",
         last_name="Malckovich")
-    mock_get_user_by_email = MagicMock(return_value=None)
+    mock_get_user_by_email = AsyncMock(return_value=None)
 
     # When
     with patch("PhotoShare.app.repositories.users.get_user_by_email", mock_get_user_by_email):
         with patch("libgravatar.Gravatar.get_image", MockGravatar().get_image):  # MockGravatar
-            created_user = create_user(user_model, session)
+            created_user = await create_user(user_model, session)
 
     # Then
     assert created_user.email == "test@example.com"
     assert created_user.avatar == "mock_avatar_url"
-    mock_get_user_by_email.assert_called_once_with("test@example.com", session)
+    mock_get_user_by_email.assert_awaited_once_with("test@example.com", session)
 
 
 if __name__ == '__main__':
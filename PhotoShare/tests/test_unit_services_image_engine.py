@@ -0,0 +1,104 @@
+import io
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image
+
+from PhotoShare.app.services.image_engine import ImageEngine, parse_options, transform_key, transform_image, \
+    open_image
+from PhotoShare.app.services.storage import TRANSFORMATION_PRESETS
+
+
+def make_jpeg(size=(1600, 1200), orientation=None) -> bytes:
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    output = io.BytesIO()
+    image.save(output, format='JPEG', exif=exif)
+    return output.getvalue()
+
+
+def transformed(source: bytes, **options) -> Image.Image:
+    content, _ = transform_image(io.BytesIO(source), parse_options(options))
+    return Image.open(io.BytesIO(content))
+
+
+class TestTransformImage(unittest.TestCase):
+
+    def test_crop_modes(self):
+        source = make_jpeg()
+        self.assertEqual(transformed(source, width=200, height=200, crop='fill').size, (200, 200))
+        self.assertEqual(transformed(source, width=400, height=400, crop='fit').size, (400, 300))
+        self.assertEqual(transformed(source, width=4000, crop='limit').size, (1600, 1200))
+        self.assertEqual(transformed(source, width=800).size, (800, 600))
+        self.assertEqual(transformed(source, width=300, height=300, crop='pad').size, (300, 300))
+        self.assertEqual(transformed(source, width=100, height=50, crop='crop', gravity='south_east').size, (100, 50))
+        self.assertEqual(transformed(source, angle=90).size, (1200, 1600))
+
+    def test_presets(self):
+        source = make_jpeg()
+        for options in TRANSFORMATION_PRESETS.values():
+            image = transformed(source, **options)
+            self.assertEqual(image.width, options['width'])
+        self.assertEqual(transformed(source, **TRANSFORMATION_PRESETS['avatar']).format, 'PNG')
+
+    def test_draft_decodes_less_for_downscale(self):
+        # 1600x1200 covering 200x200 needs 267x200, the decoder scales by 1/4
+        self.assertEqual(open_image(io.BytesIO(make_jpeg()), parse_options({'width': 200, 'height': 200,
+                                                                             'crop': 'fill'})).size, (400, 300))
+        self.assertEqual(open_image(io.BytesIO(make_jpeg()), {'width': 100, 'crop': 'crop'}).size, (1600, 1200))
+
+    def test_draft_respects_exif_orientation(self):
+        self.assertEqual(open_image(io.BytesIO(make_jpeg(orientation=6)), {'width': 150}).size, (150, 200))
+        image = transformed(make_jpeg(orientation=6), width=150, height=200, crop='fill')
+        self.assertEqual(image.size, (150, 200))
+
+    def test_effects(self):
+        source = make_jpeg((64, 48))
+        for effect in ('grayscale', 'sepia', 'negate', 'blur:300', 'sharpen', 'pixelate:4'):
+            self.assertEqual(transformed(source, effect=effect).size, (64, 48))
+
+    def test_invalid_options(self):
+        for options in ({'width': 'wide'}, {'crop': 'stretch'}, {'effect': 'cartoon'}, {'effect': 'blur:x'},
+                        {'color': 'nocolor'}, {'width': 20000}, {'format': 'png'}):
+            with self.assertRaises(ValueError):
+                parse_options(options)
+        with self.assertRaises(ValueError):
+            transform_image(io.BytesIO(b'not an image'), {})
+
+    def test_key_is_canonical(self):
+        first = transform_key('abc', parse_options({'width': '200', 'crop': 'fill', 'angle': ''}))
+        self.assertEqual(first, transform_key('abc', parse_options({'crop': 'fill', 'width': 200})))
+        self.assertNotEqual(first, transform_key('abd', parse_options({'crop': 'fill', 'width': 200})))
+
+
+class TestImageEngine(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.source = Path(directory.name) / 'source'
+        self.source.write_bytes(make_jpeg())
+        self.engine = ImageEngine(workers=0, cache_dir=str(Path(directory.name) / 'variants'))
+
+    async def test_transform_renders_once(self):
+        path, key = await self.engine.transform(self.source, 'abc', TRANSFORMATION_PRESETS['thumb'])
+        self.assertEqual(path, self.engine.path(key))
+        self.assertEqual(Image.open(path).size, (200, 200))
+        with patch('PhotoShare.app.services.image_engine.render_file') as render:
+            self.assertEqual(await self.engine.transform(self.source, 'abc', {'width': 200, 'height': 200,
+                                                                              'crop': 'fill'}), (path, key))
+            render.assert_not_called()
+
+    async def test_process_pool(self):
+        engine = ImageEngine(workers=1, cache_dir=str(self.engine.root))
+        self.addCleanup(engine.shutdown)
+        path, _ = await engine.transform(self.source, 'abc', {'width': 100, 'effect': 'grayscale'})
+        self.assertEqual(Image.open(path).size, (100, 75))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import patch
+
+from jose import jwt, JWTError
+
+from PhotoShare.app.services.auth_service import create_access_token
+from PhotoShare.app.services.jwt_cache import VerifiedTokenCache
+
+SECRET = 'secret'
+ALGORITHMS = ['HS256']
+
+
+class TestVerifiedTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = VerifiedTokenCache(size=2)
+        with patch('PhotoShare.app.services.auth_service.SECRET_ACCESS_KEY', SECRET):
+            self.token = create_access_token({'email': 'user@example.com'}, expires_delta=600)
+
+    def test_second_decode_skips_verification(self):
+        payload = self.cache.decode(self.token, SECRET, ALGORITHMS)
+        with patch('PhotoShare.app.services.jwt_cache.jwt.decode') as mock_decode:
+            self.assertEqual(self.cache.decode(self.token, SECRET, ALGORITHMS), payload)
+            mock_decode.assert_not_called()
+
+    def test_tampered_payload_with_same_signature_is_verified(self):
+        self.cache.decode(self.token, SECRET, ALGORITHMS)
+        header, _, signature = self.token.split('.')
+        forged = jwt.encode({'email': 'admin@example.com'}, 'other', algorithm='HS256').split('.')[1]
+        with self.assertRaises(JWTError):
+            self.cache.decode(f'{header}.{forged}.{signature}', SECRET, ALGORITHMS)
+
+    def test_other_key_is_verified(self):
+        self.cache.decode(self.token, SECRET, ALGORITHMS)
+        with self.assertRaises(JWTError):
+            self.cache.decode(self.token, 'other', ALGORITHMS)
+
+    def test_expired_entry_is_verified_again(self):
+        self.cache.decode(self.token, SECRET, ALGORITHMS)
+        with patch('PhotoShare.app.services.jwt_cache.time.time', return_value=2 ** 40), \
+                patch('PhotoShare.app.services.jwt_cache.jwt.decode', side_effect=JWTError('expired')) as mock_decode:
+            with self.assertRaises(JWTError):
+                self.cache.decode(self.token, SECRET, ALGORITHMS)
+            mock_decode.assert_called_once()
+        self.assertEqual(len(self.cache._entries), 0)
+
+    def test_size_is_bounded(self):
+        for i in range(3):
+            token = jwt.encode({'email': f'{i}@example.com'}, SECRET, algorithm='HS256')
+            self.cache.decode(token, SECRET, ALGORITHMS)
+        self.assertEqual(len(self.cache._entries), 2)
+
+    def test_returned_payload_is_a_copy(self):
+        self.cache.decode(self.token, SECRET, ALGORITHMS)['email'] = 'changed'
+        self.assertEqual(self.cache.decode(self.token, SECRET, ALGORITHMS)['email'], 'user@example.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
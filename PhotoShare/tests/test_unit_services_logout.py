@@ -0,0 +1,77 @@
+import pickle
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from PhotoShare.app.services.auth_service import create_access_token
+from PhotoShare.app.services.revocation_filter import RevocationFilter
+from PhotoShare.app.services.logout import (
+    add_token_to_revoked,
+    is_token_revoked,
+    migrate_revoked_tokens,
+    get_key_from_token,
+    REVOKED_TOKEN_PREFIX,
+    REVOKED_TOKENS_CHANNEL,
+    LEGACY_TOKENS_KEY
+)
+
+
+class TestLogout(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = AsyncMock()
+        self.token = create_access_token({"email": "user@example.com"}, expires_delta=600)
+        self.key = get_key_from_token(self.token)
+        self.filter = RevocationFilter(prefix=REVOKED_TOKEN_PREFIX, capacity=1000, error_rate=0.001, rotation=900)
+        patcher = patch("PhotoShare.app.services.logout.revocation_filter", self.filter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_add_token_to_revoked_sets_key_with_ttl(self):
+        result = await add_token_to_revoked(self.token, cache=self.cache)
+        self.assertIn(self.key, result)
+        args, kwargs = self.cache.set.call_args
+        self.assertEqual(args[0], REVOKED_TOKEN_PREFIX + self.key)
+        self.assertTrue(590 <= kwargs["ex"] <= 601)
+        self.cache.publish.assert_awaited_once_with(REVOKED_TOKENS_CHANNEL, self.key)
+
+    async def test_add_expired_token_is_skipped(self):
+        token = create_access_token({"email": "user@example.com"}, expires_delta=-10)
+        await add_token_to_revoked(token, cache=self.cache)
+        self.cache.set.assert_not_awaited()
+
+    async def test_is_token_revoked(self):
+        self.cache.exists.return_value = 1
+        self.assertTrue(await is_token_revoked(self.token, cache=self.cache))
+        self.cache.exists.assert_awaited_once_with(REVOKED_TOKEN_PREFIX + self.key)
+        self.cache.exists.return_value = 0
+        self.assertFalse(await is_token_revoked(self.token, cache=self.cache))
+
+    async def test_is_token_revoked_skips_redis_when_filter_misses(self):
+        self.filter.ready = True
+        self.assertFalse(await is_token_revoked(self.token, cache=self.cache))
+        self.cache.exists.assert_not_awaited()
+        await add_token_to_revoked(self.token, cache=self.cache)
+        self.cache.exists.return_value = 1
+        self.assertTrue(await is_token_revoked(self.token, cache=self.cache))
+
+    async def test_migrate_revoked_tokens(self):
+        legacy = {"valid": datetime.utcnow() + timedelta(seconds=300),
+                  "expired": datetime.utcnow() - timedelta(seconds=300)}
+        transaction, batch = MagicMock(), MagicMock()
+        transaction.execute = AsyncMock(return_value=[pickle.dumps(legacy), 1])
+        batch.execute = AsyncMock()
+        self.cache.pipeline = MagicMock(side_effect=[transaction, batch])
+        self.assertEqual(await migrate_revoked_tokens(self.cache), 1)
+        transaction.delete.assert_called_once_with(LEGACY_TOKENS_KEY)
+        batch.set.assert_called_once()
+        self.assertEqual(batch.set.call_args.args[0], REVOKED_TOKEN_PREFIX + "valid")
+
+    async def test_migrate_without_legacy_blob(self):
+        self.cache.pipeline = MagicMock()
+        self.cache.pipeline.return_value.execute = AsyncMock(return_value=[None, 0])
+        self.assertEqual(await migrate_revoked_tokens(self.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
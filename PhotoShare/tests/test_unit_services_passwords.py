@@ -0,0 +1,37 @@
+import unittest
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from PhotoShare.app.services.passwords import PasswordPool
+
+
+class TestPasswordPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_hash_and_verify_in_process_pool(self):
+        pool = PasswordPool(workers=1, max_pending=4, retry_after=1)
+        self.addCleanup(pool.shutdown)
+        hashed = await pool.hash('secret')
+        self.assertEqual(await pool.verify('secret', hashed), (True, None))
+        self.assertEqual(await pool.verify('wrong', hashed), (False, None))
+        self.assertEqual(pool.pending, 0)
+
+    async def test_outdated_hash_is_rehashed(self):
+        pool = PasswordPool(workers=0, max_pending=4, retry_after=1)
+        old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash('secret')
+        verified, new_hash = await pool.verify('secret', old_hash)
+        self.assertTrue(verified)
+        self.assertIsNotNone(new_hash)
+        self.assertNotEqual(new_hash, old_hash)
+
+    async def test_full_queue_returns_503(self):
+        pool = PasswordPool(workers=0, max_pending=1, retry_after=3)
+        pool.pending = 1
+        with self.assertRaises(HTTPException) as err:
+            await pool.hash('secret')
+        self.assertEqual(err.exception.status_code, 503)
+        self.assertEqual(err.exception.headers, {'Retry-After': '3'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import io
+import tempfile
+import unittest
+import zipfile
+from unittest.mock import patch
+
+from PIL import Image
+
+from PhotoShare.app.services.qr_codes import QrCodeCache, qr_key, render_qrcode, zip_qrcodes
+
+URL = 'https://example.com/photo.jpg'
+
+
+class TestQrCodes(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = QrCodeCache(directory.name)
+        patcher = patch('PhotoShare.app.services.qr_codes.qr_codes', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_key_is_content_address(self):
+        self.assertEqual(qr_key(URL), qr_key(URL, 'png', None))
+        self.assertNotEqual(qr_key(URL, 'png', 256), qr_key(URL, 'png', 512))
+        self.assertEqual(qr_key(URL, 'svg', 256), qr_key(URL, 'svg'))
+
+    def test_render_variants(self):
+        self.assertEqual(Image.open(io.BytesIO(render_qrcode(URL, 'png', 256))).size, (256, 256))
+        self.assertIn(b'<svg', render_qrcode(URL, 'svg'))
+
+    async def test_ensure_renders_once(self):
+        path = await self.cache.ensure(URL, 'png', 128)
+        self.assertEqual(path, self.cache.path(qr_key(URL, 'png', 128), 'png'))
+        with patch('PhotoShare.app.services.qr_codes.render_qrcode') as render:
+            self.assertEqual(await self.cache.ensure(URL, 'png', 128), path)
+            render.assert_not_called()
+
+    async def test_prepare(self):
+        self.cache.prepare(URL)
+        for task in list(self.cache._tasks):
+            await task
+        self.assertTrue(self.cache.path(qr_key(URL), 'png').exists())
+
+    async def test_zip_stream(self):
+        chunks = [chunk async for chunk in zip_qrcodes({'1': URL, '2': URL + '?2'}, 'svg')]
+        self.assertGreater(len(chunks), 2)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertEqual(archive.namelist(), ['1.svg', '2.svg'])
+            self.assertEqual(archive.read('1.svg'), render_qrcode(URL, 'svg'))
@@ -0,0 +1,129 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from urllib.parse import urlencode
+
+import redis
+from starlette.requests import Request
+
+from PhotoShare.app.models.photo import Tag
+from PhotoShare.app.schemas.pagination import Page
+from PhotoShare.app.schemas.photo import TagResponse
+from PhotoShare.app.services.response_cache import ResponseCache, RESPONSE_INVALIDATED_CHANNEL
+
+
+def make_request(path='/tags/', query=None, headers=None, path_params=None) -> Request:
+    return Request({'type': 'http', 'method': 'GET', 'path': path, 'query_string': urlencode(query or {}).encode(),
+                    'headers': [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+                    'path_params': path_params or {}})
+
+
+PAGE = {'items': [Tag(id=1, name='sunset')], 'next_cursor': None}
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(ttl=60, local_ttl=5, local_size=10)
+        patcher = patch('PhotoShare.app.services.redis.RedisService.rds', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def store(self, request, namespace='tags'):
+        cached = await self.cache.lookup(namespace, request)
+        self.assertIsNone(cached.response)
+        return await cached.store(PAGE, Page[TagResponse])
+
+    async def test_hit_returns_stored_body(self):
+        response = await self.store(make_request(query={'limit': 5}))
+        self.assertEqual(response.body, b'{"items":[{"name":"sunset","id":1}],"next_cursor":null}')
+        cached = await self.cache.lookup('tags', make_request(query={'limit': 5}))
+        self.assertEqual(cached.response.body, response.body)
+        self.assertEqual(cached.response.headers['etag'], response.headers['etag'])
+
+    async def test_key_ignores_order_of_params(self):
+        await self.store(make_request(query={'limit': 5, 'cursor': 'abc'}))
+        self.assertIsNotNone((await self.cache.lookup('tags', make_request(query=[('cursor', 'abc'), ('limit', 5)])))
+                             .response)
+        self.assertIsNone((await self.cache.lookup('tags', make_request(query={'limit': 6}))).response)
+
+    async def test_if_none_match_returns_304(self):
+        etag = (await self.store(make_request())).headers['etag']
+        cached = await self.cache.lookup('tags', make_request(headers={'If-None-Match': f'W/"x", {etag}'}))
+        self.assertEqual(cached.response.status_code, 304)
+        self.assertEqual(cached.response.body, b'')
+
+    async def test_invalidate(self):
+        await self.store(make_request())
+        await self.store(make_request(path='/photos/'), namespace='photos')
+        await self.cache.invalidate('tags')
+        self.assertIsNone((await self.cache.lookup('tags', make_request())).response)
+        self.assertIsNotNone((await self.cache.lookup('photos', make_request(path='/photos/'))).response)
+
+    async def test_response_built_during_a_change_is_not_served(self):
+        cached = await self.cache.lookup('tags', make_request())
+        await self.cache.invalidate('tags')
+        await cached.store(PAGE, Page[TagResponse])
+        self.assertIsNone((await self.cache.lookup('tags', make_request())).response)
+
+    async def test_namespace_from_params(self):
+        dependency = self.cache.depends('comments:{photo_id}')
+        cached = await dependency(make_request(path='/comments/', query={'photo_id': 7}))
+        await cached.store(PAGE, Page[TagResponse])
+        await self.cache.invalidate('comments:8')
+        self.assertIsNotNone((await dependency(make_request(path='/comments/', query={'photo_id': 7}))).response)
+        await self.cache.invalidate('comments:7')
+        self.assertIsNone((await dependency(make_request(path='/comments/', query={'photo_id': 7}))).response)
+
+    async def test_disabled(self):
+        self.cache.enabled = False
+        await self.cache.lookup('tags', make_request())
+        response = await self.store(make_request())
+        self.assertIn('etag', response.headers)
+        self.assertIsNone((await self.cache.lookup('tags', make_request())).response)
+
+
+class TestResponseCacheRedis(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(ttl=60, local_ttl=5, local_size=10)
+        self.rds = MagicMock()
+        self.rds.get = AsyncMock(return_value=b'3')
+        self.rds.set = AsyncMock()
+        self.pipe = MagicMock()
+        self.pipe.execute = AsyncMock(side_effect=[[4], [1]])
+        self.rds.pipeline.return_value.__aenter__.return_value = self.pipe
+        patcher = patch('PhotoShare.app.services.redis.RedisService.rds', self.rds)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_entries_are_shared_through_redis(self):
+        cached = await self.cache.lookup('tags', make_request())
+        self.assertEqual(cached.key, 'tags:3:/tags/?')
+        await cached.store(PAGE, Page[TagResponse])
+        value = self.rds.set.call_args.args[1]
+        self.assertEqual(self.rds.set.call_args.kwargs, {'ex': 60})
+        self.cache.clear()
+        self.rds.get = AsyncMock(side_effect=[b'3', value])
+        cached = await self.cache.lookup('tags', make_request())
+        self.assertEqual(cached.response.body, b'{"items":[{"name":"sunset","id":1}],"next_cursor":null}')
+
+    async def test_invalidate_increments_and_publishes(self):
+        await self.cache.invalidate('tags')
+        self.pipe.incr.assert_called_once_with('response_cache:version:tags')
+        self.pipe.publish.assert_called_once_with(RESPONSE_INVALIDATED_CHANNEL, 'tags 4')
+        self.assertEqual(await self.cache.version('tags'), 4)
+
+    async def test_on_message_moves_version_forward(self):
+        self.assertEqual(await self.cache.version('users:user@example.com'), 3)
+        self.cache.on_message(b'users:user@example.com 5')
+        self.assertEqual(await self.cache.version('users:user@example.com'), 5)
+        self.cache.on_message(b'users:user@example.com 4')
+        self.assertEqual(await self.cache.version('users:user@example.com'), 5)
+
+    async def test_redis_down_bypasses_cache(self):
+        self.rds.get = AsyncMock(side_effect=redis.ConnectionError)
+        cached = await self.cache.lookup('tags', make_request())
+        self.assertIsNone(cached.key)
+        response = await cached.store(PAGE, Page[TagResponse])
+        self.assertEqual(response.status_code, 200)
+        self.rds.set.assert_not_called()
@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from PhotoShare.app.services.revocation_filter import BloomFilter, RevocationFilter
+
+
+async def scan(*keys):
+    for key in keys:
+        yield key
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        keys = [f"signature-{i}" for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"signature-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestRevocationFilter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.filter = RevocationFilter(prefix="revoked:", capacity=1000, error_rate=0.001, rotation=60)
+
+    def test_not_ready_falls_back_to_redis(self):
+        self.assertTrue(self.filter.might_contain("unknown"))
+
+    async def test_on_connect_warms_filter(self):
+        cache = MagicMock()
+        cache.scan_iter.return_value = scan(b"revoked:abc", b"revoked:def")
+        await self.filter.on_connect(cache)
+        self.assertTrue(self.filter.ready)
+        self.assertTrue(self.filter.might_contain("abc"))
+        self.assertTrue(self.filter.might_contain("def"))
+        self.assertFalse(self.filter.might_contain("unknown"))
+
+    async def test_on_message_and_disconnect(self):
+        await self.filter.on_connect(MagicMock(scan_iter=MagicMock(return_value=scan())))
+        self.filter.on_message(b"xyz")
+        self.assertTrue(self.filter.might_contain("xyz"))
+        self.filter.on_disconnect()
+        self.assertTrue(self.filter.might_contain("unknown"))
+
+    async def test_rotation_keeps_one_previous_generation(self):
+        await self.filter.on_connect(MagicMock(scan_iter=MagicMock(return_value=scan())))
+        with patch("PhotoShare.app.services.revocation_filter.time.monotonic") as monotonic:
+            monotonic.return_value = self.filter._rotated_at
+            self.filter.add("old")
+            monotonic.return_value += 61
+            self.assertTrue(self.filter.might_contain("old"))
+            monotonic.return_value += 61
+            self.assertFalse(self.filter.might_contain("old"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from PhotoShare.app.models.photo import Photo
+from PhotoShare.app.services.search import InMemorySearch
+
+
+class TestInMemorySearch(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.index = InMemorySearch()
+        self.index.index_photo(1, 'Sunset beach', 'warm evening', [])
+        self.index.index_photo(2, 'Forest', 'sunset over the trees', ['nature'])
+        self.index.index_photo(3, 'City', 'night', ['sunset'])
+
+    def test_tag_then_name_then_description(self):
+        self.assertEqual(self.index.rank('sunset'), [3, 1, 2])
+
+    def test_every_word_matches_as_prefix(self):
+        self.assertEqual(self.index.rank('sun bea'), [1])
+        self.assertEqual(self.index.rank('sun night'), [3])
+
+    def test_fuzzy_match(self):
+        self.assertEqual(self.index.rank('forset'), [2])
+        self.assertEqual(self.index.rank('sunste'), [3, 1, 2])
+        self.assertEqual(self.index.rank('cty'), [])
+
+    def test_update_and_remove_photo(self):
+        self.index.index_photo(1, 'Mountains', None, [])
+        self.assertEqual(self.index.rank('beach'), [])
+        self.assertEqual(self.index.rank('mount'), [1])
+        self.index.remove_photo(1)
+        self.assertEqual(self.index.rank('mount'), [])
+        self.assertNotIn('mountains', self.index.vocabulary)
+        self.assertNotIn('ountains', self.index.deletions)
+
+    def test_rename_and_remove_tag(self):
+        self.index.rename_tag('nature', 'wildlife')
+        self.assertEqual(self.index.rank('wildlife'), [2])
+        self.assertEqual(self.index.rank('nature'), [])
+        self.index.remove_tag('wildlife')
+        self.assertEqual(self.index.rank('wildlife'), [])
+        self.assertEqual(self.index.rank('forest'), [2])
+
+    async def test_search_loads_page_in_rank_order(self):
+        session = AsyncMock(spec=AsyncSession)
+        result = MagicMock()
+        result.scalars.return_value = [Photo(id=1), Photo(id=2)]
+        session.execute.return_value = result
+        photos = await self.index.search('sunset', limit=2, offset=1, db=session)
+        self.assertEqual([photo.id for photo in photos], [1, 2])
+        session.execute.reset_mock()
+        self.assertEqual(await self.index.search('nothing', limit=2, offset=0, db=session), [])
+        session.execute.assert_not_called()
@@ -0,0 +1,127 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from main import app
+from PhotoShare.app.services.image_engine import ImageEngine
+from PhotoShare.app.services.storage import LocalStorage, TRANSFORMATION_PRESETS, ZeroCopyFileResponse
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+
+
+class TestLocalStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(root=self.tmp.name, base_url='/storage')
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.upload(io.BytesIO(PNG), 'Y/first')
+        second = self.storage.upload(io.BytesIO(PNG), 'Y/second')
+        self.assertEqual(first['etag'], second['etag'])
+        self.assertEqual(len(list(self.storage.objects.glob('*/*'))), 1)
+        path, digest = self.storage.resolve('Y/second')
+        self.assertEqual(path.read_bytes(), PNG)
+        self.assertEqual(self.storage.get_url('Y/first', first['version']), f'/storage/Y/first?v={digest[:12]}')
+
+    def test_delete_keeps_shared_object(self):
+        self.storage.upload(io.BytesIO(PNG), 'Y/first')
+        self.storage.upload(io.BytesIO(PNG), 'Y/second')
+        self.storage.delete('Y/first')
+        self.assertIsNone(self.storage.resolve('Y/first'))
+        self.assertIsNotNone(self.storage.resolve('Y/second'))
+
+    def test_variant_urls(self):
+        variants = self.storage.variant_urls('Y/photo')
+        self.assertEqual(variants.keys(), TRANSFORMATION_PRESETS.keys())
+        self.assertEqual(variants['thumb'], '/storage/Y/photo?width=200&height=200&crop=fill')
+
+    def test_public_id_cannot_escape_root(self):
+        with self.assertRaises(ValueError):
+            self.storage.upload(io.BytesIO(PNG), '../../etc/passwd')
+        self.assertIsNone(self.storage.resolve('../../etc/passwd'))
+
+
+class TestStorageEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(root=self.tmp.name, base_url='/storage')
+        for name, value in (('storage', self.storage),
+                            ('image_engine', ImageEngine(workers=0, cache_dir=f'{self.tmp.name}/variants'))):
+            patcher = patch(f'PhotoShare.app.api.endpoints.storage.{name}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+
+    def test_read_file(self):
+        version = self.storage.upload(io.BytesIO(PNG), 'Y/photo')['version']
+        response = self.client.get(f'/storage/Y/photo?v={version}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, PNG)
+        self.assertEqual(response.headers['content-type'], 'image/png')
+        self.assertIn('immutable', response.headers['cache-control'])
+        response = self.client.get('/storage/Y/photo', headers={'If-None-Match': response.headers['etag']})
+        self.assertEqual(response.status_code, 304)
+
+    def test_read_variant(self):
+        image = io.BytesIO()
+        Image.new('RGB', (640, 480), 'red').save(image, format='JPEG')
+        image.seek(0)
+        self.storage.upload(image, 'Y/photo')
+        response = self.client.get(self.storage.variant_urls('Y/photo')['thumb'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-type'], 'image/jpeg')
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, (200, 200))
+        response = self.client.get(self.storage.variant_urls('Y/photo')['thumb'],
+                                   headers={'If-None-Match': response.headers['etag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get('/storage/Y/photo?crop=stretch').status_code, 400)
+
+    def test_missing_file(self):
+        self.assertEqual(self.client.get('/storage/Y/missing').status_code, 404)
+
+
+class TestZeroCopyFileResponse(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        tmp = tempfile.NamedTemporaryFile(delete=False)
+        tmp.write(b'x' * 2_500_000)
+        tmp.close()
+        self.path = tmp.name
+        self.addCleanup(os.unlink, self.path)
+
+    async def respond(self, extensions: dict) -> list[dict]:
+        messages = []
+
+        async def send(message):
+            if message['type'] == 'http.response.zerocopysend':
+                message = dict(message, body=message['file'].read())
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'headers': [], 'extensions': extensions}
+        await ZeroCopyFileResponse(self.path, media_type='image/png')(scope, None, send)
+        return messages
+
+    async def test_zerocopysend_gets_the_file(self):
+        messages = await self.respond({'http.response.zerocopysend': {}})
+        self.assertEqual([message['type'] for message in messages],
+                         ['http.response.start', 'http.response.zerocopysend'])
+        self.assertEqual(len(messages[1]['body']), 2_500_000)
+        self.assertTrue(messages[1]['file'].closed)
+
+    async def test_chunks_without_extension(self):
+        messages = await self.respond({})
+        self.assertEqual([len(message['body']) for message in messages[1:]], [1024 * 1024, 1024 * 1024, 402_848])
+        self.assertFalse(messages[-1]['more_body'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import hashlib
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from PhotoShare.app.services.upload_stream import read_form, stream_form, StagedFile
+
+BOUNDARY = 'photoshareboundary'
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 300_000
+
+
+def encode_form(fields: dict, files: list[tuple[str, str, bytes]]) -> bytes:
+    body = b''
+    for name, value in fields.items():
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n').encode()
+    for name, filename, content in files:
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n').encode() + content + b'\r\n'
+    return body + f'--{BOUNDARY}--\r\n'.encode()
+
+
+class StreamedRequest:
+    """
+    Request whose body is sent in chunks of 64 KB, counting how many of them were read.
+    """
+
+    def __init__(self, body: bytes, content_type=f'multipart/form-data; boundary={BOUNDARY}', length=True):
+        self.chunks = [body[i:i + 65536] for i in range(0, len(body), 65536)]
+        self.received = 0
+        headers = [(b'content-type', content_type.encode())]
+        if length:
+            headers.append((b'content-length', str(len(body)).encode()))
+        self.request = Request({'type': 'http', 'method': 'POST', 'path': '/photos/', 'headers': headers},
+                               self.receive)
+
+    async def receive(self):
+        self.received += 1
+        chunk = self.chunks.pop(0)
+        return {'type': 'http.request', 'body': chunk, 'more_body': bool(self.chunks)}
+
+
+class TestUploadStream(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.staging = Path(tmp.name)
+
+    def staged_files(self) -> list[Path]:
+        return list(self.staging.iterdir())
+
+    async def read(self, request: StreamedRequest, max_file_size=1024 * 1024, max_files=1):
+        return await read_form(request.request, self.staging, max_file_size, max_files)
+
+    async def assert_rejected(self, request: StreamedRequest, status_code: int, **kwargs):
+        with self.assertRaises(HTTPException) as err:
+            await self.read(request, **kwargs)
+        self.assertEqual(err.exception.status_code, status_code)
+        self.assertEqual(self.staged_files(), [])
+
+    async def test_fields_and_file_are_staged(self):
+        fields, files = await self.read(StreamedRequest(encode_form({'name': 'Sunset', 'description': 'Sea'},
+                                                                    [('file', 'sunset.png', PNG)])))
+        self.assertEqual(fields, {'name': 'Sunset', 'description': 'Sea'})
+        self.assertEqual(len(files), 1)
+        self.assertEqual(files[0].path.read_bytes(), PNG)
+        self.assertEqual(files[0].content_hash, hashlib.sha256(PNG).hexdigest())
+        self.assertEqual((files[0].filename, files[0].size, files[0].media_type), ('sunset.png', len(PNG), 'image/png'))
+
+    async def test_files_are_yielded_as_they_arrive(self):
+        request = StreamedRequest(encode_form({}, [('file', 'a.png', PNG), ('file', 'b.png', PNG + b'b')]))
+        total = len(request.chunks)
+        stream = stream_form(request.request, self.staging, 1024 * 1024, max_files=2)
+        first = await anext(stream)
+        self.assertIsInstance(first, StagedFile)
+        self.assertLess(request.received, total)
+        self.assertEqual([part.filename async for part in stream], ['b.png'])
+
+    async def test_staged_files_are_created_in_threadpool(self):
+        threads = []
+        create = tempfile.NamedTemporaryFile
+
+        def named_temporary_file(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return create(*args, **kwargs)
+
+        with patch('PhotoShare.app.services.upload_stream.tempfile.NamedTemporaryFile', named_temporary_file):
+            request = StreamedRequest(encode_form({}, [('file', 'a.png', PNG), ('file', 'b.png', PNG)]))
+            _, files = await self.read(request, max_files=2)
+            for file in files:
+                file.discard()
+            await self.assert_rejected(StreamedRequest(encode_form({}, [('file', 'notes.txt', b'plain text')])), 415)
+        self.assertEqual(len(files), 2)
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    async def test_not_an_image_is_rejected_after_first_chunk(self):
+        request = StreamedRequest(encode_form({}, [('file', 'notes.txt', b'plain text' * 100_000)]))
+        await self.assert_rejected(request, 415)
+        self.assertEqual(request.received, 1)
+
+    async def test_oversized_file_is_rejected_mid_stream(self):
+        request = StreamedRequest(encode_form({}, [('file', 'big.png', PNG * 10)]), length=False)
+        total = len(request.chunks)
+        await self.assert_rejected(request, 413)
+        # the limit is 1 MB, read in chunks of 64 KB
+        self.assertEqual(request.received, 17)
+        self.assertGreater(total, 40)
+
+    async def test_oversized_body_is_rejected_before_reading(self):
+        request = StreamedRequest(encode_form({}, [('file', 'big.png', PNG * 10)]))
+        await self.assert_rejected(request, 413)
+        self.assertEqual(request.received, 0)
+
+    async def test_too_many_files(self):
+        request = StreamedRequest(encode_form({}, [('file', 'a.png', PNG), ('file', 'b.png', PNG)]))
+        await self.assert_rejected(request, 400)
+
+    async def test_not_multipart(self):
+        await self.assert_rejected(StreamedRequest(b'{}', content_type='application/json'), 415)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi import HTTPException
+
+from PhotoShare.app.services.upload_stream import StagedFile
+from PhotoShare.app.services.uploads import UploadJob, UploadWorker, BulkUpload
+
+
+class TestUploadWorker(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.worker = UploadWorker(staging_dir=self.tmp.name, workers=1, queue_size=2)
+
+    async def test_enqueue_queues_job(self):
+        staged = Path(self.tmp.name) / 'upload.part'
+        staged.write_bytes(b'image')
+        digest = hashlib.sha256(b'image').hexdigest()
+        job = self.worker.enqueue(staged, photo_id=7, user_id=3, public_id='Y/' + digest)
+        self.assertFalse(staged.exists())
+        self.assertEqual(job.path.read_bytes(), b'image')
+        self.assertEqual(job.content_hash, digest)
+        self.assertEqual(self.worker.queue.get_nowait(), job)
+        self.assertEqual(UploadJob.from_staged(job.path), job)
+
+    async def test_full_queue_returns_503(self):
+        for photo_id in range(2):
+            self.worker.queue.put_nowait(UploadJob(photo_id, 1, 'Y/abc', Path()))
+        with self.assertRaises(HTTPException) as err:
+            self.worker.check_capacity()
+        self.assertEqual(err.exception.status_code, 503)
+
+    async def test_start_requeues_staged_files(self):
+        job = UploadJob.staged(Path(self.tmp.name), 5, 2, 'Y/abc')
+        job.path.write_bytes(b'image')
+        partial = job.path.with_name(job.path.name + '.part')
+        partial.write_bytes(b'partial')
+        with patch.object(UploadWorker, '_run', AsyncMock()):
+            await self.worker.start()
+            await self.worker.stop()
+        self.assertEqual(self.worker.queue.qsize(), 1)
+        self.assertFalse(partial.exists())
+        self.assertEqual(self.worker.queue.get_nowait(), job)
+
+    async def test_start_skips_stray_files(self):
+        job = UploadJob.staged(Path(self.tmp.name), 5, 2, 'Y/abc')
+        job.path.write_bytes(b'image')
+        for name in ('.DS_Store', 'notes.txt', 'a.b.c'):
+            (Path(self.tmp.name) / name).write_bytes(b'stray')
+        (Path(self.tmp.name) / '6.2.Y~abc').mkdir()
+        with patch.object(UploadWorker, '_run', AsyncMock()), self.assertLogs('PhotoShare.app.services.uploads',
+                                                                                'WARNING') as logs:
+            await self.worker.start()
+            await self.worker.stop()
+        self.assertEqual(len(logs.output), 4)
+        self.assertEqual(self.worker.queue.qsize(), 1)
+        self.assertEqual(self.worker.queue.get_nowait(), job)
+        self.assertTrue((Path(self.tmp.name) / '.DS_Store').exists())
+
+    def patch_process(self, existing_url=None):
+        patches = {
+            'storage': patch('PhotoShare.app.services.uploads.storage'),
+            'session': patch('PhotoShare.app.services.uploads.SessionLocal', MagicMock()),
+            'existing': patch('PhotoShare.app.services.uploads.photo_repository.get_photo_url_by_hash',
+                              AsyncMock(return_value=existing_url)),
+            'finalize': patch('PhotoShare.app.services.uploads.photo_repository.finalize_photo',
+                              AsyncMock(return_value='user@example.com')),
+            'invalidate': patch('PhotoShare.app.services.uploads.user_cache.invalidate', AsyncMock()),
+        }
+        mocks = {name: patcher.start() for name, patcher in patches.items()}
+        for patcher in patches.values():
+            self.addCleanup(patcher.stop)
+        return mocks
+
+    async def test_process_finalizes_photo(self):
+        job = UploadJob.staged(Path(self.tmp.name), 5, 2, 'Y/abc')
+        job.path.write_bytes(b'image')
+        mocks = self.patch_process()
+        mocks['storage'].upload.return_value = {'version': 1}
+        mocks['storage'].get_url.return_value = 'http://photo'
+        mocks['storage'].variant_urls.return_value = {'thumb': 'http://thumb'}
+        await self.worker.process(job)
+        mocks['storage'].upload.assert_called_once_with(file=str(job.path), public_id='Y/abc')
+        self.assertEqual(mocks['finalize'].await_args.args[:3], (5, 2, 'http://photo'))
+        self.assertEqual(mocks['finalize'].await_args.kwargs, {'variants': {'thumb': 'http://thumb'}})
+        mocks['invalidate'].assert_awaited_once_with('user@example.com')
+        self.assertFalse(job.path.exists())
+
+    async def test_process_reuses_stored_content(self):
+        job = UploadJob.staged(Path(self.tmp.name), 5, 2, 'Y/abc')
+        job.path.write_bytes(b'image')
+        mocks = self.patch_process(existing_url='http://existing')
+        await self.worker.process(job)
+        mocks['existing'].assert_awaited_once()
+        self.assertEqual(mocks['existing'].await_args.args[0], 'abc')
+        mocks['storage'].upload.assert_not_called()
+        self.assertEqual(mocks['finalize'].await_args.args[:3], (5, 2, 'http://existing'))
+        self.assertFalse(job.path.exists())
+
+
+class TestBulkUpload(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.running = self.most_running = 0
+        patches = {
+            'push': patch('PhotoShare.app.services.uploads.push_file', self.push),
+            'create': patch('PhotoShare.app.services.uploads.photo_repository.create_pending_photos',
+                            AsyncMock(side_effect=lambda photos, user_id, db: list(range(10, 10 + len(photos))))),
+            'finalize': patch('PhotoShare.app.services.uploads.photo_repository.finalize_photos',
+                              AsyncMock(return_value='user@example.com')),
+            'session': patch('PhotoShare.app.services.uploads.SessionLocal', MagicMock()),
+            'invalidate': patch('PhotoShare.app.services.uploads.user_cache.invalidate', AsyncMock()),
+        }
+        self.mocks = {name: patcher.start() for name, patcher in patches.items()}
+        for patcher in patches.values():
+            self.addCleanup(patcher.stop)
+
+    async def push(self, path, public_id, content_hash):
+        self.running += 1
+        self.most_running = max(self.most_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        if content_hash == 'bad':
+            raise RuntimeError('storage is down')
+        return f'http://{content_hash}', {'thumb': f'http://{content_hash}/thumb'}
+
+    def staged(self, filename, content_hash) -> StagedFile:
+        path = Path(self.tmp.name) / f'{content_hash}.{len(list(Path(self.tmp.name).iterdir()))}.part'
+        path.write_bytes(b'image')
+        return StagedFile('files', filename, path, content_hash, 5, 'image/png')
+
+    def bulk_upload(self, concurrency=2) -> BulkUpload:
+        return BulkUpload(user_id=3, concurrency=concurrency, staging_dir=Path(self.tmp.name))
+
+    async def test_bulk_upload(self):
+        upload = self.bulk_upload()
+        upload.description = 'Holiday'
+        for i in range(5):
+            upload.add(self.staged(f'photo{i}.png', f'hash{i}'))
+        upload.add(self.staged('copy.png', 'hash0'))
+        upload.add(self.staged('broken.png', 'bad'))
+        await upload.create_rows(None)
+        lines = [json.loads(line) async for line in upload.results()]
+
+        self.assertEqual(self.most_running, 2)
+        self.assertEqual(len(upload.pushes), 6)
+        self.assertEqual(lines[-1], {'uploaded': 6, 'failed': 1, 'rejected': 0})
+        by_name = {line['filename']: line for line in lines[:-1]}
+        self.assertEqual(by_name['copy.png'], {'index': 5, 'filename': 'copy.png', 'id': 15, 'status': 'uploaded',
+                                               'photo_url': 'http://hash0'})
+        self.assertEqual(by_name['broken.png']['status'], 'failed')
+        photos = self.mocks['create'].await_args.args[0]
+        self.assertEqual([(body.name, body.description) for body, _ in photos][:2],
+                         [('photo0', 'Holiday'), ('photo1', 'Holiday')])
+        user_id, uploaded, failed, _ = self.mocks['finalize'].await_args.args
+        self.assertEqual((user_id, len(uploaded), failed), (3, 6, [16]))
+        self.assertEqual(uploaded[0], (10, 'http://hash0', {'thumb': 'http://hash0/thumb'}))
+        self.mocks['invalidate'].assert_awaited_once_with('user@example.com')
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+    async def test_short_filenames_are_named(self):
+        upload = self.bulk_upload()
+        for filename in ('1.jpg', 'ab.png', 'Lake.jpeg', '', None):
+            upload.add(self.staged(filename, f'hash{len(upload.files)}'))
+        upload.description = 'ab'
+        upload.add(self.staged('photo.png', 'hash9'))
+        self.assertEqual([body.name for _, _, body in upload.files], ['1.jpg', 'ab.png', 'Lake', 'Photo 4', 'Photo 5'])
+        self.assertEqual(upload.rejected, [{'index': 5, 'filename': 'photo.png', 'status': 'rejected',
+                                            'error': 'String should have at least 3 characters'}])
+        upload.abort()
+
+    async def test_abort_discards_files(self):
+        upload = self.bulk_upload(concurrency=1)
+        upload.add(self.staged('photo0.png', 'hash0'))
+        upload.add(self.staged('photo1.png', 'hash1'))
+        upload.abort()
+        await asyncio.gather(*upload.pushes.values(), return_exceptions=True)
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+        self.mocks['create'].assert_not_awaited()
+
+    async def test_interrupted_finish_is_recovered(self):
+        async def never_commits(*args):
+            await asyncio.Event().wait()
+
+        self.mocks['finalize'].side_effect = never_commits
+        upload = self.bulk_upload()
+        for i in range(3):
+            upload.add(self.staged(f'photo{i}.png', f'hash{i}'))
+        upload.add(self.staged('copy.png', 'hash0'))
+        await upload.create_rows(None)
+        await asyncio.gather(*upload.pushes.values())
+        await asyncio.sleep(0)
+        # the process stops before the photos are finalised
+        upload.finished.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await upload.finished
+        jobs = [UploadJob.from_staged(path) for path in Path(self.tmp.name).iterdir() if path.suffix != '.part']
+        self.assertEqual(sorted((job.photo_id, job.public_id) for job in jobs),
+                         [(10, 'Y/hash0'), (11, 'Y/hash1'), (12, 'Y/hash2'), (13, 'Y/hash0')])
+
+        worker = UploadWorker(staging_dir=self.tmp.name, workers=1, queue_size=10)
+        with patch('PhotoShare.app.services.uploads.photo_repository.finalize_photo',
+                   AsyncMock(return_value='user@example.com')) as finalize_photo:
+            await worker.start()
+            await worker.queue.join()
+            await worker.stop()
+        self.assertEqual(sorted(call.args[0] for call in finalize_photo.await_args_list), [10, 11, 12, 13])
+        self.assertEqual(list(Path(self.tmp.name).iterdir()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
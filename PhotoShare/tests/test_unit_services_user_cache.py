@@ -0,0 +1,89 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from PhotoShare.app.models.user import User
+from PhotoShare.app.services.auth_service import create_access_token, get_current_user
+from PhotoShare.app.services.user_cache import UserCache, USER_INVALIDATED_CHANNEL
+
+
+class TestUserCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = UserCache(ttl=30, size=2)
+        self.user = User(id=1, email='user@example.com', username='user', password='hash', role='admin',
+                         banned=False, confirmed=True)
+
+    def test_get_returns_detached_copy(self):
+        self.cache.set(self.user, self.cache.version())
+        session = MagicMock()
+        user = self.cache.get('user@example.com', session=session)
+        self.assertIsNot(user, self.user)
+        self.assertEqual(user.id, 1)
+        self.assertEqual(user.role, 'admin')
+        session.add.assert_called_once_with(user)
+
+    def test_expired_entry(self):
+        self.cache.ttl = -1
+        self.cache.set(self.user, self.cache.version())
+        self.assertIsNone(self.cache.get('user@example.com'))
+
+    def test_size_is_bounded(self):
+        for i in range(3):
+            self.cache.set(User(id=i, email=f'{i}@example.com'), self.cache.version())
+        self.assertIsNone(self.cache.get('0@example.com'))
+        self.assertIsNotNone(self.cache.get('2@example.com'))
+
+    def test_stale_load_is_not_cached(self):
+        version = self.cache.version()
+        self.cache.discard('user@example.com')
+        self.cache.set(self.user, version)
+        self.assertIsNone(self.cache.get('user@example.com'))
+
+    def test_disabled(self):
+        self.cache.enabled = False
+        self.cache.set(self.user, self.cache.version())
+        self.assertIsNone(self.cache.get('user@example.com'))
+
+    async def test_invalidate_publishes(self):
+        self.cache.set(self.user, self.cache.version())
+        rds = AsyncMock()
+        with patch('PhotoShare.app.services.redis.RedisService.rds', rds):
+            await self.cache.invalidate('user@example.com')
+        self.assertIsNone(self.cache.get('user@example.com'))
+        rds.publish.assert_awaited_once_with(USER_INVALIDATED_CHANNEL, 'user@example.com')
+
+    def test_on_message(self):
+        self.cache.set(self.user, self.cache.version())
+        self.cache.on_message(b'user@example.com')
+        self.assertIsNone(self.cache.get('user@example.com'))
+
+
+class TestGetCurrentUser(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.cache = UserCache(ttl=30, size=10)
+        patcher = patch('PhotoShare.app.services.auth_service.user_cache', self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('PhotoShare.app.services.auth_service.is_token_revoked', AsyncMock(return_value=False))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.token = HTTPAuthorizationCredentials(scheme='Bearer',
+                                                  credentials=create_access_token({'email': 'user@example.com'}))
+        self.session = AsyncMock(spec=AsyncSession)
+        result = MagicMock()
+        result.scalars.return_value.first.return_value = User(id=1, email='user@example.com', role='user')
+        self.session.execute.return_value = result
+
+    async def test_second_call_does_not_query_db(self):
+        first = await get_current_user(self.token, self.session, AsyncMock())
+        second = await get_current_user(self.token, self.session, AsyncMock())
+        self.assertEqual(self.session.execute.await_count, 1)
+        self.assertEqual(second.id, first.id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+Per-request CPU cost of authentication (``get_current_user``) with and without the verified-JWT cache.
+
+Database, Redis and the user cache are replaced by stubs so that only token handling is measured.
+
+    python -m benchmarks.bench_auth --calls 20000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi.security import HTTPAuthorizationCredentials
+
+from PhotoShare.app.models.user import User
+from PhotoShare.app.services.auth_service import create_access_token, get_current_user
+from PhotoShare.app.services.jwt_cache import verified_tokens
+from PhotoShare.app.services.logout import revocation_filter
+from PhotoShare.app.services.user_cache import user_cache
+
+EMAIL = "bench@example.com"
+
+
+class StubSession:
+    def __init__(self):
+        self.user = User(id=1, email=EMAIL, role="user", password="x")
+
+    async def execute(self, statement):
+        return self
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.user
+
+    def add(self, instance):
+        pass
+
+
+class StubRedis:
+    async def exists(self, *keys):
+        return 0
+
+
+async def measure(calls: int) -> float:
+    token = HTTPAuthorizationCredentials(scheme="Bearer", credentials=create_access_token({"email": EMAIL}))
+    session, cache = StubSession(), StubRedis()
+    for _ in range(min(1000, calls)):
+        await get_current_user(token, session, cache)
+    start = time.perf_counter()
+    for _ in range(calls):
+        await get_current_user(token, session, cache)
+    return (time.perf_counter() - start) / calls * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    revocation_filter.enabled = False
+    user_cache.enabled = False
+    verified_tokens.enabled = False
+    without_cache = asyncio.run(measure(args.calls))
+    verified_tokens.enabled = True
+    with_cache = asyncio.run(measure(args.calls))
+
+    print(f"{'':<20}{'us/request':>12}")
+    print(f"{'without JWT cache':<20}{without_cache:>12.2f}")
+    print(f"{'with JWT cache':<20}{with_cache:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
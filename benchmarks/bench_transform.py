@@ -0,0 +1,82 @@
+"""
+Throughput of the local image engine: the TRANSFORMATION_PRESETS applied to camera-sized JPEG photos.
+
+Photos of the given size are generated (a gradient with noise, which compresses like a photo) into a temporary
+directory. Each preset is first timed in this process, with and without draft-mode JPEG decoding, then all
+presets of all photos are rendered through the process pool of an ImageEngine with an empty cache, which is
+what the /storage router does on first requests. Throughput is reported in images/sec and images/sec per core.
+
+    python -m benchmarks.bench_transform --photos 20 --size 4000x3000 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image, JpegImagePlugin
+
+from PhotoShare.app.services.image_engine import ImageEngine, parse_options, transform_image
+from PhotoShare.app.services.storage import TRANSFORMATION_PRESETS
+
+
+def make_photos(directory: Path, count: int, size: tuple[int, int]) -> list[Path]:
+    paths = []
+    for i in range(count):
+        noise = Image.effect_noise(size, 40 + i).convert('RGB')
+        gradient = Image.linear_gradient('L').resize(size).convert('RGB')
+        path = directory / f'photo{i}.jpg'
+        Image.blend(noise, gradient, 0.6).save(path, format='JPEG', quality=90)
+        paths.append(path)
+    return paths
+
+
+def single_core(photos: list[Path], options: dict, draft: bool) -> float:
+    options = parse_options(options)
+    start = time.perf_counter()
+    if draft:
+        for path in photos:
+            transform_image(path, options)
+    else:
+        with patch.object(JpegImagePlugin.JpegImageFile, 'draft', lambda self, mode, size: None):
+            for path in photos:
+                transform_image(path, options)
+    return len(photos) / (time.perf_counter() - start)
+
+
+async def pool(photos: list[Path], workers: int, cache_dir: str) -> float:
+    engine = ImageEngine(workers=workers, cache_dir=cache_dir)
+    try:
+        # the pool is started before the clock
+        await engine.transform(photos[0], 'warmup', {'width': 10})
+        start = time.perf_counter()
+        await asyncio.gather(*(engine.transform(path, path.name, options)
+                               for path in photos for options in TRANSFORMATION_PRESETS.values()))
+        return len(photos) * len(TRANSFORMATION_PRESETS) / (time.perf_counter() - start)
+    finally:
+        engine.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=20)
+    parser.add_argument("--size", default="4000x3000", help="width x height of the generated photos")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes of the engine pool")
+    args = parser.parse_args()
+    size = tuple(int(side) for side in args.size.split("x"))
+
+    with tempfile.TemporaryDirectory() as directory:
+        photos = make_photos(Path(directory), args.photos, size)
+        print(f"{args.photos} photos {size[0]}x{size[1]}, {os.path.getsize(photos[0]) // 1024} KB each")
+        print(f"{'1 core, images/sec':<24}{'draft':>10}{'full decode':>14}{'speedup':>10}")
+        for name, options in TRANSFORMATION_PRESETS.items():
+            draft, full = single_core(photos, options, True), single_core(photos, options, False)
+            print(f"{name:<24}{draft:>10.1f}{full:>14.1f}{draft / full:>9.1f}x")
+        throughput = asyncio.run(pool(photos, args.workers, str(Path(directory) / "variants")))
+        print(f"pool of {args.workers}: {throughput:.1f} images/sec, {throughput / args.workers:.1f} per core")
+
+
+if __name__ == "__main__":
+    main()
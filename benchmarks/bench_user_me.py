@@ -0,0 +1,109 @@
+"""
+Latency of ``GET /user/me`` with and without the local revocation filter.
+
+The database is replaced by an in-memory stub so that only the auth path is measured. Redis is either a real
+server (``--redis-url``) or a stub that sleeps ``--redis-latency`` milliseconds per command to model the network
+round trip the filter is meant to save.
+
+    python -m benchmarks.bench_user_me --requests 2000 --redis-latency 0.3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import redis.asyncio
+from fastapi.testclient import TestClient
+
+from main import app
+from PhotoShare.app.core.database import get_db
+from PhotoShare.app.models.user import User
+from PhotoShare.app.services.auth_service import create_access_token
+from PhotoShare.app.services.logout import revocation_filter
+from PhotoShare.app.services.redis import RedisService
+
+EMAIL = "bench@example.com"
+
+
+class StubSession:
+    def __init__(self):
+        self.user = User(id=1, email=EMAIL, username="bench", first_name=None, last_name=None,
+                         uploaded_photos=0, avatar="avatar", role="user", password="x")
+
+    async def execute(self, statement):
+        return self
+
+    def scalars(self):
+        return self
+
+    def first(self):
+        return self.user
+
+    def add(self, instance):
+        pass
+
+
+class StubRedis:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def exists(self, *keys):
+        await asyncio.sleep(self.latency)
+        return 0
+
+    async def scan_iter(self, match=None, count=None):
+        for key in ():
+            yield key
+
+
+def measure(client: TestClient, token: str, requests: int) -> tuple[float, float]:
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(min(100, requests)):
+        client.get("/user/me", headers=headers)
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get("/user/me", headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+    percentiles = statistics.quantiles(timings, n=100)
+    return percentiles[49], percentiles[98]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--redis-url", default=None)
+    parser.add_argument("--redis-latency", type=float, default=0.3, help="stub Redis round trip, ms")
+    args = parser.parse_args()
+
+    cache = redis.asyncio.Redis.from_url(args.redis_url) if args.redis_url else StubRedis(args.redis_latency / 1000)
+    session = StubSession()
+
+    async def override_get_db():
+        yield session
+
+    async def override_get_redis():
+        return cache
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[RedisService.get_redis] = override_get_redis
+    # dependencies are wired above, the real Redis/startup hooks are not needed
+    app.router.on_startup.clear()
+    app.router.on_shutdown.clear()
+    token = create_access_token({"email": EMAIL})
+
+    with TestClient(app) as client:
+        revocation_filter.enabled = False
+        without_filter = measure(client, token, args.requests)
+        revocation_filter.enabled = True
+        client.portal.call(revocation_filter.on_connect, cache)
+        with_filter = measure(client, token, args.requests)
+
+    print(f"{'':<16}{'p50, ms':>10}{'p99, ms':>10}")
+    print(f"{'without filter':<16}{without_filter[0]:>10.3f}{without_filter[1]:>10.3f}")
+    print(f"{'with filter':<16}{with_filter[0]:>10.3f}{with_filter[1]:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,17 @@ from PhotoShare.app.api.endpoints.tags import router_tags
 
 from PhotoShare.app.api.endpoints.rating import router_rating
 from PhotoShare.app.api.endpoints.photos import router as router_photos
+from PhotoShare.app.api.endpoints.metrics import router_metrics
+from PhotoShare.app.api.endpoints.storage import router_storage
 
+from PhotoShare.app.services.passwords import password_pool
+from PhotoShare.app.services.image_engine import image_engine
 from PhotoShare.app.services.redis import RedisService
+from PhotoShare.app.services.uploads import upload_worker
+from PhotoShare.app.services.search import search_backend
+from PhotoShare.app.services.logout import migrate_revoked_tokens, revocation_filter, REVOKED_TOKENS_CHANNEL
+from PhotoShare.app.services.user_cache import user_cache, USER_INVALIDATED_CHANNEL
+from PhotoShare.app.services.response_cache import response_cache, RESPONSE_INVALIDATED_CHANNEL
 from PhotoShare.app.models.base import Base
 
 
@@ -17,9 +26,11 @@ app = FastAPI(swagger_ui_parameters={"operationsSorter": "method"})
 
 
 @app.on_event("startup")
-def startup():
+async def startup():
     """
-    The startup ініціалізує асинхронний Redis клієнт
+    The startup ініціалізує асинхронний Redis клієнт, переносить відкликані токени зі старого формату,
+    підписується на канали синхронізації локальних кешів, будує пошуковий індекс та запускає обробники
+    завантаження фото
     Returns:
     Список Task на виконяння в EvenLoop
 
@@ -28,7 +39,37 @@ def startup():
     :return: dict: health status
     """
 
-    RedisService.init()
+    cache = RedisService.init()
+    await migrate_revoked_tokens(cache)
+    if revocation_filter.enabled:
+        RedisService.subscribe(REVOKED_TOKENS_CHANNEL,
+                               on_message=revocation_filter.on_message,
+                               on_connect=revocation_filter.on_connect,
+                               on_disconnect=revocation_filter.on_disconnect)
+    if user_cache.enabled:
+        RedisService.subscribe(USER_INVALIDATED_CHANNEL,
+                               on_message=user_cache.on_message,
+                               on_connect=user_cache.on_connect,
+                               on_disconnect=user_cache.on_disconnect)
+    if response_cache.enabled:
+        RedisService.subscribe(RESPONSE_INVALIDATED_CHANNEL,
+                               on_message=response_cache.on_message,
+                               on_connect=response_cache.on_connect,
+                               on_disconnect=response_cache.on_disconnect)
+    await search_backend.load()
+    await upload_worker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The shutdown зупиняє фонові підписки на канали Redis та завантаження фото, закриває з'єднання та пули процесів
+    для паролів і обробки зображень
+    """
+    await upload_worker.stop()
+    await RedisService.close()
+    password_pool.shutdown()
+    image_engine.shutdown()
 
 
 app.add_middleware(
@@ -45,5 +86,7 @@ app.include_router(router_user)
 app.include_router(router_photos)
 app.include_router(router_rating)
 app.include_router(router_tags)
+app.include_router(router_metrics)
+app.include_router(router_storage)
 
 
@@ -0,0 +1,41 @@
+"""Photo rating sum and count
+
+Revision ID: 4f2b9e6d1c83
+Revises: e3a8d51f0b67
+Create Date: 2026-10-18 16:41:53.207118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2b9e6d1c83'
+down_revision: Union[str, None] = 'e3a8d51f0b67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RATING_AVERAGE = "CASE WHEN rating_count > 0 THEN CAST(rating_sum AS float) / rating_count ELSE 0 END"
+
+
+def upgrade() -> None:
+    op.add_column('photo', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('photo', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE photo SET rating_sum = totals.rating_sum, rating_count = totals.rating_count
+        FROM (SELECT photo_id, sum(rating) AS rating_sum, count(*) AS rating_count
+              FROM ratings WHERE photo_id IS NOT NULL GROUP BY photo_id) AS totals
+        WHERE photo.id = totals.photo_id
+    """)
+    op.drop_column('photo', 'rating')
+    op.add_column('photo', sa.Column('rating', sa.Float(), sa.Computed(RATING_AVERAGE, persisted=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('photo', 'rating')
+    op.add_column('photo', sa.Column('rating', sa.Float(), nullable=True))
+    op.execute(f"UPDATE photo SET rating = {RATING_AVERAGE}")
+    op.drop_column('photo', 'rating_count')
+    op.drop_column('photo', 'rating_sum')
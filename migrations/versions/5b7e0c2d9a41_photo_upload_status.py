@@ -0,0 +1,29 @@
+"""Photo upload status
+
+Revision ID: 5b7e0c2d9a41
+Revises: 31d0678a7518
+Create Date: 2026-10-18 10:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e0c2d9a41'
+down_revision: Union[str, None] = '31d0678a7518'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photo', sa.Column('status', sa.String(length=10), server_default='ready', nullable=False))
+    op.alter_column('photo', 'photo_url', existing_type=sa.String(), nullable=True)
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM photo WHERE photo_url IS NULL")
+    op.alter_column('photo', 'photo_url', existing_type=sa.String(), nullable=False)
+    op.drop_column('photo', 'status')
@@ -0,0 +1,28 @@
+"""Photo content hash
+
+Revision ID: 9c41f7a3e2b8
+Revises: 5b7e0c2d9a41
+Create Date: 2026-10-18 11:02:47.518903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c41f7a3e2b8'
+down_revision: Union[str, None] = '5b7e0c2d9a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photo', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_photo_content_hash'), 'photo', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_photo_content_hash'), table_name='photo')
+    op.drop_column('photo', 'content_hash')
@@ -0,0 +1,38 @@
+"""Ratings unique photo and user
+
+Revision ID: a7d3c1e58f20
+Revises: 4f2b9e6d1c83
+Create Date: 2026-10-18 18:12:35.640291
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3c1e58f20'
+down_revision: Union[str, None] = '4f2b9e6d1c83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # the old check-then-insert could race, keep the first rating of every user for a photo
+    op.execute("""
+        DELETE FROM ratings USING ratings AS first
+        WHERE ratings.photo_id = first.photo_id AND ratings.user_id = first.user_id AND ratings.id > first.id
+    """)
+    op.execute("""
+        UPDATE photo SET rating_sum = coalesce(totals.rating_sum, 0), rating_count = coalesce(totals.rating_count, 0)
+        FROM photo AS p LEFT JOIN (SELECT photo_id, sum(rating) AS rating_sum, count(*) AS rating_count
+                                   FROM ratings GROUP BY photo_id) AS totals ON totals.photo_id = p.id
+        WHERE photo.id = p.id AND (photo.rating_sum, photo.rating_count)
+              IS DISTINCT FROM (coalesce(totals.rating_sum, 0), coalesce(totals.rating_count, 0))
+    """)
+    op.create_index('ix_ratings_photo_id_user_id', 'ratings', ['photo_id', 'user_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ratings_photo_id_user_id', table_name='ratings')
@@ -0,0 +1,27 @@
+"""Photo transformation variants
+
+Revision ID: b4d7e2a9c615
+Revises: f16a9b2d7c48
+Create Date: 2026-10-18 22:31:05.184620
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d7e2a9c615'
+down_revision: Union[str, None] = 'f16a9b2d7c48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photo', sa.Column('variants', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('photo', 'variants')
@@ -0,0 +1,26 @@
+"""Ratings user_id index
+
+Revision ID: c5e1f07b9a34
+Revises: a7d3c1e58f20
+Create Date: 2026-10-18 19:05:12.884630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1f07b9a34'
+down_revision: Union[str, None] = 'a7d3c1e58f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_ratings_user_id'), 'ratings', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_ratings_user_id'), table_name='ratings')
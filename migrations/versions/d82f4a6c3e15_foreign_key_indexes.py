@@ -0,0 +1,41 @@
+"""Foreign key indexes
+
+Revision ID: d82f4a6c3e15
+Revises: c5e1f07b9a34
+Create Date: 2026-10-18 20:34:41.102957
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd82f4a6c3e15'
+down_revision: Union[str, None] = 'c5e1f07b9a34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # long strings that are never looked up by equality, search uses ix_photo_search_vector
+    op.drop_index('ix_photo_description', table_name='photo')
+    op.drop_index('ix_photo_name', table_name='photo')
+    op.drop_index('ix_photo_photo_url', table_name='photo')
+    op.create_index(op.f('ix_photo_user_id'), 'photo', ['user_id'], unique=False)
+    op.create_index('ix_photo_m2m_tag_photo_id_tag_id', 'photo_m2m_tag', ['photo_id', 'tag_id'], unique=False)
+    op.create_index('ix_photo_m2m_tag_tag_id', 'photo_m2m_tag', ['tag_id'], unique=False)
+    op.create_index('ix_comments_photo_id_id', 'comments', ['photo_id', 'id'], unique=False)
+    op.create_index(op.f('ix_comments_user_id'), 'comments', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_comments_user_id'), table_name='comments')
+    op.drop_index('ix_comments_photo_id_id', table_name='comments')
+    op.drop_index('ix_photo_m2m_tag_tag_id', table_name='photo_m2m_tag')
+    op.drop_index('ix_photo_m2m_tag_photo_id_tag_id', table_name='photo_m2m_tag')
+    op.drop_index(op.f('ix_photo_user_id'), table_name='photo')
+    op.create_index('ix_photo_photo_url', 'photo', ['photo_url'], unique=False)
+    op.create_index('ix_photo_name', 'photo', ['name'], unique=False)
+    op.create_index('ix_photo_description', 'photo', ['description'], unique=False)
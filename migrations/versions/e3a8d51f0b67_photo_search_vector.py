@@ -0,0 +1,33 @@
+"""Photo full-text search vector
+
+Revision ID: e3a8d51f0b67
+Revises: 9c41f7a3e2b8
+Create Date: 2026-10-18 14:26:09.301557
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a8d51f0b67'
+down_revision: Union[str, None] = '9c41f7a3e2b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR = ("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                 "setweight(to_tsvector('simple', coalesce(description, '')), 'B')")
+
+
+def upgrade() -> None:
+    op.add_column('photo', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                     sa.Computed(SEARCH_VECTOR, persisted=True), nullable=True))
+    op.create_index('ix_photo_search_vector', 'photo', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photo_search_vector', table_name='photo', postgresql_using='gin')
+    op.drop_column('photo', 'search_vector')
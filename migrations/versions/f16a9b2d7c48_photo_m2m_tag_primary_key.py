@@ -0,0 +1,39 @@
+"""photo_m2m_tag composite primary key
+
+Revision ID: f16a9b2d7c48
+Revises: d82f4a6c3e15
+Create Date: 2026-10-18 21:47:20.519384
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f16a9b2d7c48'
+down_revision: Union[str, None] = 'd82f4a6c3e15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("DELETE FROM photo_m2m_tag WHERE photo_id IS NULL OR tag_id IS NULL")
+    op.execute("""
+        DELETE FROM photo_m2m_tag USING photo_m2m_tag AS first
+        WHERE photo_m2m_tag.photo_id = first.photo_id AND photo_m2m_tag.tag_id = first.tag_id
+              AND photo_m2m_tag.id > first.id
+    """)
+    op.drop_index('ix_photo_m2m_tag_photo_id_tag_id', table_name='photo_m2m_tag')
+    op.drop_constraint('photo_m2m_tag_pkey', 'photo_m2m_tag', type_='primary')
+    op.drop_column('photo_m2m_tag', 'id')
+    op.create_primary_key('photo_m2m_tag_pkey', 'photo_m2m_tag', ['photo_id', 'tag_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('photo_m2m_tag_pkey', 'photo_m2m_tag', type_='primary')
+    op.execute("ALTER TABLE photo_m2m_tag ADD COLUMN id SERIAL PRIMARY KEY")
+    op.alter_column('photo_m2m_tag', 'photo_id', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('photo_m2m_tag', 'tag_id', existing_type=sa.Integer(), nullable=True)
+    op.create_index('ix_photo_m2m_tag_photo_id_tag_id', 'photo_m2m_tag', ['photo_id', 'tag_id'], unique=False)